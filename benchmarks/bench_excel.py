@@ -0,0 +1,99 @@
+"""Multi-sheet workbook ingestion: a naive pd.read_excel loop vs the parallel streaming pipeline.
+
+    python benchmarks/bench_excel.py --sheets 50 --rows-per-sheet 10000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.pipeline import peak_rss_mb, run_pipeline  # noqa: E402
+from synthetic import make_frame  # noqa: E402
+from utils.data_processing import enforce_schema, read_columnar  # noqa: E402
+
+
+def _declare_dimensions(path, last_cell):
+    """Add the <dimension> element Excel writes to each sheet; openpyxl's write-only mode omits it.
+
+    Without it, every read-only open of the workbook scans the XML of every sheet to size it.
+    """
+    tmp = f"{path}.tmp"
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename.startswith("xl/worksheets/sheet"):
+                data = data.replace(b"</sheetPr>", f'</sheetPr><dimension ref="A1:{last_cell}" />'.encode(), 1)
+            dst.writestr(item, data)
+    os.replace(tmp, path)
+
+
+def make_workbook(path, sheets, rows_per_sheet, dimensions=True):
+    """One sheet per production line, dates stored as real Excel dates like plant exports."""
+    workbook = openpyxl.Workbook(write_only=True)
+    for i in range(sheets):
+        df = make_frame(rows_per_sheet, seed=i)
+        df["Date"] = pd.to_datetime(df["Date"].astype(str))
+        sheet = workbook.create_sheet(f"Line {i + 1}")
+        sheet.append(list(df.columns))
+        for row in df.astype(object).itertuples(index=False):
+            sheet.append([value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+    workbook.save(path)
+    if dimensions:
+        _declare_dimensions(path, f"G{rows_per_sheet + 1}")
+
+
+def naive(path):
+    sheets = pd.ExcelFile(path, engine="openpyxl").sheet_names
+    return enforce_schema(pd.concat([pd.read_excel(path, sheet_name=sheet) for sheet in sheets], ignore_index=True))
+
+
+def pipeline(path, workers):
+    target = f"{path}.parquet"
+    run_pipeline(path, target, workers=workers)
+    return read_columnar(target)
+
+
+def _measure(method, path, workers):
+    # Runs in a fresh process, so its peak RSS belongs to this method alone
+    start = time.perf_counter()
+    df = naive(path) if method == "naive" else pipeline(path, workers)
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    worker_peak = peak_rss_mb(children=True) if method != "naive" else None
+    return {"rows": len(df), "seconds": seconds, "peak_rss_mb": peak, "peak_worker_rss_mb": worker_peak}
+
+
+def measure(method, path, workers=None):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return {"method": method, **pool.submit(_measure, method, path, workers).result()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=50)
+    parser.add_argument("--rows-per-sheet", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--without-dimensions", action="store_true", help="sheets without a <dimension> element, as some exporters write them")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "plant.xlsx")
+        make_workbook(path, args.sheets, args.rows_per_sheet, dimensions=not args.without_dimensions)
+        print(f"{args.sheets} sheets x {args.rows_per_sheet:,} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+        results = [measure("naive", path)]
+        for workers in args.workers:
+            results.append(measure(f"pipeline ({workers} workers)", path, workers))
+    print(pd.DataFrame(results).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Load-time and memory of the raw CSV path vs the typed columnar cache.
+
+    python benchmarks/bench_load.py --rows 1000000 10000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import write_csv  # noqa: E402
+from utils import data_processing  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(n_rows, workdir):
+    csv_path = os.path.join(workdir, f"scrap_{n_rows}.csv")
+    write_csv(csv_path, n_rows, skew=0)
+    data_processing.CACHE_DIR = os.path.join(workdir, "columnar_cache")
+
+    # What the upload page used to do on every rerun
+    raw, raw_s = timed(lambda: pd.read_csv(csv_path))
+    raw["Date"] = pd.to_datetime(raw["Date"], errors="coerce")
+    raw_mb = raw.memory_usage(deep=True).sum() / 1e6
+    del raw
+
+    _, convert_s = timed(lambda: data_processing.convert_to_columnar(csv_path))
+    typed, cached_s = timed(lambda: data_processing.load_scrap_file(csv_path))
+    typed_mb = typed.memory_usage(deep=True).sum() / 1e6
+
+    return {
+        "rows": n_rows,
+        "csv_mb": os.path.getsize(csv_path) / 1e6,
+        "parquet_mb": os.path.getsize(data_processing.cache_path(csv_path)) / 1e6,
+        "read_csv_s": raw_s,
+        "convert_once_s": convert_s,
+        "cached_load_s": cached_s,
+        "read_csv_mem_mb": raw_mb,
+        "typed_mem_mb": typed_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run(n, workdir) for n in args.rows]
+    print(pd.DataFrame(results).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
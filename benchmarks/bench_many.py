@@ -0,0 +1,61 @@
+"""Plant-wide ingestion: many scrap CSVs converted and combined, one worker process vs several.
+
+    python benchmarks/bench_many.py --files 24 --rows-per-file 250000 --workers 1 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.pipeline import run_many_pipeline  # noqa: E402
+from synthetic import write_csv  # noqa: E402
+from utils.data_processing import load_scrap_files  # noqa: E402
+
+
+def measure(paths, workers):
+    # A fresh working directory each time, so no file is found in the columnar cache
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            stats = run_many_pipeline(paths, workers=workers)
+            converted = time.perf_counter()
+            df = load_scrap_files(paths)
+            loaded = time.perf_counter()
+        finally:
+            os.chdir(cwd)
+    return {
+        "workers": stats["workers"],
+        "rows": len(df),
+        "convert_s": converted - start,
+        "combine_s": loaded - converted,
+        "total_s": loaded - start,
+        "peak_worker_rss_mb": stats["peak_worker_rss_mb"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=24)
+    parser.add_argument("--rows-per-file", type=int, default=250_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as datadir:
+        paths = [
+            write_csv(os.path.join(datadir, f"plant_{i // 8 + 1}", f"line_{i % 8 + 1}.csv"), args.rows_per_file, seed=i)
+            for i in range(args.files)
+        ]
+        print(f"{args.files} files x {args.rows_per_file:,} rows on {os.cpu_count()} CPU(s)")
+        results = [measure(paths, workers) for workers in args.workers]
+    print(pd.DataFrame(results).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""SQLite filter/aggregate pushdown vs the in-memory pandas path of the analysis pages.
+
+    python benchmarks/bench_sqlite.py --rows 1000000 5000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.load import SQLiteStore  # noqa: E402
+from synthetic import make_frame  # noqa: E402
+from utils.data_processing import CubeIndex, build_cube, enforce_schema  # noqa: E402
+
+# The groupings one Scrap Analysis rerun requires
+GROUPINGS = [["Date"], ["Date", "Machine_ID"], ["Date", "Defect_Type"], ["Machine_ID"], ["Defect_Type"], ["Fabric_Type"]]
+
+
+def selections(source, rng):
+    machines = source.categories["Machine_ID"]
+    return {
+        "all rows": (None, {}),
+        "3 machines, 1 year": (
+            (pd.Timestamp("2023-01-01"), pd.Timestamp("2023-12-31")),
+            {"Machine_ID": list(rng.choice(machines, 3, replace=False))},
+        ),
+        "1 month, 2 defects": (
+            (pd.Timestamp("2024-03-01"), pd.Timestamp("2024-03-31")),
+            {"Defect_Type": source.categories["Defect_Type"][:2]},
+        ),
+    }
+
+
+def rerun_seconds(source, date_range, selection, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        plan = source.plan(date_range, selection).require(*GROUPINGS)
+        for dims in GROUPINGS:
+            plan.get(*dims)
+        plan.get()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_totals(cube_index, store, date_range, selection):
+    """Both engines must agree on a selection's totals, whatever the events' times of day."""
+    expected = cube_index.plan(date_range, selection).get().iloc[0]
+    actual = store.plan(date_range, selection).get().iloc[0]
+    for col in ["Quantity_Scrapped_meters", "Event_Count"]:
+        if not np.isclose(expected[col], actual[col], rtol=1e-6):
+            raise RuntimeError(f"SQLite {col} {actual[col]:,.2f} != cube {expected[col]:,.2f} for {date_range}, {selection}")
+
+
+def run(n_rows, workdir):
+    df = enforce_schema(make_frame(n_rows, skew=0))
+    # Exports time-stamp each event; the engines have to agree on events after midnight too
+    seconds = np.random.default_rng(1).integers(0, 24 * 3600, len(df))
+    df["Date"] = df["Date"] + pd.to_timedelta(seconds, unit="s")
+    raw_mb = df.memory_usage(deep=True).sum() / 1e6
+
+    start = time.perf_counter()
+    cube_index = CubeIndex(build_cube(df))
+    cube_build_s = time.perf_counter() - start
+    cube_mb = cube_index.df.memory_usage(deep=True).sum() / 1e6
+
+    db_path = os.path.join(workdir, f"scrap_{n_rows}.sqlite")
+    start = time.perf_counter()
+    store = SQLiteStore(db_path)
+    store.write(df.iloc[i:i + 500_000] for i in range(0, len(df), 500_000))
+    sqlite_build_s = time.perf_counter() - start
+
+    rows = []
+    for name, (date_range, selection) in selections(cube_index, np.random.default_rng(0)).items():
+        check_totals(cube_index, store, date_range, selection)
+        rows.append({
+            "rows": n_rows,
+            "selection": name,
+            "pandas_rerun_ms": 1000 * rerun_seconds(cube_index, date_range, selection),
+            "sqlite_rerun_ms": 1000 * rerun_seconds(store, date_range, selection),
+        })
+    memory = {
+        "rows": n_rows,
+        "session_df_mb": raw_mb,
+        "cube_mb": cube_mb,
+        "cube_build_s": cube_build_s,
+        "sqlite_file_mb": os.path.getsize(db_path) / 1e6,
+        "sqlite_build_s": sqlite_build_s,
+    }
+    return rows, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    args = parser.parse_args()
+
+    latency, memory = [], []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in args.rows:
+            rows, mem = run(n, workdir)
+            latency += rows
+            memory.append(mem)
+    print(pd.DataFrame(latency).round(1).to_string(index=False))
+    print()
+    print(pd.DataFrame(memory).round(1).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
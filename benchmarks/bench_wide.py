@@ -0,0 +1,113 @@
+"""Wide MES exports: parsing every column as pandas guesses vs only the columns with a role.
+
+    python benchmarks/bench_wide.py --rows 1000000 --extra-columns 80
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.extract import iter_csv_chunks, read_sample  # noqa: E402
+from etl.pipeline import peak_rss_mb  # noqa: E402
+from etl.roles import infer_roles, save_roles  # noqa: E402
+from synthetic import iter_frames  # noqa: E402
+from utils.data_processing import concat_typed, enforce_schema  # noqa: E402
+
+# How an MES names the scrap fields
+MES_NAMES = {
+    "Date": "Prod_Date",
+    "Machine_ID": "Loom",
+    "Defect_Type": "Defect_Code",
+    "Fabric_Type": "Article",
+    "Shift": "Crew",
+    "Quantity_Scrapped_meters": "Scrap_M",
+    "Scrap_Cost": "Cost_EUR",
+}
+
+
+def write_wide_csv(path, n_rows, extra_columns, seed=0):
+    """Scrap events under MES column names, day-first dates, among extra_columns unrelated columns."""
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="") as f:
+        for index, frame in enumerate(iter_frames(n_rows, seed)):
+            frame["Date"] = pd.to_datetime(frame["Date"].astype(str)).dt.strftime("%d.%m.%Y")
+            frame = frame.rename(columns=MES_NAMES)
+            for i in range(extra_columns):
+                # Sensor readings, counters, operator notes and order numbers
+                kind = i % 4
+                if kind == 0:
+                    frame[f"Sensor_{i}"] = rng.normal(50, 10, len(frame)).round(3)
+                elif kind == 1:
+                    frame[f"Counter_{i}"] = rng.integers(0, 100_000, len(frame))
+                elif kind == 2:
+                    frame[f"Note_{i}"] = rng.choice(["ok", "check tension", "yarn change", "restart"], len(frame))
+                else:
+                    frame[f"Order_{i}"] = rng.integers(0, 10**9, len(frame)).astype(str)
+            frame.to_csv(f, index=False, header=index == 0)
+
+
+def every_column(path):
+    df = pd.read_csv(path)
+    df = df.rename(columns={mes: role for role, mes in MES_NAMES.items()})
+    df["Date"] = pd.to_datetime(df["Date"], format="%d.%m.%Y")
+    return enforce_schema(df)
+
+
+def with_roles(path):
+    return concat_typed(list(iter_csv_chunks(path)))
+
+
+def _measure(method, path, roles_dir):
+    # Runs in a fresh process, so its peak RSS belongs to this method alone
+    os.chdir(roles_dir)
+    start = time.perf_counter()
+    df = every_column(path) if method == "every column" else with_roles(path)
+    return {
+        "method": method,
+        "rows": len(df),
+        "columns": df.shape[1],
+        "seconds": time.perf_counter() - start,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1e6,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def in_fresh_process(fn, *args):
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--extra-columns", type=int, default=80)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "mes_export.csv")
+        # Written in another process too: Linux keeps the peak RSS of a process across exec, so
+        # the measured processes would otherwise start from this one's peak
+        in_fresh_process(write_wide_csv, path, args.rows, args.extra_columns)
+        roles = infer_roles(read_sample(path))
+        print(f"{args.rows:,} rows x {len(roles.header)} columns, {os.path.getsize(path) / 1e6:,.0f} MB")
+        print(f"Inferred roles: {roles.columns}, date format {roles.date_format!r}")
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            save_roles(roles)
+        finally:
+            os.chdir(cwd)
+        results = [in_fresh_process(_measure, method, path, workdir) for method in ["every column", "with roles"]]
+    print(pd.DataFrame(results).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
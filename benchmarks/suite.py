@@ -0,0 +1,264 @@
+"""Benchmark suite for the dashboards: load, filter, aggregate, build figures, rerun pages headless.
+
+    python benchmarks/suite.py --rows 100000 1000000            # compare with benchmarks/baseline.json
+    python benchmarks/suite.py --rows 100000 1000000 --save-baseline
+
+Every benchmark is the best of --repeats runs on a synthetic dataset (benchmarks/synthetic.py).
+Results are written as JSON to --output. A benchmark regresses when it is more than --threshold
+slower than the baseline and by more than --min-delta-ms; any regression makes the exit status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The pages import their siblings the way `streamlit run pages/main.py` makes them importable
+sys.path.insert(0, os.path.join(ROOT, "pages"))
+
+from etl.pipeline import peak_rss_mb, run_pipeline  # noqa: E402
+from synthetic import PROFILE, write_csv  # noqa: E402
+from utils import data_processing  # noqa: E402
+from utils.charts import area_chart, get_figure_cache, line_chart  # noqa: E402
+from utils.data_processing import AggregationPlan, CubeIndex, build_cube, load_scrap_file, read_scrap_csv  # noqa: E402
+from utils.spc import SPC_WINDOWS, ControlLimits, dense_series  # noqa: E402
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+OUTPUT = os.path.join(ROOT, "benchmarks", "results", "latest.json")
+
+# Groupings each page aggregates, across all of its views
+PAGE_GROUPINGS = {
+    "scrap_analysis": [(), ("Date",), ("Date", "Machine_ID"), ("Date", "Defect_Type"), ("Machine_ID",), ("Defect_Type",), ("Fabric_Type",)],
+    "quality_reports": [(), ("Date",), ("Machine_ID",), ("Defect_Type",), ("Shift",)],
+}
+# Page -> (sidebar label, view selector key)
+PAGES = {
+    "scrap_analysis": ("Scrap Analysis", "sa_view"),
+    "quality_reports": ("Quality Reports", "qr_view"),
+}
+
+
+def best_of(fn, repeats):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def selections(source):
+    """Filter selections of increasing selectivity, relative to the data's own date range."""
+    machines = source.categories["Machine_ID"]
+    defects = source.categories["Defect_Type"]
+    last_year = (source.date_max - pd.Timedelta(days=364), source.date_max)
+    last_month = (source.date_max - pd.Timedelta(days=29), source.date_max)
+    return {
+        "all": (None, {}),
+        "3_machines_1_year": (last_year, {"Machine_ID": machines[:3]}),
+        "2_defects_1_month": (last_month, {"Defect_Type": defects[:2]}),
+    }
+
+
+def bench_data(csv_path, repeats):
+    """CSV load, columnar conversion, filtering, per-page aggregations and figure construction."""
+    results = {}
+    results["load/read_csv"], _ = best_of(lambda: read_scrap_csv(csv_path), repeats)
+    target = data_processing.cache_path(csv_path)
+    results["load/convert_to_columnar"], _ = best_of(lambda: run_pipeline(csv_path, target), repeats)
+    results["load/cached_load"], df = best_of(lambda: load_scrap_file(csv_path), repeats)
+
+    results["index/build_cube"], cube = best_of(lambda: build_cube(df), repeats)
+    results["index/cube_index"], source = best_of(lambda: CubeIndex(cube), repeats)
+
+    for name, (date_range, selection) in selections(source).items():
+        results[f"filter/{name}"], _ = best_of(lambda: source.filter(date_range, selection), repeats)
+        plan = source.plan(date_range, selection)
+        plan.get()
+        for page, groupings in PAGE_GROUPINGS.items():
+            for dims in groupings:
+                label = "+".join(dims) or "totals"
+                # A fresh plan per run: exactly one scan of the filtered cube
+                results[f"aggregate/{page}/{label}/{name}"], _ = best_of(
+                    lambda: AggregationPlan(plan.table).get(*dims), repeats
+                )
+
+    plan = source.plan()
+    figures = {
+        "trend": lambda: line_chart(plan.get("Date"), x="Date", y="Quantity_Scrapped_meters", markers=True),
+        "machine_trend": lambda: line_chart(
+            plan.get("Date", "Machine_ID"), x="Date", y="Quantity_Scrapped_meters", color="Machine_ID", markers=True
+        ),
+        "defect_area": lambda: area_chart(plan.get("Date", "Defect_Type"), x="Date", y="Quantity_Scrapped_meters", color="Defect_Type"),
+        "top_machines_bar": lambda: px.bar(
+            plan.get("Machine_ID").nlargest(5, "Quantity_Scrapped_meters"),
+            x="Quantity_Scrapped_meters", y="Machine_ID", orientation="h", color="Machine_ID",
+        ),
+        "defect_pie": lambda: px.pie(plan.get("Defect_Type"), names="Defect_Type", values="Quantity_Scrapped_meters"),
+        "machine_treemap": lambda: px.treemap(plan.get("Machine_ID"), path=["Machine_ID"], values="Scrap_Cost", color="Scrap_Cost"),
+        "machine_scatter": lambda: px.scatter(
+            plan.get("Machine_ID"), x="Quantity_Scrapped_meters", y="Scrap_Cost", size="Scrap_Cost", color="Machine_ID"
+        ),
+    }
+    for name, build in figures.items():
+        results[f"figure/{name}"], _ = best_of(build, repeats)
+
+    # Control limits of every machine's daily scrap: from scratch, and updated after 30 days are appended
+    groups, periods, values = dense_series(plan.get("Date", "Machine_ID"), "Machine_ID", "Quantity_Scrapped_meters", "Day")
+    window = SPC_WINDOWS["Day"]
+    results["spc/machines/full"], _ = best_of(lambda: ControlLimits(window).update(groups, periods, values), repeats)
+    earlier = [ControlLimits(window).update(groups, periods[:-30], values[:, :-30]) for _ in range(repeats)]
+    results["spc/machines/append_30_days"], _ = best_of(lambda: earlier.pop().update(groups, periods, values), repeats)
+    return results
+
+
+def bench_app(repeats):
+    """Headless reruns of each page view through AppTest: cold (empty figure cache) and warm."""
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    st.cache_resource.clear()
+    at = AppTest.from_file(os.path.join(ROOT, "pages", "main.py"), default_timeout=600)
+    at.run()
+    start = time.perf_counter()
+    at.sidebar.radio[0].set_value("Upload Data").run()
+    results["app/upload_data"] = time.perf_counter() - start
+    _raise_on_exception(at)
+
+    for page, (label, view_key) in PAGES.items():
+        at.sidebar.radio[0].set_value(label).run()
+        for view in at.radio(key=view_key).options:
+            at.radio(key=view_key).set_value(view)
+            name = view.split(" ", 1)[-1].lower().replace(" & ", "_").replace(" ", "_")
+
+            def cold():
+                get_figure_cache.clear()
+                at.run()
+
+            results[f"app/{page}/{name}/cold"], _ = best_of(cold, repeats)
+            results[f"app/{page}/{name}/warm"], _ = best_of(at.run, repeats)
+            _raise_on_exception(at)
+    return results
+
+
+def _raise_on_exception(at):
+    if at.exception:
+        raise RuntimeError(f"Page raised: {at.exception[0].value}")
+
+
+def run(n_rows, repeats, profile):
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            # The app reads uploads and writes its caches relative to the working directory
+            csv_path = write_csv(os.path.join("uploaded_files", "scrap.csv"), n_rows, **profile)
+            results = bench_data(csv_path, repeats)
+            results.update(bench_app(repeats))
+        finally:
+            os.chdir(cwd)
+    return [{"rows": n_rows, "benchmark": name, "seconds": seconds} for name, seconds in results.items()]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Rows of (rows, benchmark, baseline s, current s, change, status) against a baseline."""
+    previous = {(entry["rows"], entry["benchmark"]): entry["seconds"] for entry in baseline["results"]}
+    report = []
+    for entry in results:
+        before = previous.get((entry["rows"], entry["benchmark"]))
+        now = entry["seconds"]
+        if before is None:
+            status, change = "new", None
+        else:
+            change = now / before - 1 if before else 0.0
+            if change > threshold and now - before > min_delta:
+                status = "REGRESSION"
+            elif change < -threshold and before - now > min_delta:
+                status = "faster"
+            else:
+                status = "ok"
+        report.append({
+            "rows": entry["rows"],
+            "benchmark": entry["benchmark"],
+            "baseline_ms": None if before is None else 1000 * before,
+            "current_ms": 1000 * now,
+            "change": change,
+            "status": status,
+        })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skew", type=float, default=PROFILE["skew"])
+    parser.add_argument("--machines", type=int, default=PROFILE["machines"])
+    parser.add_argument("--output", default=OUTPUT, help="JSON results file (default: %(default)s)")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline results to compare with (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=25.0, help="Ignore changes smaller than this (rerun noise)")
+    args = parser.parse_args(argv)
+
+    profile = {"skew": args.skew, "machines": args.machines}
+    results = []
+    for n_rows in args.rows:
+        results += run(n_rows, args.repeats, profile)
+    document = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "streamlit": st.__version__,
+            "repeats": args.repeats,
+            "profile": {**PROFILE, **profile},
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(document, f, indent=1)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        print(pd.DataFrame(results).assign(ms=lambda d: 1000 * d.pop("seconds")).round(2).to_string(index=False))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("profile") != document["meta"]["profile"]:
+        print("Warning: the baseline was recorded with a different data profile")
+    report = pd.DataFrame(compare(results, baseline, args.threshold, args.min_delta_ms / 1000))
+    print(report.round({"baseline_ms": 2, "current_ms": 2, "change": 3}).to_string(index=False))
+    regressions = report[report["status"] == "REGRESSION"]
+    if len(regressions):
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Synthetic scrap datasets with the columns the pages expect, from 10k to 100M rows.
+
+    python benchmarks/synthetic.py scrap.csv --rows 10000000 --machines 500 --skew 1.2
+
+Machines, defects, fabrics and shifts are drawn with Zipf-like weights (skew 0 is uniform,
+larger values concentrate scrap on a few machines and defects), weekends run at reduced
+volume, quantities depend on the defect and costs on the fabric. Rows are generated in
+independent, seeded chunks, so large files are written without holding them in memory and
+the same arguments always produce the same file.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+
+# Default shape of a plant; every key can be overridden per call
+PROFILE = {
+    "machines": 200,
+    "defects": 8,
+    "fabrics": 6,
+    "shifts": 3,
+    "days": 3 * 365,
+    "start": "2022-01-01",
+    "skew": 1.0,
+}
+
+DEFECT_NAMES = ["Hole", "Stain", "Misweave", "Color Shade", "Broken Yarn", "Slub", "Oil Spot", "Tear"]
+FABRIC_NAMES = ["Cotton", "Polyester", "Nylon", "Wool", "Blend", "Leather"]
+SHIFT_NAMES = ["A", "B", "C"]
+WEEKEND_VOLUME = 0.4
+
+
+def _names(known, count, prefix):
+    return known[:count] + [f"{prefix} {i + 1}" for i in range(len(known), count)]
+
+
+def _zipf_weights(count, skew):
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return weights / weights.sum()
+
+
+class _Levels:
+    """Values, sampling weights and per-value factors of one profile, fixed by the seed."""
+
+    def __init__(self, profile, seed):
+        rng = np.random.default_rng([seed, 0])
+        skew = profile["skew"]
+        self.dates = pd.date_range(profile["start"], periods=profile["days"], freq="D")
+        date_weights = np.where(self.dates.dayofweek >= 5, WEEKEND_VOLUME, 1.0)
+        self.date_weights = date_weights / date_weights.sum()
+
+        self.values = {
+            "Machine_ID": [f"M{i + 1:03d}" for i in range(profile["machines"])],
+            "Defect_Type": _names(DEFECT_NAMES, profile["defects"], "Defect"),
+            "Fabric_Type": _names(FABRIC_NAMES, profile["fabrics"], "Fabric"),
+            "Shift": _names(SHIFT_NAMES, profile["shifts"], "Shift"),
+        }
+        self.weights = {}
+        for dim, values in self.values.items():
+            # Shifts stay close to even; the skew is about machines, defects and fabrics
+            weights = _zipf_weights(len(values), skew / 4 if dim == "Shift" else skew)
+            self.weights[dim] = weights[rng.permutation(len(values))]
+        self.severity = rng.lognormal(0.0, 0.4, len(self.values["Defect_Type"]))
+        self.price_per_meter = rng.uniform(3, 12, len(self.values["Fabric_Type"]))
+
+
+def _chunk(levels, n_rows, seed, index):
+    rng = np.random.default_rng([seed, index + 1])
+    codes = {
+        dim: rng.choice(len(values), n_rows, p=levels.weights[dim])
+        for dim, values in levels.values.items()
+    }
+    qty = rng.gamma(2.0, 2.5, n_rows) * levels.severity[codes["Defect_Type"]]
+    cost = qty * levels.price_per_meter[codes["Fabric_Type"]] * rng.uniform(0.9, 1.1, n_rows)
+    dates = rng.choice(len(levels.dates), n_rows, p=levels.date_weights)
+    frame = {"Date": pd.Categorical.from_codes(dates, levels.dates.strftime("%Y-%m-%d"))}
+    for dim, values in levels.values.items():
+        frame[dim] = pd.Categorical.from_codes(codes[dim], values)
+    frame["Quantity_Scrapped_meters"] = qty.round(2)
+    frame["Scrap_Cost"] = cost.round(2)
+    return pd.DataFrame(frame)
+
+
+def iter_frames(n_rows, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS, **profile):
+    """Yield the dataset in frames of at most chunk_rows rows (Date as text, like a CSV)."""
+    profile = {**PROFILE, **profile}
+    unknown = set(profile) - set(PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown profile settings: {', '.join(sorted(unknown))}")
+    levels = _Levels(profile, seed)
+    for index, start in enumerate(range(0, n_rows, chunk_rows)):
+        yield _chunk(levels, min(chunk_rows, n_rows - start), seed, index)
+
+
+def make_frame(n_rows, seed=0, **profile):
+    """The whole dataset as one frame; for sizes that fit in memory."""
+    frames = list(iter_frames(n_rows, seed, **profile))
+    if not frames:
+        return _chunk(_Levels({**PROFILE, **profile}, seed), 0, seed, 0)
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def write_csv(path, n_rows, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS, **profile):
+    """Write the dataset to a CSV chunk by chunk; memory stays at one chunk."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        for index, frame in enumerate(iter_frames(n_rows, seed, chunk_rows, **profile)):
+            frame.to_csv(f, index=False, header=index == 0)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", help="CSV file to write")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    for key, default in PROFILE.items():
+        parser.add_argument(f"--{key}", type=type(default), default=default)
+    args = parser.parse_args(argv)
+
+    profile = {key: getattr(args, key) for key in PROFILE}
+    write_csv(args.target, args.rows, args.seed, **profile)
+    print(f"Wrote {args.rows:,} rows to {args.target} ({os.path.getsize(args.target) / 1e6:,.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
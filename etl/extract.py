@@ -0,0 +1,184 @@
+import glob
+import os
+from contextlib import contextmanager
+
+import openpyxl
+import pandas as pd
+
+from etl.roles import load_roles, roles_for_header
+
+# Rows per chunk; peak memory of the pipeline scales with this, not with the file size
+DEFAULT_CHUNK_SIZE = 500_000
+# Workbook rows are buffered as Python tuples, several times larger than parsed CSV rows
+DEFAULT_SHEET_CHUNK_SIZE = 100_000
+
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm")
+SOURCE_EXTENSIONS = (".csv",) + WORKBOOK_EXTENSIONS
+
+
+def iter_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield a CSV as DataFrames of at most chunk_size rows, parsed under its column roles.
+
+    Only columns with a role are read (usecols), dimensions and dates straight into
+    categoricals and measures into float32; the chunks carry the role names. A measure
+    column with text in it ("n/a", "1,234") makes the rest of the file be parsed without the
+    float dtype, leaving those values to cleaning.
+    """
+    roles = roles_for_header(read_header(path))
+    done = 0
+    numeric_measures = True
+    while True:
+        skip = (lambda i: 0 < i <= done) if done else None
+        try:
+            with pd.read_csv(
+                path, usecols=roles.usecols(), dtype=roles.dtypes(numeric_measures), skiprows=skip, chunksize=chunk_size,
+            ) as reader:
+                for chunk in reader:
+                    done += len(chunk)
+                    yield roles.apply(chunk)
+            return
+        except ValueError:
+            if not numeric_measures:
+                raise
+            numeric_measures = False
+
+
+def is_workbook(path):
+    return path.lower().endswith(WORKBOOK_EXTENSIONS)
+
+
+def expand_sources(patterns):
+    """Scrap files named by paths, directories (their CSVs and workbooks) or glob patterns.
+
+    Files are returned in the order given, each pattern's or directory's matches sorted by
+    name, and a file named twice is only listed once.
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(os.path.join(pattern, name) for name in os.listdir(pattern))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            if not os.path.isfile(pattern):
+                raise FileNotFoundError(f"No such scrap file: {pattern}")
+            paths.append(pattern)
+            continue
+        paths += [path for path in matches if os.path.isfile(path) and path.lower().endswith(SOURCE_EXTENSIONS)]
+    unique, seen = [], set()
+    for path in paths:
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            unique.append(path)
+    return unique
+
+
+@contextmanager
+def open_workbook(path):
+    """A workbook opened in openpyxl's streaming read-only mode, reading cached values, not formulas.
+
+    Opening is not free: besides shared strings and styles, openpyxl scans the whole XML of any
+    sheet that doesn't declare its dimensions (files written by some exporters), so callers
+    converting several sheets should open the workbook once.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield workbook
+    finally:
+        workbook.close()
+
+
+def workbook_sheets(path):
+    """(sheet name, row count) for each worksheet, in workbook order."""
+    with open_workbook(path) as workbook:
+        return [(sheet.title, sheet.max_row or 0) for sheet in workbook.worksheets]
+
+
+def _sheet_header(rows):
+    """Column names from the first non-empty row of a sheet's row iterator, or None for an empty sheet."""
+    header = next((row for row in rows if any(value is not None for value in row)), None)
+    if header is None:
+        return None
+    return [str(name).strip() if name is not None else f"column_{i}" for i, name in enumerate(header)]
+
+
+def _sheet_frame(rows, columns, roles):
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for col, dtype in roles.dtypes(numeric_measures=False).items():
+        df[col] = df[col].astype(dtype)
+    return roles.apply(df)
+
+
+def iter_sheet_chunks(worksheet, chunk_size=DEFAULT_SHEET_CHUNK_SIZE):
+    """Yield a read-only worksheet as DataFrames of at most chunk_size rows, like iter_csv_chunks.
+
+    Rows are streamed, so memory is bounded by the chunk, not the sheet. The first non-empty
+    row is the header, and only the columns with a role (see etl.roles) are kept; empty rows
+    are skipped. A sheet with a header but no rows yields one empty frame, so callers still
+    see which roles it has.
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = _sheet_header(rows)
+    if header is None:
+        return
+    roles = roles_for_header(header)
+    columns = roles.usecols()
+    indices = [header.index(col) for col in columns]
+    width = len(header)
+    padding = (None,) * width
+    batch = []
+    yielded = False
+    for row in rows:
+        if not any(value is not None for value in row):
+            continue
+        if len(row) < width:
+            row = row + padding[len(row):]
+        batch.append([row[i] for i in indices])
+        if len(batch) == chunk_size:
+            yield _sheet_frame(batch, columns, roles)
+            batch = []
+            yielded = True
+    if batch or not yielded:
+        yield _sheet_frame(batch, columns, roles)
+
+
+# --- Headers and samples, for assigning column roles ---
+SAMPLE_ROWS = 1000
+_header_memo = {}
+
+
+def read_header(path):
+    """Column names of a CSV, or of the first non-empty sheet of a workbook.
+
+    Memoized on (path, size, mtime): the columnar cache key depends on it, so it's asked
+    for on every rerun.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _header_memo:
+        if is_workbook(path):
+            with open_workbook(path) as workbook:
+                headers = (_sheet_header(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets)
+                _header_memo[memo_key] = next((header for header in headers if header is not None), [])
+        else:
+            _header_memo[memo_key] = [str(col) for col in pd.read_csv(path, nrows=0).columns]
+    return _header_memo[memo_key]
+
+
+def read_sample(path, nrows=SAMPLE_ROWS):
+    """The first rows of a file with every column, as pandas guesses their types."""
+    if not is_workbook(path):
+        return pd.read_csv(path, nrows=nrows)
+    with open_workbook(path) as workbook:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = _sheet_header(rows)
+            if header is not None:
+                records = [row[:len(header)] for _, row in zip(range(nrows), rows)]
+                return pd.DataFrame.from_records(records, columns=header).infer_objects()
+    return pd.DataFrame()
+
+
+def stored_roles(path):
+    """The confirmed column roles of a file's header layout, or None."""
+    return load_roles(read_header(path))
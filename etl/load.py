@@ -0,0 +1,410 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_processing import (
+    CATEGORY_COLUMNS,
+    COUNT_COLUMN,
+    DATE_COLUMN,
+    DIMENSION_COLUMNS,
+    MEASURE_COLUMNS,
+    AggregationPlan,
+    build_cube,
+    concat_typed,
+    enforce_schema,
+    read_columnar,
+)
+
+# A scrap event has no id column, so by default a row is identified by all of its values
+SCRAP_KEY_COLUMNS = [DATE_COLUMN] + CATEGORY_COLUMNS + MEASURE_COLUMNS
+
+_ARROW_TYPES = {DATE_COLUMN: pa.timestamp("ns")}
+_ARROW_TYPES.update({col: pa.string() for col in DIMENSION_COLUMNS})
+_ARROW_TYPES.update({col: pa.float32() for col in MEASURE_COLUMNS})
+
+
+def scrap_schema(columns):
+    """Arrow schema of the columnar store; dimensions are plain strings that Parquet dictionary-encodes."""
+    return pa.schema([(col, _ARROW_TYPES[col]) for col in columns])
+
+
+class ParquetChunkWriter:
+    """Append typed chunks to one Parquet file, one row group per chunk.
+
+    The file is written under a temporary name and only moved into place on a clean close,
+    so readers never see a half-written dataset.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp = f"{path}.tmp"
+        self._writer = None
+        self.schema = None
+        self.rows = 0
+
+    def _open(self, schema):
+        self.schema = schema
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._writer = pq.ParquetWriter(self._tmp, self.schema)
+
+    def write(self, chunk):
+        if self._writer is None:
+            self._open(scrap_schema(chunk.columns))
+        self.write_table(pa.Table.from_pandas(chunk, preserve_index=False))
+
+    def write_table(self, table):
+        """Append an Arrow table, e.g. a row group copied from another file of this schema."""
+        if self._writer is None:
+            self._open(table.schema.remove_metadata())
+        self._writer.write_table(table.cast(self.schema))
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is None:
+            raise ValueError(f"No rows were written to {self.path}")
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# --- Month-partitioned datasets ---
+DATASETS_DIR = "datasets"
+# Load window covering every partition
+FULL_HISTORY = "All history"
+
+
+class PartitionedStore:
+    """Scrap dataset kept as one Parquet file per month, next to that month's daily cube.
+
+        <root>/manifest.json                high-water mark and per-partition row counts/date ranges
+        <root>/month=2024-05/events.parquet
+        <root>/month=2024-05/cube.parquet
+
+    append() merges new rows into the months they fall in, skipping rows already stored (equal
+    on key_columns, copy for copy), and rebuilds only those months' files and cubes. Reads only open the
+    months they need.
+    """
+
+    def __init__(self, root, key_columns=None):
+        self.root = root
+        self.manifest = self._read_manifest()
+        if key_columns is not None:
+            self.manifest["key_columns"] = list(key_columns)
+
+    @classmethod
+    def open(cls, name, key_columns=None):
+        return cls(os.path.join(DATASETS_DIR, name), key_columns)
+
+    # --- Manifest ---
+    def _manifest_path(self):
+        return os.path.join(self.root, "manifest.json")
+
+    def _read_manifest(self):
+        if os.path.exists(self._manifest_path()):
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        return {"version": 0, "high_water_mark": None, "key_columns": SCRAP_KEY_COLUMNS, "partitions": {}}
+
+    def _write_manifest(self):
+        tmp = f"{self._manifest_path()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    def dataset_key(self, window=FULL_HISTORY):
+        """Handle of this version of the dataset loaded over a window, as the pages know it."""
+        return f"dataset:{os.path.basename(self.root)}:v{self.version}:{window}"
+
+    @property
+    def high_water_mark(self):
+        hwm = self.manifest["high_water_mark"]
+        return pd.Timestamp(hwm) if hwm else None
+
+    # --- Partitions ---
+    def _partition_dir(self, month):
+        return os.path.join(self.root, f"month={month}")
+
+    def partitions(self, start=None, end=None):
+        """Months whose date range overlaps the inclusive [start, end] window."""
+        months = []
+        for month, info in sorted(self.manifest["partitions"].items()):
+            if start is not None and pd.Timestamp(info["date_max"]) < pd.Timestamp(start):
+                continue
+            if end is not None and pd.Timestamp(info["date_min"]) > pd.Timestamp(end):
+                continue
+            months.append(month)
+        return months
+
+    def _read_partition(self, month, name):
+        return read_columnar(os.path.join(self._partition_dir(month), f"{name}.parquet"), enforce=name == "events")
+
+    def _write_partition(self, month, events):
+        folder = self._partition_dir(month)
+        os.makedirs(folder, exist_ok=True)
+        for name, frame in [("events", events), ("cube", build_cube(events))]:
+            path = os.path.join(folder, f"{name}.parquet")
+            frame.to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+        self.manifest["partitions"][month] = {
+            "rows": len(events),
+            "date_min": events[DATE_COLUMN].min().isoformat(),
+            "date_max": events[DATE_COLUMN].max().isoformat(),
+        }
+
+    # --- Append ---
+    def append(self, df):
+        """Merge new scrap events into the dataset; returns counts of what changed."""
+        df = enforce_schema(df[df[DATE_COLUMN].notna()])
+        key_columns = [col for col in self.manifest["key_columns"] if col in df.columns]
+        hwm = self.high_water_mark
+        stats = {
+            "rows_in": len(df),
+            "late_rows": int((df[DATE_COLUMN] <= hwm).sum()) if hwm is not None else 0,
+            "rows_added": 0,
+            "duplicates": 0,
+            "partitions": [],
+        }
+
+        # Rows are matched as multisets: a batch holding n copies of an event stored m times adds
+        # n - m of them, so re-appending a file adds nothing while genuine repeats of an event
+        # (in the batch, or after ones already stored) are kept
+        months = df[DATE_COLUMN].to_numpy(dtype="datetime64[M]").astype(str)
+        additions = {}
+        for month, new_rows in df.groupby(months, sort=True):
+            existing = self._read_partition(month, "events") if month in self.manifest["partitions"] else None
+            if existing is not None and len(existing):
+                stored = pd.util.hash_pandas_object(existing[key_columns], index=False).value_counts()
+                hashes = pd.Series(pd.util.hash_pandas_object(new_rows[key_columns], index=False).to_numpy())
+                copies_before = hashes.groupby(hashes, sort=False).cumcount()
+                new_rows = new_rows[(copies_before >= hashes.map(stored).fillna(0)).to_numpy()]
+            if len(new_rows):
+                additions[month] = (existing, new_rows)
+            stats["rows_added"] += len(new_rows)
+        stats["duplicates"] = len(df) - stats["rows_added"]
+        if not additions:
+            # Nothing new: partitions, version and every cache keyed on it stay as they are
+            return stats
+
+        for month, (existing, new_rows) in additions.items():
+            merged = concat_typed([existing, new_rows] if existing is not None else [new_rows])
+            self._write_partition(month, merged.sort_values(DATE_COLUMN, kind="stable", ignore_index=True))
+            stats["partitions"].append(month)
+
+        new_max = df[DATE_COLUMN].max()
+        self.manifest["high_water_mark"] = max(new_max, hwm).isoformat() if hwm is not None else new_max.isoformat()
+        self.manifest["version"] += 1
+        os.makedirs(self.root, exist_ok=True)
+        self._write_manifest()
+        return stats
+
+    # --- Reads ---
+    def _read(self, name, start, end):
+        frames = [self._read_partition(month, name) for month in self.partitions(start, end)]
+        if not frames:
+            return None
+        df = concat_typed(frames)
+        if start is not None:
+            df = df[df[DATE_COLUMN] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df[DATE_COLUMN] <= pd.Timestamp(end)]
+        return df.reset_index(drop=True)
+
+    def read(self, start=None, end=None):
+        """Raw scrap events in the inclusive [start, end] window, reading only overlapping months."""
+        return self._read("events", start, end)
+
+    def read_cube(self, start=None, end=None):
+        """Daily cube for the window, stitched from the per-month cubes without touching raw events."""
+        return self._read("cube", start, end)
+
+
+def list_datasets():
+    if not os.path.isdir(DATASETS_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(DATASETS_DIR)
+        if os.path.exists(os.path.join(DATASETS_DIR, name, "manifest.json"))
+    )
+
+
+# --- SQLite backend ---
+SQLITE_DIR = os.path.join(DATASETS_DIR, "sqlite")
+
+# Grain -> SQL expression for the start of a row's time bucket (Dates are stored as ISO text)
+_SQL_TIME_BUCKETS = {
+    "Day": 'substr("Date", 1, 10)',
+    "Week": "date(\"Date\", 'weekday 0', '-6 days')",
+    "Month": "substr(\"Date\", 1, 7) || '-01'",
+}
+
+
+class SQLiteStore:
+    """Scrap events in a local SQLite database, filtered and aggregated inside SQLite.
+
+    Only aggregate results cross into pandas, so the dataset can be much larger than the
+    Streamlit process's memory. Dates are ISO-8601 text, which sorts and compares correctly.
+    """
+
+    TABLE = "scrap_events"
+
+    def __init__(self, path):
+        self.path = path
+        self._meta = None
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    # --- Writing ---
+    def write(self, chunks):
+        """(Re)create the table from an iterable of typed DataFrames, then index and analyze it."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        con = sqlite3.connect(tmp)
+        try:
+            con.execute("PRAGMA journal_mode = OFF")
+            con.execute("PRAGMA synchronous = OFF")
+            columns = None
+            for chunk in chunks:
+                if columns is None:
+                    columns = [col for col in [DATE_COLUMN] + CATEGORY_COLUMNS + MEASURE_COLUMNS if col in chunk.columns]
+                    types = ["TEXT" if col in [DATE_COLUMN] + CATEGORY_COLUMNS else "REAL" for col in columns]
+                    con.execute(f"CREATE TABLE {self.TABLE} ({', '.join(f'{_q(c)} {t}' for c, t in zip(columns, types))})")
+                data = {col: chunk[col].tolist() for col in columns if col != DATE_COLUMN}
+                data[DATE_COLUMN] = np.datetime_as_string(chunk[DATE_COLUMN].to_numpy(dtype="datetime64[s]"), unit="s").tolist()
+                rows = zip(*(data[col] for col in columns))
+                con.executemany(f"INSERT INTO {self.TABLE} VALUES ({', '.join('?' * len(columns))})", rows)
+            if columns is None:
+                raise ValueError(f"No rows were written to {self.path}")
+            # Indexes are cheaper to build once the data is in
+            for col in columns:
+                if col not in MEASURE_COLUMNS:
+                    con.execute(f"CREATE INDEX idx_{col} ON {self.TABLE} ({_q(col)})")
+            con.execute("ANALYZE")
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp, self.path)
+        self._meta = None
+
+    @classmethod
+    def from_parquet(cls, parquet_path, path, batch_size=500_000):
+        """Load a columnar file into a new database batch by batch."""
+        store = cls(path)
+        batches = pq.ParquetFile(parquet_path).iter_batches(batch_size=batch_size)
+        store.write(batch.to_pandas() for batch in batches)
+        return store
+
+    # --- Filter widgets ---
+    def _load_meta(self):
+        if self._meta is None:
+            with closing(self.connect()) as con:
+                date_min, date_max = con.execute(f'SELECT MIN("Date"), MAX("Date") FROM {self.TABLE}').fetchone()
+                names = [row[1] for row in con.execute(f"PRAGMA table_info({self.TABLE})")]
+                categories = {
+                    col: [row[0] for row in con.execute(f"SELECT DISTINCT {_q(col)} FROM {self.TABLE} WHERE {_q(col)} IS NOT NULL ORDER BY 1")]
+                    for col in CATEGORY_COLUMNS if col in names
+                }
+                rows = con.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+            self._meta = (pd.Timestamp(date_min), pd.Timestamp(date_max), categories, rows)
+        return self._meta
+
+    @property
+    def date_min(self):
+        return self._load_meta()[0]
+
+    @property
+    def date_max(self):
+        return self._load_meta()[1]
+
+    @property
+    def categories(self):
+        return self._load_meta()[2]
+
+    def __len__(self):
+        return self._load_meta()[3]
+
+    # --- Queries ---
+    def where(self, date_range=None, selections=None):
+        """WHERE clause and parameters for a filter selection; full selections are not sent at all."""
+        clauses, params = [], []
+        if date_range is not None:
+            # Whole days, like the daily cube: events after midnight on the end day are in range
+            start, end = pd.Timestamp(date_range[0]).normalize(), pd.Timestamp(date_range[1]).normalize() + pd.Timedelta(days=1)
+            clauses.append('"Date" >= ? AND "Date" < ?')
+            params += [start.isoformat(timespec="seconds"), end.isoformat(timespec="seconds")]
+        for dim, values in (selections or {}).items():
+            if set(values) >= set(self.categories[dim]):
+                continue
+            clauses.append(f"{_q(dim)} IN ({', '.join('?' * len(values))})" if values else "0")
+            params += list(values)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def aggregate(self, dims, date_range=None, selections=None, grain="Day"):
+        """Sums and event counts grouped by dims, computed by SQLite."""
+        where, params = self.where(date_range, selections)
+        select = [f"{_SQL_TIME_BUCKETS[grain]} AS \"Date\"" if dim == DATE_COLUMN else _q(dim) for dim in dims]
+        select += [f"TOTAL({_q(col)}) AS {_q(col)}" for col in MEASURE_COLUMNS]
+        select.append(f"COUNT(*) AS {COUNT_COLUMN}")
+        sql = f"SELECT {', '.join(select)} FROM {self.TABLE}{where}"
+        if dims:
+            positions = ", ".join(str(i + 1) for i in range(len(dims)))
+            sql += f" GROUP BY {positions} ORDER BY {positions}"
+        with closing(self.connect()) as con:
+            result = pd.read_sql_query(sql, con, params=params)
+        # The cube's dtypes (an empty result comes back as object columns), so both engines
+        # return the same frames for a plan
+        result = result.astype({**{col: np.float64 for col in MEASURE_COLUMNS}, COUNT_COLUMN: np.int64})
+        if DATE_COLUMN in result.columns:
+            result[DATE_COLUMN] = pd.to_datetime(result[DATE_COLUMN])
+        return result
+
+    def preview(self, limit=1000):
+        with closing(self.connect()) as con:
+            return pd.read_sql_query(f"SELECT * FROM {self.TABLE} LIMIT ?", con, params=[limit])
+
+    def plan(self, date_range=None, selections=None, grain="Day"):
+        return SQLAggregationPlan(self, date_range, selections, grain)
+
+
+class SQLAggregationPlan(AggregationPlan):
+    """AggregationPlan whose scans are GROUP BY queries pushed down to a SQLiteStore."""
+
+    def __init__(self, store, date_range=None, selections=None, grain="Day"):
+        super().__init__(None)
+        self.store = store
+        self.date_range = date_range
+        self.selections = selections
+        self.grain = grain
+
+    def _scan(self, dims):
+        return self.store.aggregate(dims, self.date_range, self.selections, self.grain)
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,295 @@
+"""Streaming scrap ETL: CSV or Excel workbook -> cleaned, typed chunks -> columnar store.
+
+    python -m etl.pipeline scrap_2024.csv --chunk-size 250000 --known-machines machines.txt
+    python -m etl.pipeline plant_2024.xlsx --workers 8
+    python -m etl.pipeline --many "plants/*/*.csv" --output plant_wide.parquet --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.extract import (
+    DEFAULT_CHUNK_SIZE, DEFAULT_SHEET_CHUNK_SIZE, expand_sources, is_workbook, iter_csv_chunks, iter_sheet_chunks, open_workbook,
+    workbook_sheets,
+)
+from etl.load import ParquetChunkWriter
+from etl.transform import SCRAP_COLUMNS, clean_chunk
+from utils.data_processing import SOURCE_COLUMN, cache_path, source_labels
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb(children=False):
+    """Peak resident set size of this process (or its largest finished child) in MB, or None where the platform can't tell."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _load_chunks(chunks, writer, known_machines=None):
+    """Clean each chunk and append it to writer; returns (rows read, Counter of rejected rows)."""
+    rows_in = 0
+    rejected = Counter()
+    for chunk in chunks:
+        rows_in += len(chunk)
+        clean, chunk_rejected = clean_chunk(chunk, known_machines)
+        rejected.update(chunk_rejected)
+        writer.write(clean)
+    return rows_in, rejected
+
+
+def run_pipeline(source, target, chunk_size=DEFAULT_CHUNK_SIZE, known_machines=None, workers=None):
+    """Stream a scrap CSV (or workbook) into a typed Parquet file, holding at most one chunk in memory."""
+    if is_workbook(source):
+        return run_workbook_pipeline(source, target, min(chunk_size, DEFAULT_SHEET_CHUNK_SIZE), known_machines, workers)
+    start = time.perf_counter()
+    with ParquetChunkWriter(target) as writer:
+        rows_in, rejected = _load_chunks(iter_csv_chunks(source, chunk_size), writer, known_machines)
+    seconds = time.perf_counter() - start
+    return {
+        "source": source,
+        "target": target,
+        "rows_in": rows_in,
+        "rows_out": writer.rows,
+        "rejected": dict(rejected),
+        "seconds": seconds,
+        "rows_per_sec": rows_in / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _convert_sheet(worksheet, target, chunk_size, known_machines):
+    chunks = iter_sheet_chunks(worksheet, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return {"sheet": worksheet.title, "part": None, "skipped": "empty"}
+    missing = [col for col in SCRAP_COLUMNS if col not in first.columns]
+    if missing:
+        chunks.close()
+        return {"sheet": worksheet.title, "part": None, "skipped": f"missing {', '.join(missing)}"}
+    with ParquetChunkWriter(target) as writer:
+        rows_in, rejected = _load_chunks([first], writer, known_machines)
+        more_in, more_rejected = _load_chunks(chunks, writer, known_machines)
+    return {"sheet": worksheet.title, "part": target, "rows_in": rows_in + more_in, "rejected": rejected + more_rejected}
+
+
+def _convert_sheets(source, jobs, chunk_size, known_machines):
+    """Process-pool worker: stream each (sheet, part path) into its own Parquet part.
+
+    The workbook is opened once per group of sheets rather than once per sheet.
+    """
+    with open_workbook(source) as workbook:
+        return [_convert_sheet(workbook[sheet], target, chunk_size, known_machines) for sheet, target in jobs]
+
+
+def _balance(sizes, groups):
+    """Split item indexes into at most `groups` lists of similar total size, largest items placed first."""
+    loads = [0] * groups
+    assignment = [[] for _ in range(groups)]
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        lightest = loads.index(min(loads))
+        assignment[lightest].append(i)
+        loads[lightest] += max(sizes[i], 1)
+    return [sorted(group) for group in assignment if group]
+
+
+def run_workbook_pipeline(source, target, chunk_size=DEFAULT_SHEET_CHUNK_SIZE, known_machines=None, workers=None):
+    """Convert the sheets of a scrap workbook in parallel processes, then join the parts into target.
+
+    Sheets are split into one group per worker, balanced by row count. Each worker streams its
+    sheets in read-only mode into Parquet parts, holding one chunk at a time; the parts are then
+    copied into target row group by row group, in sheet order. Sheets without the scrap columns
+    (summaries, pivots) are skipped and reported.
+    """
+    start = time.perf_counter()
+    sheets = workbook_sheets(source)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sheets)))
+    parts_dir = f"{target}.parts"
+    os.makedirs(parts_dir, exist_ok=True)
+    parts = [os.path.join(parts_dir, f"{i:05d}.parquet") for i in range(len(sheets))]
+    groups = _balance([rows for _, rows in sheets], workers)
+    workers = max(1, len(groups))
+    results = {}
+    try:
+        if workers == 1:
+            jobs = [(name, part) for (name, _), part in zip(sheets, parts)]
+            results = dict(enumerate(_convert_sheets(source, jobs, chunk_size, known_machines)))
+        else:
+            # Spawned rather than forked: the Streamlit server that calls this runs other threads
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(len(groups), mp_context=context) as pool:
+                futures = {
+                    tuple(group): pool.submit(
+                        _convert_sheets, source, [(sheets[i][0], parts[i]) for i in group], chunk_size, known_machines
+                    )
+                    for group in groups
+                }
+                for group, future in futures.items():
+                    results.update(zip(group, future.result()))
+        results = [results[i] for i in range(len(sheets))]
+
+        with ParquetChunkWriter(target) as writer:
+            for result in results:
+                if result["part"] is None:
+                    continue
+                part = pq.ParquetFile(result["part"])
+                for group in range(part.num_row_groups):
+                    writer.write_table(part.read_row_group(group))
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    converted = [result for result in results if result["part"] is not None]
+    rows_in = sum(result["rows_in"] for result in converted)
+    seconds = time.perf_counter() - start
+    return {
+        "source": source,
+        "target": target,
+        "rows_in": rows_in,
+        "rows_out": writer.rows,
+        "rejected": dict(sum((result["rejected"] for result in converted), Counter())),
+        "seconds": seconds,
+        "rows_per_sec": rows_in / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_worker_rss_mb": peak_rss_mb(children=True) if workers > 1 else None,
+        "sheets": len(converted),
+        "skipped_sheets": {result["sheet"]: result["skipped"] for result in results if result["part"] is None},
+        "workers": workers,
+    }
+
+
+def run_many_pipeline(sources, chunk_size=DEFAULT_CHUNK_SIZE, known_machines=None, workers=None):
+    """Convert several scrap files into their columnar cache entries, one file per worker process.
+
+    Files whose content is already in the cache are not parsed again, and files with identical
+    content are converted once. Workbooks converted alongside other files keep their sheets in
+    their own worker; a lone workbook still spreads its sheets over the workers.
+    """
+    start = time.perf_counter()
+    targets = [cache_path(source) for source in sources]
+    pending = {}
+    for source, target in zip(sources, targets):
+        if not os.path.exists(target):
+            pending.setdefault(target, source)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+    results = {}
+    if workers == 1:
+        for target, source in pending.items():
+            results[target] = run_pipeline(source, target, chunk_size, known_machines, workers=None if len(pending) == 1 else 1)
+    else:
+        # Spawned rather than forked, as for workbook sheets
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            futures = {
+                target: pool.submit(run_pipeline, source, target, chunk_size, known_machines, 1)
+                for target, source in pending.items()
+            }
+            results = {target: future.result() for target, future in futures.items()}
+
+    converted = list(results.values())
+    rows_cached = sum(pq.ParquetFile(target).metadata.num_rows for target in set(targets) - set(results))
+    rows_in = sum(result["rows_in"] for result in converted)
+    seconds = time.perf_counter() - start
+    return {
+        "source": f"{len(sources)} files",
+        "target": "columnar cache",
+        "targets": targets,
+        "rows_in": rows_in + rows_cached,
+        "rows_out": sum(result["rows_out"] for result in converted) + rows_cached,
+        "rejected": dict(sum((Counter(result["rejected"]) for result in converted), Counter())),
+        "seconds": seconds,
+        "rows_per_sec": rows_in / seconds if seconds else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_worker_rss_mb": peak_rss_mb(children=True) if workers > 1 else None,
+        "files": len(sources),
+        "converted_files": len(converted),
+        "workers": workers,
+    }
+
+
+def write_combined(targets, labels, output):
+    """Stream converted files into one Parquet file with a Source column, row group by row group."""
+    with ParquetChunkWriter(output) as writer:
+        for target, label in zip(targets, labels):
+            part = pq.ParquetFile(target)
+            for group in range(part.num_row_groups):
+                table = part.read_row_group(group)
+                writer.write_table(table.append_column(SOURCE_COLUMN, pa.repeat(label, table.num_rows)))
+    return writer.rows
+
+
+def format_report(stats):
+    lines = [
+        f"{stats['source']} -> {stats['target']}",
+        f"  rows read:    {stats['rows_in']:,}",
+        f"  rows written: {stats['rows_out']:,}",
+    ]
+    for rule, count in sorted(stats["rejected"].items()):
+        lines.append(f"  rejected ({rule}): {count:,}")
+    if "files" in stats:
+        lines.append(
+            f"  files:        {stats['files']:,}, {stats['converted_files']:,} converted, "
+            f"{stats['files'] - stats['converted_files']:,} already cached ({stats['workers']} worker processes)"
+        )
+    if "sheets" in stats:
+        lines.append(f"  sheets:       {stats['sheets']:,} ({stats['workers']} worker processes)")
+        for sheet, reason in stats["skipped_sheets"].items():
+            lines.append(f"  skipped sheet {sheet!r}: {reason}")
+    lines.append(f"  {stats['seconds']:.2f} s, {stats['rows_per_sec']:,.0f} rows/s")
+    if stats["peak_rss_mb"] is not None:
+        lines.append(f"  peak RSS: {stats['peak_rss_mb']:,.0f} MB")
+    if stats.get("peak_worker_rss_mb") is not None:
+        lines.append(f"  peak worker RSS: {stats['peak_worker_rss_mb']:,.0f} MB")
+    return "\n".join(lines)
+
+
+def read_known_machines(path):
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a scrap CSV export or workbook into the typed columnar store.")
+    parser.add_argument("source", nargs="?", help="CSV or .xlsx file to ingest")
+    parser.add_argument("target", nargs="?", help="Parquet file to write (default: the upload cache entry for SOURCE)")
+    parser.add_argument("--many", nargs="+", metavar="PATH", help="files, directories or glob patterns to convert in parallel")
+    parser.add_argument("--output", help="with --many, also combine the files into this Parquet file with a Source column")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows held in memory at a time")
+    parser.add_argument("--known-machines", help="file with one valid Machine_ID per line; other machines are rejected")
+    parser.add_argument("--workers", type=int, help="processes converting files or workbook sheets (default: one per CPU)")
+    args = parser.parse_args(argv)
+    if (args.source is None) == (args.many is None):
+        parser.error("give either SOURCE or --many")
+
+    known_machines = read_known_machines(args.known_machines) if args.known_machines else None
+    if args.many:
+        sources = expand_sources(args.many)
+        if not sources:
+            parser.error("--many matched no CSV or workbook files")
+        stats = run_many_pipeline(sources, args.chunk_size, known_machines, args.workers)
+        print(format_report(stats))
+        if args.output:
+            rows = write_combined(stats["targets"], source_labels(sources), args.output)
+            print(f"  combined {rows:,} rows into {args.output}")
+        return
+    stats = run_pipeline(args.source, args.target or cache_path(args.source), args.chunk_size, known_machines, args.workers)
+    print(format_report(stats))
+
+
+if __name__ == "__main__":
+    main()
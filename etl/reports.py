@@ -0,0 +1,300 @@
+"""Batch report snapshots: the analysis pages' aggregations for standard filter presets, computed ahead.
+
+    python -m etl.reports uploaded_files/scrap_2024.csv --presets report_presets.json --workers 4
+    python -m etl.reports --dataset plant
+
+Each preset is a date window ending on the data's last day plus optional filters. It is
+aggregated by the groupings behind the KPIs, top machines and shifts, defect distribution,
+cost treemaps and daily trend, in parallel worker processes, and written as one small Parquet
+snapshot under report_snapshots/<dataset>/, listed in that directory's manifest.json. When a
+page's filter selection matches a preset, its aggregation plan starts from the snapshot
+instead of scanning the cube; the sidebar lists the presets so they can be picked directly.
+Run it from a scheduler (cron) after the morning's data has landed.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from etl.load import FULL_HISTORY, PartitionedStore
+from etl.pipeline import _balance, peak_rss_mb
+from utils.data_processing import DATE_COLUMN, CubeIndex, build_cube, file_hash, load_scrap_file, selection_key
+
+SNAPSHOT_DIR = "report_snapshots"
+# Groupings behind the pages' KPI, breakdown and cost views plus the daily trend; totals derive from any of them
+SNAPSHOT_GROUPINGS = [("Machine_ID",), ("Defect_Type",), ("Fabric_Type",), ("Shift",), ("Date",)]
+SNAPSHOT_GRAIN = "Day"
+DEFAULT_PRESETS = [
+    {"name": "Last day", "days": 1},
+    {"name": "Last 7 days", "days": 7},
+    {"name": "Last 30 days", "days": 30},
+    {"name": FULL_HISTORY},
+]
+PRESET_KEYS = {"name", "days", "filters"}
+
+_GROUPING = "_grouping"
+_SNAPSHOT_DIMS = [dim for dims in SNAPSHOT_GROUPINGS for dim in dims]
+
+
+# --- Presets ---
+def read_presets(path):
+    """Presets from a JSON list of {"name", "days" (optional), "filters" (optional: {dimension: [values]})}."""
+    with open(path) as f:
+        presets = json.load(f)
+    names = set()
+    for preset in presets:
+        unknown = set(preset) - PRESET_KEYS
+        if "name" not in preset or unknown:
+            raise ValueError(f"A preset needs a name and may only have {sorted(PRESET_KEYS)}: {preset}")
+        if preset["name"] in names:
+            raise ValueError(f"Preset names must be unique: {preset['name']!r}")
+        names.add(preset["name"])
+    return presets
+
+
+def resolve_preset(index, preset):
+    """(date_range, selections) of a preset over a query source; its window ends on the data's last day."""
+    end = pd.Timestamp(index.date_max).normalize()
+    days = preset.get("days")
+    date_range = (end - pd.Timedelta(days=days - 1), end) if days else (pd.Timestamp(index.date_min).normalize(), end)
+    selections = {}
+    for dim, values in preset.get("filters", {}).items():
+        if dim not in index.categories:
+            raise ValueError(f"Preset {preset['name']!r} filters on {dim}, which the dataset doesn't have")
+        unknown = set(map(str, values)) - set(map(str, index.categories[dim]))
+        if unknown:
+            raise ValueError(f"Preset {preset['name']!r}: no {dim} {', '.join(sorted(unknown))} in the dataset")
+        selections[dim] = list(values)
+    return date_range, selections
+
+
+def match_key(selection):
+    """A selection_key without the dimensions left unfiltered, so every page's widgets match the same preset."""
+    start, end, dims = selection
+    return start, end, tuple((dim, values) for dim, values in dims if values != "*")
+
+
+def _key_from_json(key):
+    start, end, dims = key
+    return start, end, tuple((dim, tuple(values)) for dim, values in dims)
+
+
+# --- Snapshot files ---
+def snapshot_dir(dataset_key):
+    return os.path.join(SNAPSHOT_DIR, hashlib.blake2b(dataset_key.encode(), digest_size=8).hexdigest())
+
+
+def write_snapshot(path, results):
+    """Write {dims: aggregated frame} as one Parquet file, each grouping's rows tagged with its dimensions."""
+    frames = []
+    for dims, frame in results.items():
+        frame = frame.assign(**{_GROUPING: "+".join(dims)})
+        frames.append(frame.astype({dim: str for dim in dims if dim != DATE_COLUMN}))
+    tmp = f"{path}.tmp"
+    pd.concat(frames, ignore_index=True).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """{dims: frame} as written by write_snapshot, dimensions back as categoricals."""
+    table = pd.read_parquet(path)
+    results = {}
+    for grouping, frame in table.groupby(_GROUPING, sort=False):
+        dims = tuple(grouping.split("+")) if grouping else ()
+        others = [col for col in _SNAPSHOT_DIMS if col in table.columns and col not in dims]
+        frame = frame.drop(columns=[_GROUPING] + others).reset_index(drop=True)
+        results[dims] = frame.astype({dim: "category" for dim in dims if dim != DATE_COLUMN})
+    return results
+
+
+def _compute_presets(index, jobs):
+    """Aggregate and write each (name, date_range, selections, path) job; returns a stats dict per job."""
+    stats = []
+    for name, date_range, selections, path in jobs:
+        start = time.perf_counter()
+        plan = index.plan(date_range, selections, SNAPSHOT_GRAIN)
+        write_snapshot(path, {dims: plan.get(*dims) for dims in SNAPSHOT_GROUPINGS})
+        stats.append({
+            "preset": name,
+            "cube_cells": len(plan.table) if plan.table is not None else 0,
+            "seconds": time.perf_counter() - start,
+            "kb": os.path.getsize(path) / 1024,
+        })
+    return stats
+
+
+def _compute_presets_from_file(cube_path, jobs):
+    # Process-pool worker: the cube is read once for the worker's whole group of presets
+    return _compute_presets(CubeIndex(pd.read_parquet(cube_path)), jobs)
+
+
+def build_snapshots(dataset_key, cube, presets=DEFAULT_PRESETS, workers=None):
+    """Precompute every preset's snapshot of a dataset's daily cube, spreading presets over worker processes."""
+    start = time.perf_counter()
+    index = CubeIndex(cube)
+    folder = snapshot_dir(dataset_key)
+    os.makedirs(folder, exist_ok=True)
+    jobs, entries = [], []
+    for i, preset in enumerate(presets):
+        date_range, selections = resolve_preset(index, preset)
+        path = os.path.join(folder, f"{i:03d}.parquet")
+        jobs.append((preset["name"], date_range, selections, path))
+        entries.append({
+            "name": preset["name"],
+            "date_range": [date.date().isoformat() for date in date_range],
+            "filters": {dim: [str(value) for value in values] for dim, values in selections.items()},
+            "key": match_key(selection_key(index, date_range, selections)),
+            "file": os.path.basename(path),
+        })
+
+    # Presets over longer windows scan more of the cube
+    sizes = [(date_range[1] - date_range[0]).days + 1 for _, date_range, _, _ in jobs]
+    groups = _balance(sizes, max(1, min(workers or os.cpu_count() or 1, len(jobs))))
+    if len(groups) <= 1:
+        stats = _compute_presets(index, jobs)
+    else:
+        cube_path = os.path.join(folder, "cube.parquet.tmp")
+        index.df.to_parquet(cube_path, index=False)
+        try:
+            # Spawned rather than forked, like the ingestion pipeline's workers
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(len(groups), mp_context=context) as pool:
+                futures = [pool.submit(_compute_presets_from_file, cube_path, [jobs[i] for i in group]) for group in groups]
+                by_job = {}
+                for group, future in zip(groups, futures):
+                    by_job.update(zip(group, future.result()))
+            stats = [by_job[i] for i in range(len(jobs))]
+        finally:
+            os.remove(cube_path)
+
+    manifest = {
+        "dataset_key": dataset_key,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "grain": SNAPSHOT_GRAIN,
+        "presets": entries,
+    }
+    tmp = os.path.join(folder, "manifest.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(folder, "manifest.json"))
+    return {
+        "dataset_key": dataset_key,
+        "folder": folder,
+        "presets": stats,
+        "workers": max(1, len(groups)),
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_worker_rss_mb": peak_rss_mb(children=True) if len(groups) > 1 else None,
+    }
+
+
+# --- Pages ---
+class ReportSnapshots:
+    """The preset snapshots of one dataset, as the pages use them."""
+
+    def __init__(self, folder=None, manifest=None):
+        self.folder = folder
+        self.created = manifest["created"] if manifest else None
+        self.grain = manifest["grain"] if manifest else SNAPSHOT_GRAIN
+        self.presets = []
+        self._entries = {}
+        self._loaded = {}
+        for entry in manifest["presets"] if manifest else []:
+            self.presets.append({
+                "name": entry["name"],
+                "date_range": tuple(pd.Timestamp(date) for date in entry["date_range"]),
+                "filters": entry["filters"],
+            })
+            self._entries[_key_from_json(entry["key"])] = entry
+
+    def match(self, selection):
+        """Name of the preset a page's selection_key matches, or None."""
+        entry = self._entries.get(match_key(selection))
+        return entry["name"] if entry else None
+
+    def results(self, selection, grain):
+        """{dims: frame} to seed the page's plan with, or {} when no preset matches.
+
+        Trend groupings are only handed out at the granularity they were computed for.
+        """
+        entry = self._entries.get(match_key(selection))
+        if entry is None:
+            return {}
+        if entry["file"] not in self._loaded:
+            self._loaded[entry["file"]] = read_snapshot(os.path.join(self.folder, entry["file"]))
+        results = self._loaded[entry["file"]]
+        if grain == self.grain:
+            return results
+        return {dims: frame for dims, frame in results.items() if DATE_COLUMN not in dims}
+
+
+_snapshots_memo = {}
+
+
+def report_snapshots(dataset_key):
+    """The dataset's ReportSnapshots, reread only when the batch job has rewritten its manifest."""
+    folder = snapshot_dir(dataset_key)
+    path = os.path.join(folder, "manifest.json")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return ReportSnapshots()
+    memo = _snapshots_memo.get(folder)
+    if memo is None or memo[0] != mtime:
+        with open(path) as f:
+            memo = _snapshots_memo[folder] = (mtime, ReportSnapshots(folder, json.load(f)))
+    return memo[1]
+
+
+# --- Command line ---
+def open_cube(source=None, dataset=None):
+    """(dataset key, daily cube) for an uploaded file or a partitioned dataset's full history, keyed as the Upload page does."""
+    if dataset is not None:
+        store = PartitionedStore.open(dataset)
+        if not store.partitions():
+            raise ValueError(f"Dataset {dataset!r} has no rows")
+        return store.dataset_key(FULL_HISTORY), store.read_cube()
+    return file_hash(source), build_cube(load_scrap_file(source))
+
+
+def format_report(stats):
+    lines = [f"{stats['dataset_key']} -> {stats['folder']}"]
+    for preset in stats["presets"]:
+        lines.append(
+            f"  {preset['preset']:<24} {preset['cube_cells']:>12,} cube cells  {preset['seconds']:6.2f} s  {preset['kb']:7.1f} KB"
+        )
+    lines.append(f"  {len(stats['presets'])} presets in {stats['seconds']:.2f} s ({stats['workers']} worker processes)")
+    if stats["peak_rss_mb"] is not None:
+        lines.append(f"  peak RSS: {stats['peak_rss_mb']:,.0f} MB")
+    if stats.get("peak_worker_rss_mb") is not None:
+        lines.append(f"  peak worker RSS: {stats['peak_worker_rss_mb']:,.0f} MB")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the analysis pages' results for standard filter presets.")
+    parser.add_argument("source", nargs="?", help="uploaded CSV or workbook the pages load")
+    parser.add_argument("--dataset", help="partitioned dataset (its full history) instead of a file")
+    parser.add_argument("--presets", help="JSON list of presets (default: last day, last 7 and 30 days, all history)")
+    parser.add_argument("--workers", type=int, help="processes computing presets (default: one per CPU)")
+    args = parser.parse_args(argv)
+    if (args.source is None) == (args.dataset is None):
+        parser.error("give either SOURCE or --dataset")
+
+    presets = read_presets(args.presets) if args.presets else DEFAULT_PRESETS
+    dataset_key, cube = open_cube(args.source, args.dataset)
+    print(format_report(build_snapshots(dataset_key, cube, presets, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Column roles: which column of an export holds each field the app works with.
+
+Exports name the same field differently (Scrap_M, Qty_Scrap_m, Quantity_Scrapped_meters). A
+ColumnRoles maps each role (the app's own column names) to a column of one header layout.
+Roles are inferred from a sample of the file, confirmed by the user and stored per header
+layout, so every later export with the same header is parsed with them: only the mapped
+columns are read, with explicit dtypes and date format, and renamed to the role names.
+"""
+import hashlib
+import json
+import os
+import re
+import warnings
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from utils.data_processing import CATEGORY_COLUMNS, DATE_COLUMN, MEASURE_COLUMNS, parse_dates
+
+ROLES = [DATE_COLUMN] + CATEGORY_COLUMNS + MEASURE_COLUMNS
+# Confirmed mappings, one JSON file per header layout
+ROLES_DIR = "column_roles"
+
+# Normalized column names (see _normalize) that usually hold each role
+ROLE_ALIASES = {
+    "Date": ["date", "day", "prod_date", "production_date", "scrap_date", "datetime", "timestamp"],
+    "Machine_ID": ["machine", "machine_no", "machine_nr", "mach", "loom", "loom_id", "equipment", "asset", "mc"],
+    "Defect_Type": ["defect", "defect_code", "defect_name", "fault", "fault_type", "scrap_reason", "reason"],
+    "Fabric_Type": ["fabric", "fabric_code", "material", "article", "cloth", "quality"],
+    "Shift": ["shift", "shift_code", "crew", "team"],
+    "Quantity_Scrapped_meters": ["scrap_m", "scrap_meters", "scrap_qty", "qty_scrap_m", "qty", "quantity", "meters", "metres"],
+    "Scrap_Cost": ["cost", "scrap_value", "cost_eur", "cost_usd", "value", "amount"],
+}
+# A column only takes a date or measure role when this share of its sample values parses
+MIN_PARSED_SHARE = 0.9
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]+", "_", str(name).lower()).strip("_")
+
+
+def header_key(header):
+    """Stable identifier of a header layout (column names in order)."""
+    return hashlib.blake2b("\x1f".join(map(str, header)).encode(), digest_size=8).hexdigest()
+
+
+class ColumnRoles:
+    """Role -> column mapping for one header layout, plus the date format of the Date column."""
+
+    def __init__(self, header, columns, date_format=None):
+        self.header = [str(name) for name in header]
+        self.columns = {role: columns[role] for role in ROLES if columns.get(role) is not None}
+        self.date_format = date_format
+
+    @classmethod
+    def identity(cls, header):
+        """Roles of a header that already uses the app's column names."""
+        names = set(map(str, header))
+        return cls(header, {role: role for role in ROLES if role in names})
+
+    @property
+    def key(self):
+        return header_key(self.header)
+
+    def missing(self):
+        return [role for role in ROLES if role not in self.columns]
+
+    def is_identity(self):
+        return self.date_format is None and all(role == column for role, column in self.columns.items())
+
+    def fingerprint(self):
+        """Short hash of the mapping, part of the columnar cache key of files parsed with it."""
+        payload = json.dumps([sorted(self.columns.items()), self.date_format])
+        return hashlib.blake2b(payload.encode(), digest_size=4).hexdigest()
+
+    def usecols(self):
+        return list(self.columns.values())
+
+    def dtypes(self, numeric_measures=True):
+        """read_csv dtypes by source column: dimensions and dates as categoricals, measures as float32."""
+        dtypes = {}
+        for role, column in self.columns.items():
+            if role in MEASURE_COLUMNS:
+                if numeric_measures:
+                    dtypes[column] = "float32"
+            else:
+                dtypes[column] = "category"
+        return dtypes
+
+    def apply(self, chunk):
+        """Rename a chunk read with usecols to the role names, parsing dates with the stored format."""
+        chunk = chunk.rename(columns={column: role for role, column in self.columns.items()})
+        if DATE_COLUMN in chunk.columns and self.date_format is not None:
+            chunk[DATE_COLUMN] = parse_dates(chunk[DATE_COLUMN], self.date_format)
+        return chunk
+
+    def to_dict(self):
+        return {"header": self.header, "columns": self.columns, "date_format": self.date_format}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["header"], data["columns"], data.get("date_format"))
+
+
+# --- Storage ---
+def _roles_path(key):
+    return os.path.join(ROLES_DIR, f"{key}.json")
+
+
+def save_roles(roles):
+    os.makedirs(ROLES_DIR, exist_ok=True)
+    path = _roles_path(roles.key)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(roles.to_dict(), f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_roles(header):
+    """The confirmed roles of a header layout, or None if none were stored."""
+    path = _roles_path(header_key(header))
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return ColumnRoles.from_dict(json.load(f))
+
+
+def roles_for_header(header):
+    """Confirmed roles of a header, else the columns that already carry a role's name."""
+    return load_roles(header) or ColumnRoles.identity(header)
+
+
+# --- Inference ---
+def infer_date_format(values):
+    """strftime format every sampled value parses with, trying month-first then day-first; or None."""
+    values = pd.Series(values)
+    # Workbook dates usually arrive as real dates; only text needs a format
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    values = values.dropna().astype(str).str.strip()
+    values = values[values != ""]
+    if values.empty:
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        candidates = [guess_datetime_format(values.iloc[0], dayfirst=dayfirst) for dayfirst in (False, True)]
+    for date_format in dict.fromkeys(candidates):
+        if date_format is not None and pd.to_datetime(values, format=date_format, errors="coerce").notna().all():
+            return date_format
+    return None
+
+
+def _parsed_share(values, role):
+    values = values.dropna()
+    if values.empty:
+        return 0.0
+    if role == DATE_COLUMN:
+        if pd.api.types.is_numeric_dtype(values):
+            return 0.0
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            parsed = pd.to_datetime(values.astype(str), errors="coerce", format="mixed")
+    else:
+        parsed = pd.to_numeric(values, errors="coerce")
+    return float(parsed.notna().mean())
+
+
+def _name_score(column, role):
+    name = _normalize(column)
+    if name == _normalize(role):
+        return 3.0
+    aliases = ROLE_ALIASES[role]
+    if name in aliases:
+        return 2.0
+    tokens = set(name.split("_"))
+    return 1.0 if any(alias in tokens for alias in aliases if "_" not in alias) else 0.0
+
+
+def infer_roles(sample):
+    """Best guess of a sample's column roles, from column names and what the values parse as.
+
+    Each column takes at most one role. Date and measure roles need values that parse as
+    dates or numbers; a Date column is also recognised by its values alone.
+    """
+    candidates = []
+    for column in sample.columns:
+        for role in ROLES:
+            score = _name_score(column, role)
+            if role == DATE_COLUMN or role in MEASURE_COLUMNS:
+                if _parsed_share(sample[column], role) < MIN_PARSED_SHARE:
+                    continue
+                score += 0.5
+            elif pd.api.types.is_float_dtype(sample[column]):
+                continue  # continuous values aren't categories
+            if score > 0.5 or (role == DATE_COLUMN and score > 0):
+                candidates.append((score, role, column))
+
+    columns = {}
+    for score, role, column in sorted(candidates, key=lambda item: -item[0]):
+        if role not in columns and column not in columns.values():
+            columns[role] = column
+    date_format = infer_date_format(sample[columns[DATE_COLUMN]]) if DATE_COLUMN in columns else None
+    return ColumnRoles(sample.columns, columns, date_format)
@@ -0,0 +1,55 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from utils.data_processing import CATEGORY_COLUMNS, DATE_COLUMN, MEASURE_COLUMNS, enforce_schema
+
+SCRAP_COLUMNS = [DATE_COLUMN] + CATEGORY_COLUMNS + MEASURE_COLUMNS
+
+
+def _strip_categories(values):
+    """Trim whitespace around categorical labels, merging labels that become equal."""
+    stripped = values.cat.categories.astype(str).str.strip()
+    if stripped.equals(values.cat.categories):
+        return values
+    unique = pd.Index(stripped.unique())
+    remap = np.append(unique.get_indexer(stripped), -1)
+    return pd.Series(pd.Categorical.from_codes(remap[values.cat.codes.to_numpy()], unique), index=values.index, name=values.name)
+
+
+def clean_chunk(chunk, known_machines=None):
+    """Project, type-coerce and validate one chunk of scrap events.
+
+    Returns the valid rows and a Counter of rejected rows per rule. Rows are rejected for an
+    unparseable date, a missing or negative quantity/cost, a missing dimension value or, when
+    known_machines is given, a Machine_ID outside that set.
+    """
+    chunk = chunk[[col for col in SCRAP_COLUMNS if col in chunk.columns]]
+    for col in CATEGORY_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = _strip_categories(chunk[col].astype("category"))
+    chunk = enforce_schema(chunk)
+
+    rules = {"bad_date": chunk[DATE_COLUMN].isna()}
+    for col in MEASURE_COLUMNS:
+        if col in chunk.columns:
+            rules[f"missing_{col}"] = chunk[col].isna()
+            rules[f"negative_{col}"] = chunk[col] < 0
+    for col in CATEGORY_COLUMNS:
+        if col in chunk.columns:
+            rules[f"missing_{col}"] = chunk[col].isna()
+    if known_machines is not None and "Machine_ID" in chunk.columns:
+        rules["unknown_machine"] = chunk["Machine_ID"].notna() & ~chunk["Machine_ID"].isin(known_machines)
+
+    rejected = Counter()
+    bad = np.zeros(len(chunk), dtype=bool)
+    for rule, mask in rules.items():
+        # Each row is counted under the first rule it breaks
+        hits = mask.to_numpy() & ~bad
+        if hits.any():
+            rejected[rule] = int(hits.sum())
+            bad |= hits
+    if bad.any():
+        chunk = chunk[~bad]
+    return chunk, rejected
@@ -0,0 +1,234 @@
+"""Content-addressed store of uploaded files, with the metadata index the file picker reads.
+
+    uploaded_files/objects/<content hash>.csv   one copy per distinct content
+    uploaded_files/index.json                   per object: the names it was uploaded as, its size,
+                                                upload time and, once ingested, row count, date
+                                                range, distinct machines/defects and schema
+
+Uploads are streamed to disk in chunks and hashed on the way (the same hash as file_hash),
+so uploading the same content again under any name stores nothing new, and two different
+files uploaded under one name both stay. The metadata is taken once, when a file is ingested,
+from its columnar copy's Parquet statistics and dimension columns, so listing and sorting
+the uploads never opens them. Files copied into uploaded_files/ by hand are indexed in place,
+or merged into the stored copy of their content and removed.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.data_processing import DATE_COLUMN, file_hash
+
+UPLOAD_DIR = "uploaded_files"
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+INDEX_FILE = "index.json"
+OBJECTS_DIR = "objects"
+# Dimensions whose distinct values are counted for the picker
+DISTINCT_COLUMNS = {"machines": "Machine_ID", "defects": "Defect_Type"}
+
+# Sessions of one server share the index file; updates re-read it under this lock
+_index_lock = threading.Lock()
+
+
+def describe_columnar(path):
+    """Row count, date range, distinct machines/defects and schema of a columnar copy."""
+    parquet = pq.ParquetFile(path)
+    schema = parquet.schema_arrow
+    meta = {
+        "rows": parquet.metadata.num_rows,
+        "columns": {field.name: str(field.type) for field in schema},
+        "date_min": None,
+        "date_max": None,
+    }
+    if DATE_COLUMN in schema.names and parquet.metadata.num_rows:
+        column = schema.get_field_index(DATE_COLUMN)
+        stats = [parquet.metadata.row_group(i).column(column).statistics for i in range(parquet.metadata.num_row_groups)]
+        if all(s is not None and s.has_min_max for s in stats):
+            bounds = [(s.min, s.max) for s in stats]
+        else:
+            dates = pq.read_table(path, columns=[DATE_COLUMN])[DATE_COLUMN].to_pandas()
+            bounds = [(dates.min(), dates.max())]
+        if bounds:
+            meta["date_min"] = pd.Timestamp(min(lo for lo, _ in bounds)).isoformat()
+            meta["date_max"] = pd.Timestamp(max(hi for _, hi in bounds)).isoformat()
+    dims = [col for col in DISTINCT_COLUMNS.values() if col in schema.names]
+    table = pq.read_table(path, columns=dims, read_dictionary=dims)
+    for name, col in DISTINCT_COLUMNS.items():
+        if col in dims:
+            distinct = table[col].unique()
+            meta[name] = len(distinct) - distinct.null_count
+    return meta
+
+
+class UploadStore:
+    """Uploaded files by content hash, and what is known about each of them."""
+
+    def __init__(self, root=UPLOAD_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, OBJECTS_DIR)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index = self._read_index()
+
+    @classmethod
+    def open(cls, root=UPLOAD_DIR):
+        store = cls(root)
+        store.adopt_loose_files()
+        return store
+
+    def _index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def _read_index(self):
+        if os.path.exists(self._index_path()):
+            with open(self._index_path()) as f:
+                return json.load(f)
+        return {"objects": {}, "loose": {}}
+
+    def _write_index(self):
+        tmp = f"{self._index_path()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp, self._index_path())
+
+    def _update(self, change):
+        with _index_lock:
+            self.index = self._read_index()
+            result = change(self.index["objects"])
+            self._write_index()
+        return result
+
+    @staticmethod
+    def _register(objects, digest, name, path, size, found=None):
+        """Index name for the content digest. An upload is stamped now; a file found on disk is stamped
+        with found (its mtime) only if its content is new, so adopting it again keeps its place when sorted."""
+        entry = objects.get(digest)
+        if entry is None:
+            uploaded = time.time() if found is None else found
+            entry = objects[digest] = {"path": path, "names": [], "size": size, "uploaded": uploaded, "meta": None}
+        elif found is None:
+            entry["uploaded"] = time.time()
+        if name not in entry["names"]:
+            entry["names"].append(name)
+        return entry
+
+    # --- Writing ---
+    def put(self, stream, name, chunk_size=UPLOAD_CHUNK_SIZE):
+        """Store an uploaded file-like object under name; returns (path, whether its content was new)."""
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        tmp = os.path.join(self.objects_dir, f".{os.getpid()}-{threading.get_ident()}.upload")
+        stream.seek(0)
+        with open(tmp, "wb") as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        digest = digest.hexdigest()
+        path = os.path.join(self.objects_dir, f"{digest}{os.path.splitext(name)[1].lower()}")
+
+        def register(objects):
+            existing = objects.get(digest)
+            new = existing is None or not os.path.exists(existing["path"])
+            if new:
+                objects.pop(digest, None)
+                os.replace(tmp, path)
+            else:
+                os.remove(tmp)
+            return self._register(objects, digest, name, path, size)["path"], new
+        return self._update(register)
+
+    def adopt_loose_files(self):
+        """Index files copied into the upload directory by hand; each is hashed once.
+
+        A file with new content is indexed in place. A file whose content is already stored only
+        adds its name to that object and is then removed, so each content is kept once. Names of
+        indexed files deleted since are dropped.
+        """
+        loose = self.index.get("loose", {})
+        found = {}
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name in (INDEX_FILE, f"{INDEX_FILE}.tmp", OBJECTS_DIR) or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            found[name] = (path, stat.st_size, stat.st_mtime_ns)
+        changed = {
+            name: info for name, info in found.items()
+            if loose.get(name, {}).get("mtime_ns") != info[2] or loose[name].get("size") != info[1]
+            # Indexed before duplicates were merged: the same content is stored elsewhere too
+            or self._stored_elsewhere(self.index["objects"], loose[name]["digest"], info[0])
+        }
+        if not changed and set(found) == set(loose):
+            return
+
+        def adopt(objects):
+            loose = self.index.setdefault("loose", {})
+            for name in [name for name in loose if name not in found]:
+                record = loose.pop(name)
+                entry = objects.get(record["digest"])
+                if entry is not None and name in entry["names"] and len(entry["names"]) > 1:
+                    entry["names"].remove(name)
+            for name, (path, size, mtime_ns) in changed.items():
+                digest = file_hash(path)
+                # A loose file overwritten with other content no longer holds the old object
+                for stale in [d for d, entry in objects.items() if entry["path"] == path and d != digest]:
+                    del objects[stale]
+                if self._stored_elsewhere(objects, digest, path):
+                    self._register(objects, digest, name, path, size, found=mtime_ns / 1e9)
+                    loose.pop(name, None)
+                    os.remove(path)
+                    continue
+                if digest in objects:
+                    # Its stored copy is gone (or it is this file): the file holds the content now
+                    objects[digest]["path"] = path
+                self._register(objects, digest, name, path, size, found=mtime_ns / 1e9)
+                loose[name] = {"digest": digest, "size": size, "mtime_ns": mtime_ns}
+            # Loose files removed since they were indexed
+            gone = [digest for digest, entry in objects.items() if not os.path.exists(entry["path"])]
+            for digest in gone:
+                del objects[digest]
+        self._update(adopt)
+
+    @staticmethod
+    def _stored_elsewhere(objects, digest, path):
+        entry = objects.get(digest)
+        return (
+            entry is not None and os.path.normpath(entry["path"]) != os.path.normpath(path)
+            and os.path.exists(entry["path"])
+        )
+
+    def describe(self, path, columnar_path):
+        """Record the metadata of an ingested file from its columnar copy, unless it is already known."""
+        entry = self.entry(path)
+        if entry is None or entry["meta"] is not None:
+            return entry
+
+        meta = describe_columnar(columnar_path)
+
+        def record(objects):
+            for stored in objects.values():
+                if stored["path"] == entry["path"]:
+                    stored["meta"] = meta
+                    return stored
+        return self._update(record)
+
+    # --- Reading ---
+    def entries(self):
+        """Index entries of every stored file: path, names, size, upload time and metadata (None until ingested)."""
+        return list(self.index["objects"].values())
+
+    def entry(self, path):
+        path = os.path.normpath(path)
+        for entry in self.index["objects"].values():
+            if os.path.normpath(entry["path"]) == path:
+                return entry
+        return None
+
+    def display_name(self, path):
+        """The name a stored file was last uploaded as, or the path of a file outside the store."""
+        entry = self.entry(path)
+        return entry["names"][-1] if entry else path
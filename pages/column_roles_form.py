@@ -0,0 +1,54 @@
+import os
+
+import streamlit as st
+
+from etl.extract import read_header, read_sample, stored_roles
+from etl.roles import ROLES, ColumnRoles, infer_date_format, infer_roles, save_roles
+from utils.data_processing import DATE_COLUMN
+
+UNASSIGNED = "—"
+
+
+def has_column_roles(path):
+    """Whether a file can be parsed: its header layout has confirmed roles or already uses the app's names."""
+    return stored_roles(path) is not None or not ColumnRoles.identity(read_header(path)).missing()
+
+
+def column_roles_form(path):
+    """Ask the user to confirm the roles inferred for a file whose columns aren't named as the app expects.
+
+    Returns True once the file can be loaded; until then it renders the form and returns False.
+    """
+    if has_column_roles(path):
+        return True
+
+    sample = read_sample(path)
+    inferred = infer_roles(sample)
+    st.subheader(f"🧭 Column roles: {os.path.basename(path)}")
+    st.write(
+        "Pick the column that holds each field. The choice is remembered for every file with "
+        "the same columns, and only these columns are parsed."
+    )
+    options = [UNASSIGNED] + list(sample.columns)
+    with st.form(f"column_roles_{inferred.key}"):
+        left, right = st.columns(2)
+        choices = {}
+        for i, role in enumerate(ROLES):
+            column = inferred.columns.get(role, UNASSIGNED)
+            choices[role] = (left if i % 2 == 0 else right).selectbox(role, options, index=options.index(column))
+        st.dataframe(sample.head(5))
+        confirmed = st.form_submit_button("Confirm column roles")
+
+    if confirmed:
+        columns = {role: column for role, column in choices.items() if column != UNASSIGNED}
+        missing = [role for role in ROLES if role not in columns]
+        repeated = sorted({column for column in columns.values() if list(columns.values()).count(column) > 1})
+        if missing:
+            st.error(f"Every field needs a column; missing: {', '.join(missing)}")
+        elif repeated:
+            st.error(f"A column can only hold one field: {', '.join(repeated)}")
+        else:
+            save_roles(ColumnRoles(sample.columns, columns, infer_date_format(sample[columns[DATE_COLUMN]])))
+            st.rerun()
+    st.info(f"Inferred from the first {len(sample):,} rows; nothing is loaded until the roles are confirmed.")
+    return False
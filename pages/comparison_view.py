@@ -0,0 +1,161 @@
+import pandas as pd
+import streamlit as st
+
+from column_roles_form import has_column_roles
+from etl.load import FULL_HISTORY, PartitionedStore, list_datasets
+from etl.reports import open_cube, report_snapshots
+from etl.uploads import UploadStore
+from utils.charts import delta_bar_chart, figure_memo, line_chart, plotly_chart
+from utils.comparison import BASELINE_SUFFIX, CHANGE_SUFFIX, CURRENT_SUFFIX, DELTA_SUFFIX, PERIOD_COLUMN, ComparisonPlan
+from utils.data_processing import DATE_COLUMN, file_hash, selection_key
+from utils.profiling import annotate, span
+from utils.session_state import get_comparison_source
+
+COMPARE_MODES = ["Previous period", "Same period last year", "Custom period", "Another dataset"]
+# Breakdowns offered with per-group deltas: dimension -> label
+COMPARE_DIMENSIONS = {"Machine_ID": "Machine", "Defect_Type": "Defect type", "Fabric_Type": "Fabric", "Shift": "Shift"}
+# Headline measures: column -> (label, value format)
+COMPARE_MEASURES = {
+    "Quantity_Scrapped_meters": ("Total Scrap (m)", "{:,.2f}"),
+    "Scrap_Cost": ("Total Scrap Cost", "${:,.2f}"),
+    "Event_Count": ("Scrap Events", "{:,.0f}"),
+}
+MEASURE = "Quantity_Scrapped_meters"
+
+
+def baseline_period(mode, start, end):
+    """Date range the current (start, end) is compared with: the equally long period before it, or a year earlier."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if mode == "Previous period":
+        days = pd.Timedelta(days=(end - start).days + 1)
+        return start - days, end - days
+    if mode == "Same period last year":
+        return start - pd.DateOffset(years=1), end - pd.DateOffset(years=1)
+    return start, end
+
+
+def choose_dataset(prefix):
+    """Picker of an upload or partitioned dataset; returns (dataset key, its CubeIndex, its name) or None."""
+    options = {("file", entry["path"]): entry["names"][-1] for entry in UploadStore.open().entries()}
+    options.update({("dataset", name): f"{name} (dataset)" for name in list_datasets()})
+    if not options:
+        st.info("Upload another file, or create a dataset, to compare with.")
+        return None
+    kind, name = st.selectbox("Baseline dataset", list(options), format_func=options.get, key=f"{prefix}compare_dataset")
+    if kind == "file" and not has_column_roles(name):
+        st.warning("Confirm this file's column roles by loading it on the Upload Data page first.")
+        return None
+    if kind == "dataset" and not PartitionedStore.open(name).partitions():
+        st.info(f"Dataset '{name}' has no rows yet.")
+        return None
+    # Keyed as the Upload page keys the dataset, so the batch job's report snapshots apply to it too
+    key = file_hash(name) if kind == "file" else PartitionedStore.open(name).dataset_key(FULL_HISTORY)
+    with st.spinner(f"Building the daily cube of {options[(kind, name)]}..."), span("open_baseline"):
+        source = get_comparison_source(key, lambda: open_cube(**{"source" if kind == "file" else "dataset": name})[1])
+    return key, source, options[(kind, name)]
+
+
+def side_label(side, date_range):
+    return f"{side} ({pd.Timestamp(date_range[0]).date()} → {pd.Timestamp(date_range[1]).date()})"
+
+
+def comparison_view(source, plan, selection, selections, grain, prefix):
+    """⚖️ Compare view: the page's selection (current) against another period or dataset (baseline).
+
+    The current side is the page's own plan, so groupings it already computed are reused;
+    the baseline gets a plan of its own over its cube, with the same filters.
+    """
+    mode = st.radio("Compare with", COMPARE_MODES, horizontal=True, key=f"{prefix}compare_mode")
+    annotate(compare=mode)
+    current_range = (pd.Timestamp(selection[0]), pd.Timestamp(selection[1]))
+
+    baseline_name = None
+    if mode == "Another dataset":
+        chosen = choose_dataset(prefix)
+        if chosen is None:
+            return
+        baseline_key, baseline_source, baseline_name = chosen
+        baseline_range = current_range
+        # Values are matched by name; "all values" stays all of the baseline's own values, and
+        # filters on dimensions the baseline doesn't have (e.g. Source) can't apply to it
+        narrowed = {dim: list(values) for dim, values in selection[2] if values != "*"}
+        baseline_selections = {dim: values for dim, values in narrowed.items() if dim in baseline_source.categories}
+        dropped = [dim for dim in narrowed if dim not in baseline_selections]
+        if dropped:
+            st.caption(f"Filters not applied to {baseline_name}, which has no such column: {', '.join(dropped)}")
+    else:
+        baseline_key, baseline_source = st.session_state.dataset_key, source
+        baseline_range = baseline_period(mode, *current_range)
+        if mode == "Custom period":
+            picked = st.date_input(
+                "Baseline period", value=tuple(date.date() for date in baseline_period("Previous period", *current_range)),
+                key=f"{prefix}compare_dates",
+            )
+            if len(picked) < 2:
+                return
+            baseline_range = (pd.Timestamp(picked[0]), pd.Timestamp(picked[1]))
+        baseline_selections = selections
+
+    baseline_plan = baseline_source.plan(baseline_range, baseline_selections, grain)
+    baseline_selection = selection_key(baseline_source, baseline_range, baseline_selections)
+    baseline_plan.seed(report_snapshots(baseline_key).results(baseline_selection, grain))
+    comparison = ComparisonPlan(plan, baseline_plan, current_range, baseline_range, grain)
+    memo = figure_memo(st.session_state.dataset_key, selection, grain, "compare", baseline_key, baseline_selection)
+    labels = {CURRENT_SUFFIX: side_label("Current", current_range), BASELINE_SUFFIX: side_label("Baseline", baseline_range)}
+    st.caption(f"{labels[CURRENT_SUFFIX]} vs {labels[BASELINE_SUFFIX]}" + (f" of {baseline_name}" if baseline_name else ""))
+
+    dimensions = [dim for dim in COMPARE_DIMENSIONS if dim in source.categories and dim in baseline_source.categories]
+    dim = st.radio(
+        "Break down by", dimensions, horizontal=True, key=f"{prefix}compare_dim", format_func=COMPARE_DIMENSIONS.get
+    )
+    # Totals derive from the trend, so each side scans once per grouping at most
+    comparison.require([DATE_COLUMN], [dim])
+
+    # --- Totals ---
+    totals = memo("compare:totals", lambda: comparison.get()).iloc[0]
+    columns = st.columns(len(COMPARE_MEASURES))
+    for column, (measure, (label, value_format)) in zip(columns, COMPARE_MEASURES.items()):
+        if f"{measure}{CURRENT_SUFFIX}" not in totals:
+            continue
+        change = totals[f"{measure}{CHANGE_SUFFIX}"]
+        column.metric(
+            label, value_format.format(totals[f"{measure}{CURRENT_SUFFIX}"]),
+            delta=value_format.format(totals[f"{measure}{DELTA_SUFFIX}"]) + ("" if pd.isna(change) else f" ({change:+.1%})"),
+            delta_color="inverse",
+        )
+
+    # --- Trend, both sides on one axis ---
+    st.subheader(f"Scrap Over Time ({grain})")
+
+    def trend_fig():
+        trend = comparison.trend()
+        x = DATE_COLUMN if DATE_COLUMN in trend.columns else PERIOD_COLUMN
+        sides = trend[[x, f"{MEASURE}{CURRENT_SUFFIX}", f"{MEASURE}{BASELINE_SUFFIX}"]].melt(
+            id_vars=x, var_name="Side", value_name=MEASURE
+        )
+        sides["Side"] = sides["Side"].str.removeprefix(MEASURE).map(labels)
+        fig = line_chart(sides, x=x, y=MEASURE, color="Side", markers=True)
+        if x == PERIOD_COLUMN:
+            fig.update_xaxes(title=f"{grain}s since the start of each period")
+        return fig
+
+    plotly_chart(memo("compare:trend", trend_fig), use_container_width=True)
+
+    # --- Deltas per group ---
+    st.subheader(f"Change per {COMPARE_DIMENSIONS[dim]}")
+    plotly_chart(memo(f"compare:{dim}", lambda: delta_bar_chart(
+        comparison.get(dim), y=dim, delta=f"{MEASURE}{DELTA_SUFFIX}", title=f"Largest changes in scrap (m) by {COMPARE_DIMENSIONS[dim]}",
+    )), use_container_width=True)
+
+    def delta_table():
+        table = comparison.get(dim)
+        names = {
+            f"{MEASURE}{CURRENT_SUFFIX}": "Current (m)", f"{MEASURE}{BASELINE_SUFFIX}": "Baseline (m)",
+            f"{MEASURE}{DELTA_SUFFIX}": "Δ (m)", f"{MEASURE}{CHANGE_SUFFIX}": "Δ %",
+            f"Scrap_Cost{DELTA_SUFFIX}": "Δ cost",
+        }
+        table = table[[dim] + [col for col in names if col in table.columns]].rename(columns=names)
+        return table.reindex(table["Δ (m)"].abs().sort_values(ascending=False).index).set_index(dim)
+
+    st.dataframe(memo(f"compare:table:{dim}", delta_table).style.format({"Δ %": "{:+.1%}"}, precision=2))
+    st.sidebar.caption(f"⚖️ {baseline_plan.scans} full-table scan(s) for the baseline this rerun")
@@ -0,0 +1,25 @@
+import pandas as pd
+import streamlit as st
+
+from utils.profiling import PROFILE_LOG
+
+
+def show_debug_panel(profile):
+    """Opt-in sidebar breakdown of the rerun that just finished: time and RSS change per stage."""
+    if not st.sidebar.checkbox("🐞 Performance debug", key="debug_panel") or profile.total_ms is None:
+        return
+
+    record = profile.record()
+    with st.sidebar.expander(f"⏱️ Last rerun: {profile.total_ms:,.0f} ms", expanded=True):
+        spans = pd.DataFrame(record["spans"])
+        # Indent each stage under its parent instead of repeating the full path
+        depth = spans["stage"].str.count("/")
+        spans["stage"] = [" " * 2 * d + stage.rsplit("/", 1)[-1] for d, stage in zip(depth, spans["stage"])]
+        st.dataframe(
+            spans.rename(columns={"rss_delta_mb": "RSS Δ MB"}),
+            hide_index=True, use_container_width=True,
+        )
+        context = {key: value for key, value in record.items() if key not in ("spans", "ts", "page", "total_ms")}
+        st.json(context, expanded=False)
+        if PROFILE_LOG:
+            st.caption(f"Every rerun is logged to `{PROFILE_LOG}`; `python -m utils.profiling` reports p50/p95 per stage.")
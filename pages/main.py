@@ -1,10 +1,19 @@
+import os
+import sys
+
 import streamlit as st
 import pandas as pd
 
+# Make the top-level utils/ and etl/ packages importable under `streamlit run pages/main.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import upload_data_page          # <-- your upload page
 import scrap_analysis_page
 import quality_reports_page
 import home_page
+from debug_panel import show_debug_panel
+from utils.profiling import profile_rerun
+from utils.session_state import session_id
 
 st.set_page_config(page_title="Digital Scrap & Quality Tracker", layout="wide")
 
@@ -48,12 +57,15 @@ to focus on a specific time period or contributor group.
 """
 )
 
-# ---- Page selection ----
-if page == "Upload Data":
-    upload_data_page.show_upload_data_page()
+# ---- Page selection (each rerun is profiled; see the debug panel) ----
+with profile_rerun(page, session_id()) as profile:
+    if page == "Upload Data":
+        upload_data_page.show_upload_data_page()
+
+    elif page == "Scrap Analysis":
+        scrap_analysis_page.show_scrap_analysis_page()
 
-elif page == "Scrap Analysis":
-    scrap_analysis_page.show_scrap_analysis_page()
+    elif page == "Quality Reports":
+        quality_reports_page.show_quality_reports_page()
 
-elif page == "Quality Reports":
-    quality_reports_page.show_quality_reports_page()
+show_debug_panel(profile)
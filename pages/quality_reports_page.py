@@ -1,57 +1,61 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 
+from comparison_view import comparison_view
+from etl.reports import report_snapshots
+from sidebar_filters import sidebar_filters
+from utils.charts import figure_cache_caption, figure_memo, line_chart, plotly_chart
+from utils.data_processing import most_frequent, selection_key
+from utils.profiling import annotate, span
+from utils.session_state import get_query_source, has_dataset
+
+VIEWS = ["📊 KPIs", "📈 Trend", "🧵 Breakdown", "⚖️ Compare"]
+
 def show_quality_reports_page():
     st.title("📋 Quality Reports")
 
-    if "df" not in st.session_state or st.session_state.df is None:
+    if not has_dataset():
         st.info("📂 Please upload a file first on the Upload Data page.")
         return
 
-    df = st.session_state.df.copy()
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    with span("query_source"):
+        source = get_query_source()
+
+    # Standard selections precomputed by the batch report job (python -m etl.reports)
+    snapshots = report_snapshots(st.session_state.dataset_key)
 
     # --- Sidebar Filters ---
-    st.sidebar.header("🔧 Filters")
-    if "qr_selected_date" not in st.session_state:
-        st.session_state.qr_selected_date = (df["Date"].min(), df["Date"].max())
-    if "qr_selected_machines" not in st.session_state:
-        st.session_state.qr_selected_machines = df["Machine_ID"].unique().tolist()
-    if "qr_selected_defects" not in st.session_state:
-        st.session_state.qr_selected_defects = df["Defect_Type"].unique().tolist()
-    if "qr_selected_shift" not in st.session_state:
-        st.session_state.qr_selected_shift = df["Shift"].unique().tolist()
-
-    if st.sidebar.button("🔄 Reset Filters"):
-        st.session_state.qr_selected_date = (df["Date"].min(), df["Date"].max())
-        st.session_state.qr_selected_machines = df["Machine_ID"].unique().tolist()
-        st.session_state.qr_selected_defects = df["Defect_Type"].unique().tolist()
-        st.session_state.qr_selected_shift = df["Shift"].unique().tolist()
-
-    selected_date = st.sidebar.date_input("Select Date Range", key="qr_selected_date")
-    selected_machines = st.sidebar.multiselect("Select Machines", df["Machine_ID"].unique(), key="qr_selected_machines")
-    selected_defects  = st.sidebar.multiselect("Select Defect Types", df["Defect_Type"].unique(), key="qr_selected_defects")
-    selected_shift    = st.sidebar.multiselect("Select Shifts", df["Shift"].unique(), key="qr_selected_shift")
-
-    # --- Filter DataFrame ---
-    df_filtered = df[
-        (df["Date"] >= pd.to_datetime(selected_date[0])) &
-        (df["Date"] <= pd.to_datetime(selected_date[1])) &
-        (df["Machine_ID"].isin(selected_machines)) &
-        (df["Defect_Type"].isin(selected_defects)) &
-        (df["Shift"].isin(selected_shift))
-    ]
-
-    # --- Tabs ---
-    tab_kpi, tab_trend, tab_breakdown = st.tabs(["📊 KPIs", "📈 Trend", "🧵 Breakdown"])
+    with span("filters"):
+        selected_date, selections = sidebar_filters(
+            source, prefix="qr_", dimensions=["Machine_ID", "Defect_Type", "Shift"], presets=snapshots.presets
+        )
+
+    # --- Aggregates for the selected view, figures memoized per filter state ---
+    plan = source.plan(selected_date, selections)
+    selection = selection_key(source, selected_date, selections)
+    # A selection matching a report preset starts from its snapshot instead of scanning
+    preset = snapshots.match(selection)
+    plan.seed(snapshots.results(selection, "Day"))
+    annotate(preset=preset)
+    memo = figure_memo(st.session_state.dataset_key, selection, "Day")
+
+    # --- Views: only the selected one is computed ---
+    view = st.radio("View", VIEWS, horizontal=True, key="qr_view", label_visibility="collapsed")
+    annotate(view=view)
 
     # ---- KPI TAB ----
-    with tab_kpi:
+    if view == "📊 KPIs":
         st.subheader("Key Metrics")
-        total_scrap = df_filtered["Quantity_Scrapped_meters"].sum()
-        top_defect = df_filtered["Defect_Type"].mode()[0] if not df_filtered.empty else "-"
-        shift_count = df_filtered["Shift"].nunique()
+
+        def kpis():
+            plan.require(["Defect_Type"], ["Shift"])
+            return (
+                round(float(plan.get().iloc[0]["Quantity_Scrapped_meters"]), 2),
+                most_frequent(plan.get("Defect_Type"), "Defect_Type"),
+                len(plan.get("Shift")),
+            )
+
+        total_scrap, top_defect, shift_count = memo("qr:kpis", kpis)
 
         c1, c2, c3 = st.columns(3)
         c1.metric("Total Scrap (m)", total_scrap)
@@ -59,36 +63,37 @@ def show_quality_reports_page():
         c3.metric("Shifts Involved", shift_count)
 
     # ---- Trend TAB ----
-    with tab_trend:
+    elif view == "📈 Trend":
         st.subheader("Scrap Quantity Over Time")
-        trend_fig = px.line(
-            df_filtered.groupby("Date", as_index=False)["Quantity_Scrapped_meters"].sum(),
+        trend_fig = memo("qr:trend", lambda: line_chart(
+            plan.get("Date"),
             x="Date", y="Quantity_Scrapped_meters", markers=True
-        )
-        st.plotly_chart(trend_fig, use_container_width=True)
+        ))
+        plotly_chart(trend_fig, use_container_width=True)
 
     # ---- Breakdown TAB ----
-    with tab_breakdown:
+    elif view == "🧵 Breakdown":
         st.subheader("🏆 Top Contributors")
 
         # Top 5 Machines
-        top_machines = (
-            df_filtered.groupby("Machine_ID")["Quantity_Scrapped_meters"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(5)
-            .reset_index()
-        )
+        def top_machines_fig():
+            top_machines = (
+                plan.get("Machine_ID")
+                .sort_values("Quantity_Scrapped_meters", ascending=False)
+                .head(5)
+            )
+            return px.bar(
+                top_machines,
+                x="Quantity_Scrapped_meters",
+                y="Machine_ID",
+                orientation='h',
+                color="Machine_ID",
+                text="Quantity_Scrapped_meters",
+            )
+
         st.markdown("**Top 5 Machines with Most Scrap**")
-        fig_top_machines = px.bar(
-            top_machines,
-            x="Quantity_Scrapped_meters",
-            y="Machine_ID",
-            orientation='h',
-            color="Machine_ID",
-            text="Quantity_Scrapped_meters",
-        )
-        st.plotly_chart(fig_top_machines, use_container_width=True)
+        fig_top_machines = memo("qr:top_machines", top_machines_fig)
+        plotly_chart(fig_top_machines, use_container_width=True)
 
         # Top 5 Defect Types
         #top_defects = (
@@ -110,31 +115,42 @@ def show_quality_reports_page():
         #st.plotly_chart(fig_top_defects, use_container_width=True)
 
         # Top 5 Shifts
-        top_shifts = (
-            df_filtered.groupby("Shift")["Quantity_Scrapped_meters"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(5)
-            .reset_index()
-        )
+        def top_shifts_fig():
+            top_shifts = (
+                plan.get("Shift")
+                .sort_values("Quantity_Scrapped_meters", ascending=False)
+                .head(5)
+            )
+            return px.bar(
+                top_shifts,
+                x="Quantity_Scrapped_meters",
+                y="Shift",
+                orientation='h',
+                color="Shift",
+                text="Quantity_Scrapped_meters",
+            )
+
         st.markdown("**Top Shifts with Most Scrap**")
-        fig_top_shifts = px.bar(
-            top_shifts,
-            x="Quantity_Scrapped_meters",
-            y="Shift",
-            orientation='h',
-            color="Shift",
-            text="Quantity_Scrapped_meters",
-        )
-        st.plotly_chart(fig_top_shifts, use_container_width=True)
+        fig_top_shifts = memo("qr:top_shifts", top_shifts_fig)
+        plotly_chart(fig_top_shifts, use_container_width=True)
 
 
 
         # Scrap by Defect Type
         st.subheader("Scrap by Defect Type")
-        defect_fig = px.pie(
-            df_filtered.groupby("Defect_Type", as_index=False)["Quantity_Scrapped_meters"].sum(),
+        defect_fig = memo("qr:defect_share", lambda: px.pie(
+            plan.get("Defect_Type"),
             names="Defect_Type", values="Quantity_Scrapped_meters"
-        )
-        st.plotly_chart(defect_fig, use_container_width=True)
+        ))
+        plotly_chart(defect_fig, use_container_width=True)
+
+    # ---- Compare TAB ----
+    elif view == "⚖️ Compare":
+        st.subheader("Comparison")
+        comparison_view(source, plan, selection, selections, "Day", prefix="qr_")
+
+    if preset is not None:
+        st.sidebar.caption(f"📌 '{preset}' report snapshot of {snapshots.created}")
+    st.sidebar.caption(f"🔍 {plan.scans} full-table scan(s) this rerun")
+    st.sidebar.caption(figure_cache_caption())
 
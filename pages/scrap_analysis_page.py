@@ -1,237 +1,351 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 
+from comparison_view import comparison_view
+from etl.reports import report_snapshots
+from sidebar_filters import sidebar_filters
+from utils.charts import (
+    area_chart, band_line_chart, collapse_top_n, control_chart, figure_cache_caption, figure_memo, line_chart, mark_points,
+    plotly_chart,
+)
+from utils.data_processing import CubeIndex, most_frequent, selection_key
+from utils.profiling import annotate, span
+from utils.progressive import MOE_SUFFIX, PROGRESSIVE_MIN_CELLS, StratifiedSample, refine_in_background
+from utils.session_state import get_dataset_derived, get_query_source, has_dataset
+from utils.spc import RULES_COLUMN, SPC_WINDOWS, control_limits, get_control_limits_cache
+
+VIEWS = ["📊 KPIs", "📈 Trend & Cost", "🧵 Breakdown", "💰 Cost Contributors", "💡 Insights", "⚖️ Compare"]
+
 def show_scrap_analysis_page():
     st.title("📊 Scrap Analysis")
 
     # Check if data is uploaded
-    if "df" not in st.session_state or st.session_state.df is None:
+    if not has_dataset():
         st.info("📂 Please upload a file first on the Upload Data page.")
         return
 
-    df = st.session_state.df.copy()
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    # Pages never scan raw scrap events: they query the daily cube, or SQLite with pushdown
+    with span("query_source"):
+        source = get_query_source()
+
+    # Standard selections precomputed by the batch report job (python -m etl.reports)
+    snapshots = report_snapshots(st.session_state.dataset_key)
 
     # --- Sidebar Filters ---
-    st.sidebar.header("🔧 Filters")
-    if "sa_selected_date" not in st.session_state:
-        st.session_state.sa_selected_date = (df["Date"].min(), df["Date"].max())
-    if "sa_selected_machines" not in st.session_state:
-        st.session_state.sa_selected_machines = df["Machine_ID"].unique().tolist()
-    if "sa_selected_defects" not in st.session_state:
-        st.session_state.sa_selected_defects = df["Defect_Type"].unique().tolist()
-    if "sa_selected_fabric" not in st.session_state:
-        st.session_state.sa_selected_fabric = df["Fabric_Type"].unique().tolist()
-
-    if st.sidebar.button("🔄 Reset Filters"):
-        st.session_state.sa_selected_date = (df["Date"].min(), df["Date"].max())
-        st.session_state.sa_selected_machines = df["Machine_ID"].unique().tolist()
-        st.session_state.sa_selected_defects = df["Defect_Type"].unique().tolist()
-        st.session_state.sa_selected_fabric = df["Fabric_Type"].unique().tolist()
-
-    selected_date = st.sidebar.date_input("Select Date Range", key="sa_selected_date")
-    selected_machines = st.sidebar.multiselect("Select Machines", df["Machine_ID"].unique(), key="sa_selected_machines")
-    selected_defects = st.sidebar.multiselect("Select Defect Types", df["Defect_Type"].unique(), key="sa_selected_defects")
-    selected_fabric = st.sidebar.multiselect("Select Fabric Types", df["Fabric_Type"].unique(), key="sa_selected_fabric")
+    with span("filters"):
+        selected_date, selections = sidebar_filters(
+            source, prefix="sa_", dimensions=["Machine_ID", "Defect_Type", "Fabric_Type"], presets=snapshots.presets
+        )
 
     time_granularity = st.sidebar.radio("Time Granularity", ["Day", "Week", "Month"])
+    # Large cubes answer first from a stratified sample, then with the exact figures
+    progressive = isinstance(source, CubeIndex) and st.sidebar.toggle(
+        "⚡ Estimate first", value=len(source) >= PROGRESSIVE_MIN_CELLS, key="sa_progressive",
+        help="Show estimates (± 95% margin) from a stratified sample at once; exact figures replace them when ready.",
+    )
+
+    # --- Aggregates at the chosen granularity, computed only for what the view builds ---
+    plan = source.plan(selected_date, selections, time_granularity)
+    # Figures (and KPIs) are shared across reruns and sessions under the state that produced them
+    selection = selection_key(source, selected_date, selections)
+    # A selection matching a report preset starts from its snapshot instead of scanning
+    preset = snapshots.match(selection)
+    plan.seed(snapshots.results(selection, time_granularity))
+    annotate(preset=preset)
+    memo = figure_memo(st.session_state.dataset_key, selection, time_granularity)
 
-    # --- Filter the DataFrame ---
-    df_filtered = df[
-        (df["Date"] >= pd.to_datetime(selected_date[0])) &
-        (df["Date"] <= pd.to_datetime(selected_date[1])) &
-        (df["Machine_ID"].isin(selected_machines)) &
-        (df["Defect_Type"].isin(selected_defects)) &
-        (df["Fabric_Type"].isin(selected_fabric))
-    ]
-        # --- Resample according to time granularity ---
-    if not df_filtered.empty:
-        df_filtered["Date_Resampled"] = df_filtered["Date"]
-        if time_granularity == "Week":
-            df_filtered["Date_Resampled"] = df_filtered["Date"].dt.to_period("W").apply(lambda r: r.start_time)
-        elif time_granularity == "Month":
-            df_filtered["Date_Resampled"] = df_filtered["Date"].dt.to_period("M").apply(lambda r: r.start_time)
-
-
-    # --- Tabs ---
-    tab_kpi, tab_trend, tab_breakdown , tab_cost, tab_insights = st.tabs(["📊 KPIs", "📈 Trend & Cost", "🧵 Breakdown","💰 Cost Contributors","💡 Insights"])
+    # --- Views: unlike st.tabs, only the selected one is computed and sent ---
+    view = st.radio("View", VIEWS, horizontal=True, key="sa_view", label_visibility="collapsed")
+    annotate(view=view, granularity=time_granularity)
+
+    # Once the exact plan is handed to the Refiner its scan count changes in the background;
+    # the caption reports the count it had then, and the sample's scans on their own
+    refining = {}
+
+    def estimate_while_refining(chart_ids, steps):
+        """An EstimatePlan while the view's exact figures are built in the background, or None to build them now."""
+        if not progressive or memo.cached(*chart_ids):
+            return None
+        scans = plan.scans
+        if not refine_in_background(memo.state + (view,), steps):
+            return None
+        annotate(estimated=True)
+        sample = get_dataset_derived("stratified_sample", lambda df: StratifiedSample(source.df))
+        refining["scans"], refining["estimate"] = scans, sample.plan(selected_date, selections, time_granularity)
+        return refining["estimate"]
 
     # ---- KPI TAB ----
-    with tab_kpi:
+    if view == "📊 KPIs":
         st.subheader("Key Performance Indicators")
         st.write("Overall scrap KPIs for the selected date range and filters.")
-        total_scrap = df_filtered["Quantity_Scrapped_meters"].sum()
-        total_cost = df_filtered["Scrap_Cost"].sum()
-        top_defect = df_filtered["Defect_Type"].mode()[0] if not df_filtered.empty else "-"
-        machine_count = df_filtered["Machine_ID"].nunique()
 
+        def kpis():
+            plan.require(["Defect_Type"], ["Machine_ID"])
+            totals = plan.get().iloc[0]
+            return (
+                round(float(totals["Quantity_Scrapped_meters"]), 2),
+                float(totals["Scrap_Cost"]),
+                most_frequent(plan.get("Defect_Type"), "Defect_Type"),
+                len(plan.get("Machine_ID")),
+            )
+
+        # A preset's KPIs come straight from its snapshot, no estimate needed
+        estimate = None if preset else estimate_while_refining(["sa:kpis"], [lambda: memo("sa:kpis", kpis)])
         c1, c2, c3 = st.columns(3)
-        c1.metric("Total Scrap (m)", total_scrap)
-        c2.metric("Total Scrap Cost", f"${total_cost:,.2f}")
-        c3.metric("Most Frequent Defect", top_defect)
+        if estimate is not None:
+            with span("estimate:kpis"):
+                totals = estimate.get().iloc[0]
+                top_defect = most_frequent(estimate.get("Defect_Type"), "Defect_Type")
+            c1.metric(
+                "Total Scrap (m)",
+                f"≈ {totals['Quantity_Scrapped_meters']:,.2f} ± {totals['Quantity_Scrapped_meters' + MOE_SUFFIX]:,.0f}",
+            )
+            c2.metric("Total Scrap Cost", f"≈ ${totals['Scrap_Cost']:,.2f} ± {totals['Scrap_Cost' + MOE_SUFFIX]:,.0f}")
+            c3.metric("Most Frequent Defect", top_defect)
+        else:
+            total_scrap, total_cost, top_defect, machine_count = memo("sa:kpis", kpis)
+            c1.metric("Total Scrap (m)", total_scrap)
+            c2.metric("Total Scrap Cost", f"${total_cost:,.2f}")
+            c3.metric("Most Frequent Defect", top_defect)
 
     # ---- Trend & Cost TAB ----
-    with tab_trend:
-        st.subheader("Scrap Trend Over Time({time_granularity})")
+    elif view == "📈 Trend & Cost":
+        # The overall trend derives from the per-defect one instead of scanning on its own
+        plan.require(["Date", "Machine_ID"], ["Date", "Defect_Type"])
+        st.subheader(f"Scrap Trend Over Time ({time_granularity})")
         st.write("Explore how scrap quantity evolves over time and across machines/defects.")
 
-        trend_fig = px.line(
-            df_filtered.groupby("Date", as_index=False)["Quantity_Scrapped_meters"].sum(),
-            x="Date", y="Quantity_Scrapped_meters", markers=True
+        # Control limits per machine and per defect type. Keyed without the dataset version or end
+        # date, so after an append only the new periods are computed
+        spc_key = (st.session_state.get("dataset_lineage"), selection[0], selection[2], time_granularity)
+        # Resolved here: the figures below may be built on a background thread
+        spc_charts = get_control_limits_cache()
+
+        def spc(dim):
+            return memo(f"sa:spc:{dim}", lambda: control_limits(
+                spc_key + (dim,), plan.get("Date", dim), dim, "Quantity_Scrapped_meters", time_granularity, spc_charts
+            ))
+
+        def mark_violations(fig, dim, stacked=False):
+            violations = spc(dim).violations(dim, "Quantity_Scrapped_meters")
+            return mark_points(fig, violations, "Date", "Quantity_Scrapped_meters", dim, RULES_COLUMN, stacked=stacked)
+
+        # The same figures either way: from the exact plan, or from the sample's estimate
+        def trend_fig(totals):
+            if totals is plan:
+                return line_chart(plan.get("Date"), x="Date", y="Quantity_Scrapped_meters", markers=True)
+            return band_line_chart(
+                totals.get("Date"), x="Date", y="Quantity_Scrapped_meters",
+                margin="Quantity_Scrapped_meters" + MOE_SUFFIX, markers=True,
+            )
+
+        def machine_trend_fig(totals):
+            fig = line_chart(
+                totals.get("Date", "Machine_ID"), x="Date", y="Quantity_Scrapped_meters", color="Machine_ID", markers=True
+            )
+            return mark_violations(fig, "Machine_ID") if totals is plan else fig
+
+        def defect_trend_fig(totals):
+            fig = area_chart(totals.get("Date", "Defect_Type"), x="Date", y="Quantity_Scrapped_meters", color="Defect_Type")
+            return mark_violations(fig, "Defect_Type", stacked=True) if totals is plan else fig
+
+        charts = {"sa:trend": trend_fig, "sa:machine_trend": machine_trend_fig, "sa:defect_trend": defect_trend_fig}
+        estimate = estimate_while_refining(
+            list(charts), [lambda chart_id=chart_id, build=build: memo(chart_id, lambda: build(plan)) for chart_id, build in charts.items()]
         )
-        st.plotly_chart(trend_fig, use_container_width=True)
+        if estimate is not None:
+            with span("estimate:trend"):
+                figures = {chart_id: build(estimate) for chart_id, build in charts.items()}
+        else:
+            figures = {chart_id: memo(chart_id, lambda build=build: build(plan)) for chart_id, build in charts.items()}
+
+        # Keyed: an empty selection's figures are identical, which Streamlit rejects as duplicate elements
+        plotly_chart(figures["sa:trend"], use_container_width=True, key="sa:trend")
 
         st.subheader("Scrap Trend per Machine")
-        machine_trend = df_filtered.groupby(["Date", "Machine_ID"], as_index=False)["Quantity_Scrapped_meters"].sum()
-        fig_machine_trend = px.line(machine_trend, x="Date", y="Quantity_Scrapped_meters", color="Machine_ID", markers=True)
-        st.plotly_chart(fig_machine_trend, use_container_width=True)
+        plotly_chart(figures["sa:machine_trend"], use_container_width=True, key="sa:machine_trend")
 
         st.subheader("Scrap per Defect Type Over Time")
-        defect_trend = df_filtered.groupby(["Date", "Defect_Type"], as_index=False)["Quantity_Scrapped_meters"].sum()
-        fig_defect_trend = px.area(defect_trend, x="Date", y="Quantity_Scrapped_meters", color="Defect_Type")
-        st.plotly_chart(fig_defect_trend, use_container_width=True)
+        plotly_chart(figures["sa:defect_trend"], use_container_width=True, key="sa:defect_trend")
+
+        if estimate is None:
+            window = SPC_WINDOWS[time_granularity]
+            st.subheader("🚦 Control Limits")
+            st.write(
+                f"Each {time_granularity.lower()} against the mean ± 1-3σ of the {window} before it. "
+                "Points breaking a Western Electric rule are marked with ✕, here and on the charts above."
+            )
+            left, right = st.columns(2)
+            dim = left.radio(
+                "Series", ["Machine_ID", "Defect_Type"], horizontal=True, key="sa_spc_dim",
+                format_func=lambda col: col.replace("_ID", "").replace("_", " "),
+            )
+            limits = spc(dim)
+            summary = limits.summary(dim)
+            group = right.selectbox("Most violations first", summary.index, key=f"sa_spc_{dim}")
+            if group is not None:
+                control_fig = memo(f"sa:control:{dim}:{group}", lambda: control_chart(
+                    limits.series(group, "Quantity_Scrapped_meters"), x="Date", y="Quantity_Scrapped_meters",
+                    center="Center", limits=[("+1σ", "-1σ"), ("+2σ", "-2σ"), ("+3σ", "-3σ")], text=RULES_COLUMN,
+                    title=f"{group}: Control Chart",
+                ))
+                plotly_chart(control_fig, use_container_width=True)
+            st.dataframe(summary.head(10))
 
 
 
     # ---- Breakdown TAB ----
-    with tab_breakdown:
+    elif view == "🧵 Breakdown":
+        # Per-machine and per-defect totals derive from the per-day groupings the cumulative charts scan
+        plan.require(["Date", "Machine_ID"], ["Date", "Defect_Type"])
         st.subheader("Top 5 Machines with Most Scrap")
         st.write("Identify the major contributors to scrap quantity.")
 
-        top_machines = (
-            df_filtered.groupby("Machine_ID")["Quantity_Scrapped_meters"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(5)
-            .reset_index()
-        )
-        fig_top_machines = px.bar(
-            top_machines, x="Quantity_Scrapped_meters", y="Machine_ID",
-            orientation='h', color="Machine_ID", title="Top 5 Machines by Scrap"
-        )
-        st.plotly_chart(fig_top_machines, use_container_width=True)
+        def top_machines_fig():
+            top_machines = (
+                plan.get("Machine_ID")
+                .sort_values("Quantity_Scrapped_meters", ascending=False)
+                .head(5)
+            )
+            return px.bar(
+                top_machines, x="Quantity_Scrapped_meters", y="Machine_ID",
+                orientation='h', color="Machine_ID", title="Top 5 Machines by Scrap"
+            )
+
+        fig_top_machines = memo("sa:top_machines", top_machines_fig)
+        plotly_chart(fig_top_machines, use_container_width=True)
 
         # Cumulative scrap per machine
         st.subheader("Cumulative Scrap per Machine Over Time")
-        machine_trend = (
-            df_filtered.groupby(["Date", "Machine_ID"], as_index=False)["Quantity_Scrapped_meters"]
-            .sum()
-            .sort_values(["Machine_ID", "Date"])
-        )
-        machine_trend["Cumulative_Scrap"] = machine_trend.groupby("Machine_ID")["Quantity_Scrapped_meters"].cumsum()
-        fig_machine_cum = px.line(
-            machine_trend, x="Date", y="Cumulative_Scrap", color="Machine_ID",
-            title="Cumulative Scrap per Machine"
-        )
-        st.plotly_chart(fig_machine_cum, use_container_width=True)
+
+        def machine_cum_fig():
+            machine_trend = (
+                # Collapse the long tail first: "Other" must accumulate the tail's daily sums
+                collapse_top_n(plan.get("Date", "Machine_ID"), "Machine_ID", "Quantity_Scrapped_meters", x="Date")
+                .sort_values(["Machine_ID", "Date"])
+            )
+            machine_trend["Cumulative_Scrap"] = machine_trend.groupby("Machine_ID", observed=True)["Quantity_Scrapped_meters"].cumsum()
+            return line_chart(
+                machine_trend, x="Date", y="Cumulative_Scrap", color="Machine_ID",
+                title="Cumulative Scrap per Machine"
+            )
+
+        fig_machine_cum = memo("sa:machine_cumulative", machine_cum_fig)
+        plotly_chart(fig_machine_cum, use_container_width=True)
 
         # Cumulative scrap per defect type
         st.subheader("Cumulative Scrap per Defect Type Over Time")
-        defect_trend = (
-            df_filtered.groupby(["Date", "Defect_Type"], as_index=False)["Quantity_Scrapped_meters"]
-            .sum()
-            .sort_values(["Defect_Type", "Date"])
-        )
-        defect_trend["Cumulative_Scrap"] = defect_trend.groupby("Defect_Type")["Quantity_Scrapped_meters"].cumsum()
-        fig_defect_cum = px.line(
-            defect_trend, x="Date", y="Cumulative_Scrap", color="Defect_Type",
-            title="Cumulative Scrap per Defect Type"
-        )
-        st.plotly_chart(fig_defect_cum, use_container_width=True)
+
+        def defect_cum_fig():
+            defect_trend = (
+                collapse_top_n(plan.get("Date", "Defect_Type"), "Defect_Type", "Quantity_Scrapped_meters", x="Date")
+                .sort_values(["Defect_Type", "Date"])
+            )
+            defect_trend["Cumulative_Scrap"] = defect_trend.groupby("Defect_Type", observed=True)["Quantity_Scrapped_meters"].cumsum()
+            return line_chart(
+                defect_trend, x="Date", y="Cumulative_Scrap", color="Defect_Type",
+                title="Cumulative Scrap per Defect Type"
+            )
+
+        fig_defect_cum = memo("sa:defect_cumulative", defect_cum_fig)
+        plotly_chart(fig_defect_cum, use_container_width=True)
 
         st.subheader("Defect Type Distribution")
-        defect_fig = px.pie(
-            df_filtered.groupby("Defect_Type", as_index=False)["Quantity_Scrapped_meters"].sum(),
+        defect_fig = memo("sa:defect_share", lambda: px.pie(
+            plan.get("Defect_Type"),
             names="Defect_Type", values="Quantity_Scrapped_meters",
             title="Defect Type Share"
-        )
-        st.plotly_chart(defect_fig, use_container_width=True)
+        ))
+        plotly_chart(defect_fig, use_container_width=True)
 
 
 # ---- COST Contributors TAB ----
-    with tab_cost:
+    elif view == "💰 Cost Contributors":
         st.subheader("Treemap: Scrap Cost by Machine")
-        treemap_machine = px.treemap(
-            df_filtered.groupby("Machine_ID", as_index=False)[["Scrap_Cost", "Quantity_Scrapped_meters"]].sum(),
+        treemap_machine = memo("sa:treemap_machine", lambda: px.treemap(
+            plan.get("Machine_ID"),
             path=["Machine_ID"],
             values="Scrap_Cost",
             color="Scrap_Cost",
             hover_data=["Quantity_Scrapped_meters"],
             color_continuous_scale="Reds",
             title="Scrap Cost Contribution per Machine"
-        )
-        st.plotly_chart(treemap_machine, use_container_width=True)
+        ))
+        plotly_chart(treemap_machine, use_container_width=True)
 
         st.subheader("Treemap: Scrap Cost by Fabric Type")
-        treemap_fabric = px.treemap(
-            df_filtered.groupby("Fabric_Type", as_index=False)[["Scrap_Cost", "Quantity_Scrapped_meters"]].sum(),
+        treemap_fabric = memo("sa:treemap_fabric", lambda: px.treemap(
+            plan.get("Fabric_Type"),
             path=["Fabric_Type"],
             values="Scrap_Cost",
             color="Scrap_Cost",
             hover_data=["Quantity_Scrapped_meters"],
             color_continuous_scale="Blues",
             title="Scrap Cost Contribution per Fabric Type"
-        )
-        st.plotly_chart(treemap_fabric, use_container_width=True)
+        ))
+        plotly_chart(treemap_fabric, use_container_width=True)
 
         st.subheader("Treemap: Scrap Cost by Defect Type")
-        treemap_defect = px.treemap(
-            df_filtered.groupby("Defect_Type", as_index=False)[["Scrap_Cost", "Quantity_Scrapped_meters"]].sum(),
+        treemap_defect = memo("sa:treemap_defect", lambda: px.treemap(
+            plan.get("Defect_Type"),
             path=["Defect_Type"],
             values="Scrap_Cost",
             color="Scrap_Cost",
             hover_data=["Quantity_Scrapped_meters"],
             color_continuous_scale="Greens",
             title="Scrap Cost Contribution per Defect Type"
-        )
-        st.plotly_chart(treemap_defect, use_container_width=True)
+        ))
+        plotly_chart(treemap_defect, use_container_width=True)
         # ---- New Tab: Cost & Quantity Insights ----
-    with tab_insights:
+    elif view == "💡 Insights":
         st.subheader("Machines: Scrap Quantity vs Cost")
-        machine_stats = df_filtered.groupby("Machine_ID", as_index=False).agg({
-            "Quantity_Scrapped_meters": "sum",
-            "Scrap_Cost": "sum"
-        })
-        fig_machine_stats = px.scatter(
-            machine_stats,
+        fig_machine_stats = memo("sa:insights_machine", lambda: px.scatter(
+            plan.get("Machine_ID"),
             x="Quantity_Scrapped_meters",
             y="Scrap_Cost",
             size="Scrap_Cost",
             color="Machine_ID",
             hover_data=["Quantity_Scrapped_meters", "Scrap_Cost"],
             title="Machine Scrap Quantity vs Cost"
-        )
-        st.plotly_chart(fig_machine_stats, use_container_width=True, key="insights_machine")
+        ))
+        plotly_chart(fig_machine_stats, use_container_width=True, key="insights_machine")
 
         st.subheader("Fabrics: Scrap Quantity vs Cost")
-        fabric_stats = df_filtered.groupby("Fabric_Type", as_index=False).agg({
-            "Quantity_Scrapped_meters": "sum",
-            "Scrap_Cost": "sum"
-        })
-        fig_fabric_stats = px.scatter(
-            fabric_stats,
+        fig_fabric_stats = memo("sa:insights_fabric", lambda: px.scatter(
+            plan.get("Fabric_Type"),
             x="Quantity_Scrapped_meters",
             y="Scrap_Cost",
             size="Scrap_Cost",
             color="Fabric_Type",
             hover_data=["Quantity_Scrapped_meters", "Scrap_Cost"],
             title="Fabric Scrap Quantity vs Cost"
-        )
-        st.plotly_chart(fig_fabric_stats, use_container_width=True, key="insights_fabric")
+        ))
+        plotly_chart(fig_fabric_stats, use_container_width=True, key="insights_fabric")
 
         st.subheader("Defects: Scrap Quantity vs Cost")
-        defect_stats = df_filtered.groupby("Defect_Type", as_index=False).agg({
-            "Quantity_Scrapped_meters": "sum",
-            "Scrap_Cost": "sum"
-        })
-        fig_defect_stats = px.scatter(
-            defect_stats,
+        fig_defect_stats = memo("sa:insights_defect", lambda: px.scatter(
+            plan.get("Defect_Type"),
             x="Quantity_Scrapped_meters",
             y="Scrap_Cost",
             size="Scrap_Cost",
             color="Defect_Type",
             hover_data=["Quantity_Scrapped_meters", "Scrap_Cost"],
             title="Defect Scrap Quantity vs Cost"
+        ))
+        plotly_chart(fig_defect_stats, use_container_width=True, key="insights_defect")
+
+    # ---- Compare TAB: this selection against another period or dataset ----
+    elif view == "⚖️ Compare":
+        st.subheader("Comparison")
+        comparison_view(source, plan, selection, selections, time_granularity, prefix="sa_")
+
+    if preset is not None:
+        st.sidebar.caption(f"📌 '{preset}' report snapshot of {snapshots.created}")
+    if refining:
+        st.sidebar.caption(
+            f"🔍 {refining['scans']} full-table scan(s) this rerun, {refining['estimate'].scans} on the sample; "
+            "the exact figures' scans run in the background"
         )
-        st.plotly_chart(fig_defect_stats, use_container_width=True, key="insights_defect")
+    else:
+        st.sidebar.caption(f"🔍 {plan.scans} full-table scan(s) this rerun")
+    st.sidebar.caption(figure_cache_caption())
@@ -1,58 +1,83 @@
-import streamlit as st
 import pandas as pd
+import streamlit as st
+
+from utils.data_processing import SOURCE_COLUMN
+from utils.profiling import annotate
+
+# Multiselect per filterable dimension: session-state key suffix and label
+FILTER_WIDGETS = {
+    "Machine_ID": ("machines", "Select Machines"),
+    "Defect_Type": ("defects", "Select Defect Types"),
+    "Fabric_Type": ("fabric", "Select Fabric Types"),
+    "Shift": ("shift", "Select Shifts"),
+    SOURCE_COLUMN: ("sources", "Select Sources"),
+}
 
-def sidebar_filters(df):
-    # --- Sidebar Filters ---
+
+def sidebar_filters(index, prefix="", dimensions=("Machine_ID", "Defect_Type", "Fabric_Type"), presets=()):
+    """Sidebar filter widgets over a query source (date_min/date_max/categories).
+
+    presets ({name, date_range, filters}, see etl.reports) are offered in a selectbox that
+    sets every widget at once; those filtering on a dimension without a widget are left out.
+    Returns (date_range, {dimension: selected values}).
+    """
     st.sidebar.header("🔧 Filters")
+    # Datasets combined from several files can also be narrowed down to some of the files
+    if SOURCE_COLUMN in index.categories and SOURCE_COLUMN not in dimensions:
+        dimensions = [SOURCE_COLUMN, *dimensions]
+
+    date_key = f"{prefix}selected_date"
+    keys = {dim: f"{prefix}selected_{FILTER_WIDGETS[dim][0]}" for dim in dimensions}
 
     # Initialize session state only if keys do not exist
-    if "selected_date" not in st.session_state:
-        st.session_state.selected_date = (df["Date"].min(), df["Date"].max())
-    if "selected_machines" not in st.session_state:
-        st.session_state.selected_machines = df["Machine_ID"].unique().tolist()
-    if "selected_defects" not in st.session_state:
-        st.session_state.selected_defects = df["Defect_Type"].unique().tolist()
-    if "selected_fabric" not in st.session_state:
-        st.session_state.selected_fabric = df["Fabric_Type"].unique().tolist()
-
-    # Reset button
-    if st.sidebar.button("🔄 Reset Filters"):
-        st.session_state.selected_date = (df["Date"].min(), df["Date"].max())
-        st.session_state.selected_machines = df["Machine_ID"].unique().tolist()
-        st.session_state.selected_defects = df["Defect_Type"].unique().tolist()
-        st.session_state.selected_fabric = df["Fabric_Type"].unique().tolist()
+    if date_key not in st.session_state:
+        st.session_state[date_key] = (index.date_min, index.date_max)
+    for dim, key in keys.items():
+        if key not in st.session_state:
+            st.session_state[key] = list(index.categories[dim])
+
+    # Reset button; a newly loaded dataset also starts from unfiltered widgets
+    dataset_changed = st.session_state.get(f"{prefix}filters_dataset") != st.session_state.get("dataset_key")
+    st.session_state[f"{prefix}filters_dataset"] = st.session_state.get("dataset_key")
+    if st.sidebar.button("🔄 Reset Filters") or dataset_changed:
+        st.session_state[date_key] = (index.date_min, index.date_max)
+        for dim, key in keys.items():
+            st.session_state[key] = list(index.categories[dim])
+
+    # Report presets: picking one sets the widgets before they are drawn
+    presets = {preset["name"]: preset for preset in presets if set(preset["filters"]) <= set(keys)}
+    if presets:
+        def apply_preset():
+            preset = presets.get(st.session_state[f"{prefix}preset"])
+            if preset is None:
+                return
+            st.session_state[date_key] = tuple(date.date() for date in preset["date_range"])
+            for dim, key in keys.items():
+                st.session_state[key] = [
+                    value for value in index.categories[dim]
+                    if dim not in preset["filters"] or str(value) in preset["filters"][dim]
+                ]
+
+        st.sidebar.selectbox(
+            "📌 Report preset", ["—"] + list(presets), key=f"{prefix}preset", on_change=apply_preset,
+            help="Standard selections precomputed by the batch report job; they open without aggregating.",
+        )
 
     # Widgets synced with session state
-    selected_date = st.sidebar.date_input(
-        "Select Date Range",
-        value=st.session_state.selected_date,
-        key="selected_date"
-    )
-    selected_machines = st.sidebar.multiselect(
-        "Select Machines",
-        options=df["Machine_ID"].unique(),
-        default=st.session_state.selected_machines,
-        key="selected_machines"
-    )
-    selected_defects = st.sidebar.multiselect(
-        "Select Defect Types",
-        options=df["Defect_Type"].unique(),
-        default=st.session_state.selected_defects,
-        key="selected_defects"
-    )
-    selected_fabric = st.sidebar.multiselect(
-        "Select Fabric Types",
-        options=df["Fabric_Type"].unique(),
-        default=st.session_state.selected_fabric,
-        key="selected_fabric"
-    )
+    selected_date = st.sidebar.date_input("Select Date Range", key=date_key)
+    selections = {
+        dim: st.sidebar.multiselect(FILTER_WIDGETS[dim][1], index.categories[dim], key=key)
+        for dim, key in keys.items()
+    }
 
-    # Filter the dataframe
-    df_filtered = df[
-        (df["Date"] >= pd.to_datetime(selected_date[0])) &
-        (df["Date"] <= pd.to_datetime(selected_date[1])) &
-        (df["Machine_ID"].isin(selected_machines)) &
-        (df["Defect_Type"].isin(selected_defects)) &
-        (df["Fabric_Type"].isin(selected_fabric))
-    ]
-    return selected_date, selected_machines, selected_defects, selected_fabric
\ No newline at end of file
+    # While a range is being picked the widget briefly holds only its start date
+    if len(selected_date) == 1:
+        selected_date = (selected_date[0], index.date_max)
+
+    # Recorded with the rerun's profile: what the page had to filter and how narrowly
+    annotate(
+        dataset_rows=len(index),
+        date_days=(pd.Timestamp(selected_date[1]) - pd.Timestamp(selected_date[0])).days + 1,
+        filters={dim: len(values) for dim, values in selections.items()},
+    )
+    return selected_date, selections
@@ -2,36 +2,220 @@ import streamlit as st
 import pandas as pd
 import os
 
-UPLOAD_DIR = "uploaded_files"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+from column_roles_form import column_roles_form, has_column_roles
+from etl.extract import expand_sources
+from etl.load import FULL_HISTORY, SQLITE_DIR, PartitionedStore, SQLiteStore, list_datasets
+from etl.pipeline import run_many_pipeline, run_pipeline
+from etl.uploads import UploadStore
+from utils.data_processing import (
+    CubeIndex, cache_path, convert_to_columnar, file_hash, files_hash, load_scrap_file, load_scrap_files, read_columnar,
+    source_labels,
+)
+from utils.profiling import span
+from utils.session_state import get_dataset_frame, get_query_source, get_registry, open_dataset
+
+# Load window -> days back from the dataset's high-water mark (None = full history)
+DATASET_WINDOWS = {FULL_HISTORY: None, "Last 30 days": 30, "Last 90 days": 90, "Last 365 days": 365}
+PREVIEW_ROWS = 1000
+# Picker order -> (sort key of an upload's index entry, descending); files not ingested yet sort last
+UPLOAD_SORTS = {
+    "Newest upload": (lambda entry: entry["uploaded"], True),
+    "Name": (lambda entry: entry["names"][-1].lower(), False),
+    "Most rows": (lambda entry: (entry["meta"] or {}).get("rows", -1), True),
+    "Latest data": (lambda entry: (entry["meta"] or {}).get("date_max") or "", True),
+}
 
 def show_upload_data_page():
     st.title("📂 Upload Data")
 
     # --- File uploader ---
-    uploaded_file = st.file_uploader("Upload CSV", type="csv")
+    upload_mode = st.radio("Upload mode", ["New file", "Append to dataset"], horizontal=True)
+    dataset_name = None
+    if upload_mode == "Append to dataset":
+        dataset_name = st.text_input("Dataset name", value=(list_datasets() or ["plant"])[0]).strip()
+
+    uploaded_file = st.file_uploader("Upload CSV or Excel workbook", type=["csv", "xlsx"])
     file_to_load = None
+    files_to_load = None
+    dataset_to_load = None
 
+    upload_store = UploadStore.open()
     if uploaded_file:
-        # Save the uploaded file locally
-        file_path = os.path.join(UPLOAD_DIR, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        st.success(f"File saved locally: {uploaded_file.name}")
+        # Stream the upload into the content-addressed store; the uploader keeps its file across
+        # reruns, so each upload is stored once, and content stored before is not written again
+        stored = st.session_state.get("stored_upload")
+        if stored is None or stored[0] != uploaded_file.file_id:
+            with span("save_upload"):
+                stored = (uploaded_file.file_id, *upload_store.put(uploaded_file, uploaded_file.name))
+            st.session_state.stored_upload = stored
+        _, file_path, new_content = stored
+        st.success(
+            f"File saved locally: {uploaded_file.name}" if new_content
+            else f"{uploaded_file.name} has the same content as a file uploaded before; nothing new was stored"
+        )
+
+        # Stream the upload once into the typed columnar store; later loads never reparse the file.
+        # Workbook sheets are converted in parallel worker processes. Files whose columns still
+        # need roles are converted once the roles are confirmed (see the form below).
+        target = cache_path(file_path) if has_column_roles(file_path) else None
+        if target and not os.path.exists(target):
+            with st.spinner("Converting to the columnar store..."), span("convert"):
+                stats = run_pipeline(file_path, target)
+            if stats["rejected"]:
+                st.warning(f"{stats['rows_in'] - stats['rows_out']:,} invalid rows dropped: {stats['rejected']}")
+            if "sheets" in stats:
+                st.caption(f"{stats['sheets']} sheet(s) converted in {stats['seconds']:.1f} s by {stats['workers']} worker process(es)")
+            if stats.get("skipped_sheets"):
+                st.warning(f"Sheets skipped: {stats['skipped_sheets']}")
+        record_metadata(upload_store, [file_path])
         file_to_load = file_path
 
+        # The uploader keeps its file across reruns, so each upload is appended only once
+        if target and dataset_name and st.session_state.get("appended_upload") != (dataset_name, file_hash(file_path)):
+            with span("append"):
+                stats = PartitionedStore.open(dataset_name).append(read_columnar(target))
+            st.session_state.appended_upload = (dataset_name, file_hash(file_path))
+            st.success(
+                f"Appended {stats['rows_added']:,} new rows to '{dataset_name}' "
+                f"({stats['duplicates']:,} duplicates skipped, {stats['late_rows']:,} rows before the high-water mark). "
+                f"Rebuilt months: {', '.join(stats['partitions']) or 'none'}"
+            )
+
     # --- Previously uploaded files ---
     st.sidebar.subheader("📄 Previously Uploaded Files")
-    uploaded_files = os.listdir(UPLOAD_DIR)
-    if uploaded_files:
-        selected_file = st.sidebar.selectbox("Select a file to load", uploaded_files)
+    datasets = list_datasets()
+    sources = ["Uploaded file", "Many files"] + (["Dataset"] if datasets else [])
+    source = st.sidebar.radio("Load from", sources, horizontal=True)
+    # Listed from the upload index alone: no file is opened to show or sort the picker
+    entries = upload_store.entries()
+    if source in ("Uploaded file", "Many files") and entries:
+        sort_key, descending = UPLOAD_SORTS[st.sidebar.selectbox("Sort files by", list(UPLOAD_SORTS))]
+        entries = sorted(entries, key=sort_key, reverse=descending)
+    file_labels = {entry["path"]: upload_label(entry) for entry in entries}
+    if source == "Uploaded file" and entries:
+        selected_file = st.sidebar.selectbox("Select a file to load", list(file_labels), format_func=file_labels.get)
         if selected_file:
-            file_to_load = os.path.join(UPLOAD_DIR, selected_file)
+            file_to_load = selected_file
+
+    # --- Many files: one dataset across lines and plants, with a Source column ---
+    if source == "Many files":
+        selected_files = st.sidebar.multiselect("Select files to load", list(file_labels), format_func=file_labels.get)
+        pattern = st.sidebar.text_input("...and/or a directory or glob pattern", placeholder="plants/*/*.csv").strip()
+        if st.sidebar.button("Load files"):
+            patterns = selected_files + ([pattern] if pattern else [])
+            try:
+                st.session_state.many_files = expand_sources(patterns)
+            except FileNotFoundError as e:
+                st.sidebar.error(str(e))
+        files_to_load = st.session_state.get("many_files")
+        file_to_load = None
+
+    # SQLite keeps the file on disk and answers the pages' filters and groupbys in SQL
+    engine = "In memory"
+    if source == "Uploaded file" and file_to_load:
+        engine = st.sidebar.radio("Query engine", ["In memory", "SQLite (pushdown)"], horizontal=True)
+
+    # --- Partitioned datasets ---
+    if source == "Dataset":
+        selected_dataset = st.sidebar.selectbox("Select a dataset to load", datasets)
+        window = st.sidebar.selectbox("Load window", list(DATASET_WINDOWS))
+        dataset_to_load = (selected_dataset, window)
 
-    # --- Load and display only once ---
-    if file_to_load:
-        st.session_state.df = pd.read_csv(file_to_load)
-        st.subheader(f"📊 Loaded Data: {os.path.basename(file_to_load)}")
-        st.dataframe(st.session_state.df)
+    # --- Load (once per server process) and display ---
+    if source == "Many files" and not files_to_load:
+        st.info("Select files, a directory or a glob pattern, then press Load files.")
+    elif files_to_load and not all(has_column_roles(path) for path in files_to_load):
+        unmapped = [upload_store.display_name(path) for path in files_to_load if not has_column_roles(path)]
+        st.warning(f"Confirm the column roles of {', '.join(unmapped)} by loading each on its own first.")
+    elif files_to_load:
+        # Stored uploads are labelled by the name they were uploaded as, unless different uploads share one
+        names = [upload_store.display_name(path) for path in files_to_load]
+        labels = source_labels(names if len(set(names)) == len(names) else files_to_load)
+        dataset_key = f"many:{files_hash(files_to_load, labels)}"
+        if dataset_key not in get_registry():
+            # Files not in the columnar cache yet are parsed in parallel, one per worker process
+            with st.spinner(f"Converting {len(files_to_load)} files to the columnar store..."), span("convert_many"):
+                stats = run_many_pipeline(files_to_load)
+            st.caption(
+                f"{stats['converted_files']} of {stats['files']} file(s) converted in {stats['seconds']:.1f} s "
+                f"by {stats['workers']} worker process(es)"
+            )
+            if stats["rejected"]:
+                st.warning(f"{stats['rows_in'] - stats['rows_out']:,} invalid rows dropped: {stats['rejected']}")
+        with span("open_dataset"):
+            open_dataset(dataset_key, lambda: (load_scrap_files(files_to_load, labels), {}))
+        record_metadata(upload_store, files_to_load)
+        st.subheader(f"📊 Loaded Data: {len(files_to_load)} files")
+        st.caption(", ".join(labels))
+        show_preview(get_dataset_frame())
+    elif dataset_to_load and not PartitionedStore.open(dataset_to_load[0]).partitions():
+        st.info(f"Dataset '{dataset_to_load[0]}' has no rows yet.")
+    elif dataset_to_load:
+        name, window = dataset_to_load
+        store = PartitionedStore.open(name)
+        days = DATASET_WINDOWS[window]
+        start = store.high_water_mark - pd.Timedelta(days=days - 1) if days and store.high_water_mark is not None else None
+        dataset_key = store.dataset_key(window)
+        # Only the months inside the window are read, and the cube comes from the stored per-month cubes
+        with span("open_dataset"):
+            open_dataset(
+                dataset_key, lambda: (store.read(start), {"query_source": CubeIndex(store.read_cube(start))}),
+                lineage=f"dataset:{name}:{window}",
+            )
+        st.subheader(f"📊 Loaded Dataset: {name} ({window.lower()}, {len(store.partitions(start))} partitions)")
+        show_preview(get_dataset_frame())
+    elif file_to_load and not column_roles_form(file_to_load):
+        pass  # the form stays up until the file's column roles are confirmed
+    elif file_to_load and engine == "SQLite (pushdown)":
+        content_hash = file_hash(file_to_load)
+        db_path = os.path.join(SQLITE_DIR, f"{content_hash}.sqlite")
+        if not os.path.exists(db_path):
+            with st.spinner("Building SQLite database..."), span("build_sqlite"):
+                SQLiteStore.from_parquet(convert_to_columnar(file_to_load), db_path)
+        dataset_key = f"sqlite:{content_hash}"
+        with span("open_dataset"):
+            open_dataset(dataset_key, lambda: (None, {"query_source": SQLiteStore(db_path)}))
+        record_metadata(upload_store, [file_to_load])
+        st.subheader(f"📊 Loaded Data: {upload_store.display_name(file_to_load)} (SQLite)")
+        store = get_query_source()
+        show_preview(store.preview(PREVIEW_ROWS), len(store))
+    elif file_to_load:
+        dataset_key = file_hash(file_to_load)
+        with span("open_dataset"):
+            open_dataset(dataset_key, lambda: (load_scrap_file(file_to_load), {}))
+        record_metadata(upload_store, [file_to_load])
+        st.subheader(f"📊 Loaded Data: {upload_store.display_name(file_to_load)}")
+        show_preview(get_dataset_frame())
     else:
-        st.info("Upload a CSV file to get started.")
+        st.info("Upload a CSV file or Excel workbook to get started.")
+
+    stats = get_registry().stats()
+    st.sidebar.caption(
+        f"🗄️ Shared datasets: {stats['datasets']} loaded, {stats['memory_mb']:,.0f} of {stats['budget_mb']:,.0f} MB, "
+        f"{stats['active_sessions']} active session(s)"
+    )
+
+
+def upload_label(entry):
+    """Picker label of an uploaded file: its name and, once ingested, rows, dates, machines and defects."""
+    name, meta = entry["names"][-1], entry["meta"]
+    if meta is None:
+        return f"{name} · {entry['size'] / 1e6:,.1f} MB · not loaded yet"
+    dates = f"{meta['date_min'][:10]} → {meta['date_max'][:10]}" if meta["date_min"] else "no dates"
+    return f"{name} · {meta['rows']:,} rows · {dates} · {meta.get('machines', 0)} machines · {meta.get('defects', 0)} defects"
+
+
+def record_metadata(store, paths):
+    # The picker's metadata is taken once per upload, from the columnar copy loading left behind
+    for path in paths:
+        entry = store.entry(path)
+        if entry is not None and entry["meta"] is None and has_column_roles(path) and os.path.exists(cache_path(path)):
+            store.describe(path, cache_path(path))
+
+
+def show_preview(df, total_rows=None):
+    # The loaded dataset is shared by every session; only its head is sent to the browser
+    total_rows = len(df) if total_rows is None else total_rows
+    st.caption(f"{total_rows:,} rows" + (f", showing the first {PREVIEW_ROWS:,}" if total_rows > PREVIEW_ROWS else ""))
+    with span("preview"):
+        st.dataframe(df.head(PREVIEW_ROWS))
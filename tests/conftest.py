@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules import each other from the repo root, and the pages their siblings, as under `streamlit run`
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "pages"))
+
+from utils.data_processing import enforce_schema  # noqa: E402
+
+MACHINES = ["M1", "M2", "M3", "M4"]
+DEFECTS = ["Hole", "Stain", "Tear"]
+FABRICS = ["Cotton", "Wool"]
+SHIFTS = ["A", "B", "C"]
+
+
+def scrap_events(n_rows, start="2023-12-20", days=90, seed=0):
+    """Typed scrap events at random times of day, like a loaded upload."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 24 * 60, n_rows), unit="min")
+    return enforce_schema(pd.DataFrame({
+        "Date": dates,
+        "Machine_ID": rng.choice(MACHINES, n_rows),
+        "Defect_Type": rng.choice(DEFECTS, n_rows),
+        "Fabric_Type": rng.choice(FABRICS, n_rows),
+        "Shift": rng.choice(SHIFTS, n_rows),
+        "Quantity_Scrapped_meters": rng.gamma(2.0, 2.5, n_rows).round(2),
+        "Scrap_Cost": rng.gamma(2.0, 20.0, n_rows).round(2),
+    }))
+
+
+@pytest.fixture
+def events():
+    return scrap_events(3000)
+
+
+@pytest.fixture(scope="session")
+def make_events():
+    return scrap_events
@@ -0,0 +1,54 @@
+"""Every view of the analysis pages, rerun headless on an uploaded file, raises nothing."""
+import os
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pages", "main.py")
+# Page -> view selector key, as in benchmarks/suite.py
+PAGES = {"Scrap Analysis": "sa_view", "Quality Reports": "qr_view"}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, events):
+    # The app reads uploads and writes its caches relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("uploaded_files")
+    events.to_csv(os.path.join("uploaded_files", "scrap.csv"), index=False, date_format="%Y-%m-%d %H:%M:%S")
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    at = AppTest.from_file(MAIN, default_timeout=120)
+    at.run()
+    at.sidebar.radio[0].set_value("Upload Data").run()
+    assert not at.exception, at.exception
+    return at
+
+
+@pytest.mark.parametrize("page", list(PAGES))
+def test_every_view_renders(app, page):
+    app.sidebar.radio[0].set_value(page).run()
+    view_key = PAGES[page]
+    for view in app.radio(key=view_key).options:
+        app.radio(key=view_key).set_value(view).run()
+        assert not app.exception, f"{view}: {app.exception}"
+
+
+@pytest.mark.parametrize("page", list(PAGES))
+def test_every_view_renders_an_empty_selection(app, page):
+    app.sidebar.radio[0].set_value(page).run()
+    app.sidebar.multiselect[0].set_value([]).run()
+    view_key = PAGES[page]
+    for view in app.radio(key=view_key).options:
+        app.radio(key=view_key).set_value(view).run()
+        assert not app.exception, f"{view}: {app.exception}"
+
+
+def test_granularities_of_a_single_machine(app):
+    app.sidebar.radio[0].set_value("Scrap Analysis").run()
+    app.radio(key="sa_view").set_value("📈 Trend & Cost").run()
+    machines = app.sidebar.multiselect[0]
+    machines.set_value(machines.options[:1]).run()
+    for grain in ["Week", "Month"]:
+        next(radio for radio in app.sidebar.radio if radio.label == "Time Granularity").set_value(grain).run()
+        assert not app.exception, f"{grain}: {app.exception}"
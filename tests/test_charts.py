@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.charts import OTHER_LABEL, collapse_top_n, downsample, downsample_stacked, lttb_indices
+
+
+def noisy_series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), rng.normal(0, 1, n).cumsum()
+
+
+def long_frame(n_series=15, n_dates=500, seed=0):
+    """Date x Machine_ID totals where every series misses some dates."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=n_dates, freq="D")
+    frame = pd.DataFrame({
+        "Date": np.tile(dates, n_series),
+        "Machine_ID": np.repeat([f"M{i:02d}" for i in range(n_series)], n_dates),
+        "Quantity_Scrapped_meters": rng.gamma(2.0, 5.0, n_series * n_dates) * np.repeat(np.arange(1, n_series + 1), n_dates),
+        "Scrap_Cost": rng.gamma(2.0, 50.0, n_series * n_dates),
+    })
+    return frame[rng.random(len(frame)) > 0.2].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 100), (1000, 3), (50, 49), (10_001, 400)])
+def test_lttb_keeps_ends_and_threshold(n, n_out):
+    x, y = noisy_series(n)
+    keep = lttb_indices(x, y, n_out)
+    assert len(keep) == n_out
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()
+
+
+@pytest.mark.parametrize("n, n_out", [(100, 100), (100, 400), (5, 2), (0, 10)])
+def test_lttb_returns_short_inputs_as_is(n, n_out):
+    x, y = noisy_series(n)
+    np.testing.assert_array_equal(lttb_indices(x, y, n_out), np.arange(n))
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[[137, 512, 880]] = [50.0, -40.0, 30.0]
+    keep = lttb_indices(x, y, 50)
+    assert {137, 512, 880} <= set(keep.tolist())
+
+
+def test_downsample_bounds_each_series():
+    frame = long_frame()
+    result = downsample(frame, "Date", "Quantity_Scrapped_meters", "Machine_ID", max_points=100)
+    sizes = result.groupby("Machine_ID").size()
+    assert (sizes == 100).all() and len(sizes) == frame["Machine_ID"].nunique()
+    for _, series in result.groupby("Machine_ID"):
+        original = frame[frame["Machine_ID"] == series["Machine_ID"].iloc[0]]
+        assert series["Date"].iloc[0] == original["Date"].min()
+        assert series["Date"].iloc[-1] == original["Date"].max()
+
+
+def test_stacked_series_share_x_positions():
+    frame = long_frame()
+    result = downsample_stacked(frame, "Date", "Quantity_Scrapped_meters", "Machine_ID", max_points=120)
+    positions = result.groupby("Machine_ID")["Date"].apply(lambda dates: tuple(sorted(dates)))
+    assert positions.nunique() == 1
+    shared = positions.iloc[0]
+    assert len(shared) == 120
+    assert shared[0] == frame["Date"].min() and shared[-1] == frame["Date"].max()
+    # Dates a series has no row for are drawn as zeros, not dropped or interpolated
+    kept = result.merge(frame, on=["Date", "Machine_ID"], how="left", suffixes=("", "_raw"))
+    assert (kept.loc[kept["Quantity_Scrapped_meters_raw"].isna(), "Quantity_Scrapped_meters"] == 0).all()
+    present = kept["Quantity_Scrapped_meters_raw"].notna()
+    np.testing.assert_allclose(kept.loc[present, "Quantity_Scrapped_meters"], kept.loc[present, "Quantity_Scrapped_meters_raw"])
+
+
+def test_stacked_short_input_is_kept_whole():
+    frame = long_frame(n_series=3, n_dates=40)
+    result = downsample_stacked(frame, "Date", "Quantity_Scrapped_meters", "Machine_ID", max_points=400)
+    assert len(result) == 3 * frame["Date"].nunique()
+    np.testing.assert_allclose(result["Quantity_Scrapped_meters"].sum(), frame["Quantity_Scrapped_meters"].sum())
+
+
+def test_collapse_top_n_other_is_the_remainder():
+    frame = long_frame()
+    result = collapse_top_n(frame, "Machine_ID", "Quantity_Scrapped_meters", n=5, x="Date")
+    totals = frame.groupby("Machine_ID")["Quantity_Scrapped_meters"].sum()
+    top = set(totals.nlargest(5).index)
+    assert set(result["Machine_ID"]) == top | {OTHER_LABEL}
+
+    tail = frame[~frame["Machine_ID"].isin(top)].groupby("Date")[["Quantity_Scrapped_meters", "Scrap_Cost"]].sum()
+    other = result[result["Machine_ID"] == OTHER_LABEL].set_index("Date")[["Quantity_Scrapped_meters", "Scrap_Cost"]]
+    pd.testing.assert_frame_equal(other, tail, check_exact=False, rtol=1e-12)
+    kept = result[result["Machine_ID"] != OTHER_LABEL].set_index(["Date", "Machine_ID"]).sort_index()
+    original = frame[frame["Machine_ID"].isin(top)].set_index(["Date", "Machine_ID"]).sort_index()
+    pd.testing.assert_frame_equal(kept, original[kept.columns], check_exact=False, rtol=1e-12)
+
+
+def test_collapse_top_n_without_x_and_twice():
+    totals = long_frame().groupby("Machine_ID", as_index=False)[["Quantity_Scrapped_meters", "Scrap_Cost"]].sum()
+    once = collapse_top_n(totals, "Machine_ID", "Quantity_Scrapped_meters", n=3)
+    assert len(once) == 4
+    remainder = totals.nsmallest(len(totals) - 3, "Quantity_Scrapped_meters")["Quantity_Scrapped_meters"].sum()
+    assert once.set_index("Machine_ID").loc[OTHER_LABEL, "Quantity_Scrapped_meters"] == pytest.approx(remainder)
+    pd.testing.assert_frame_equal(collapse_top_n(once, "Machine_ID", "Quantity_Scrapped_meters", n=3), once)
+
+
+def test_collapse_top_n_leaves_few_series_alone():
+    frame = long_frame(n_series=4)
+    assert collapse_top_n(frame, "Machine_ID", "Quantity_Scrapped_meters", n=10, x="Date") is frame
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_processing import (
+    COUNT_COLUMN, DATE_COLUMN, MEASURE_COLUMNS, CubeIndex, bucket_dates, build_cube, most_frequent, selection_key,
+)
+
+GROUPINGS = [(), (DATE_COLUMN,), ("Machine_ID",), (DATE_COLUMN, "Defect_Type"), ("Machine_ID", "Shift")]
+# Pandas' own period starts, independent of bucket_dates: weeks ending Sunday start on Monday
+PERIOD_STARTS = {
+    "Day": lambda dates: dates.dt.normalize(),
+    "Week": lambda dates: dates.dt.to_period("W-SUN").dt.start_time,
+    "Month": lambda dates: dates.dt.to_period("M").dt.start_time,
+}
+
+
+def expected(events, date_range, selections, grain, dims):
+    """The grouping as a plain filter and groupby of the raw events."""
+    start, end = (pd.Timestamp(date).normalize() for date in date_range)
+    rows = events[events[DATE_COLUMN].dt.normalize().between(start, end)]
+    for dim, values in selections.items():
+        rows = rows[rows[dim].isin(values)]
+    rows = rows.assign(**{DATE_COLUMN: PERIOD_STARTS[grain](rows[DATE_COLUMN])})
+    measures = rows[MEASURE_COLUMNS].astype(np.float64).assign(**{COUNT_COLUMN: 1})
+    if not dims:
+        return measures.sum().to_frame().T
+    keys = rows[list(dims)].astype({dim: str for dim in dims if dim != DATE_COLUMN})
+    return measures.join(keys).groupby(list(dims))[MEASURE_COLUMNS + [COUNT_COLUMN]].sum().reset_index()
+
+
+def assert_same(result, wanted, dims):
+    result = result.astype({dim: str for dim in dims if dim != DATE_COLUMN})
+    result = result.sort_values(list(dims)).reset_index(drop=True) if dims else result
+    wanted = wanted.sort_values(list(dims)).reset_index(drop=True) if dims else wanted
+    pd.testing.assert_frame_equal(
+        result[wanted.columns], wanted, check_dtype=False, check_exact=False, rtol=1e-6,
+    )
+
+
+@pytest.fixture
+def source(events):
+    return CubeIndex(build_cube(events))
+
+
+def selection_cases(events):
+    machines = sorted(events["Machine_ID"].cat.categories)
+    return {
+        "empty": {"Machine_ID": []},
+        "single": {"Machine_ID": machines[:1]},
+        "single_two_dims": {"Machine_ID": machines[1:2], "Defect_Type": ["Stain"]},
+        "full": {"Machine_ID": machines, "Shift": list(events["Shift"].cat.categories)},
+        "none": {},
+    }
+
+
+@pytest.mark.parametrize("grain", ["Day", "Week", "Month"])
+@pytest.mark.parametrize("case", ["empty", "single", "single_two_dims", "full", "none"])
+def test_plan_matches_pandas(events, source, grain, case):
+    selections = selection_cases(events)[case]
+    # A range starting mid-week and ending mid-month, so partial buckets are covered
+    date_range = (pd.Timestamp("2024-01-03"), pd.Timestamp("2024-02-14"))
+    plan = source.plan(date_range, selections, grain)
+    for dims in GROUPINGS:
+        assert_same(plan.get(*dims), expected(events, date_range, selections, grain, dims), dims)
+
+
+def test_plan_derives_coarser_groupings(events, source):
+    plan = source.plan(None, {}).require([DATE_COLUMN, "Machine_ID"])
+    everything = (events[DATE_COLUMN].min(), events[DATE_COLUMN].max())
+    for dims in [(DATE_COLUMN, "Machine_ID"), ("Machine_ID",), (DATE_COLUMN,), ()]:
+        assert_same(plan.get(*dims), expected(events, everything, {}, "Day", dims), dims)
+    assert plan.scans == 1
+
+
+def test_plan_keeps_requested_column_order(source):
+    plan = source.plan()
+    result = plan.get("Machine_ID", DATE_COLUMN)
+    assert list(result.columns[:2]) == ["Machine_ID", DATE_COLUMN]
+    assert plan.get(DATE_COLUMN, "Machine_ID") is plan.get(DATE_COLUMN, "Machine_ID")
+
+
+def test_date_range_includes_whole_end_day(events, source):
+    last = events[DATE_COLUMN].max().normalize()
+    totals = source.plan((last, last), {}).get()
+    on_last_day = events[events[DATE_COLUMN].dt.normalize() == last]
+    assert totals[COUNT_COLUMN].iloc[0] == len(on_last_day)
+
+
+def test_filter_values_outside_the_data(events, source):
+    positions = source.positions(None, {"Machine_ID": ["no such machine"]})
+    assert len(positions) == 0
+    assert len(source.positions(None, {"Machine_ID": ["M1", "no such machine"]})) == (
+        build_cube(events)["Machine_ID"] == "M1"
+    ).sum()
+
+
+def test_selection_key_normalizes(source):
+    machines = source.categories["Machine_ID"]
+    everything = (pd.Timestamp("1990-01-01"), pd.Timestamp("2100-01-01"))
+    assert selection_key(source, everything, {"Machine_ID": machines}) == selection_key(
+        source, None, {"Machine_ID": list(reversed(machines))}
+    )
+    assert selection_key(source, None, {"Machine_ID": machines})[2] == (("Machine_ID", "*"),)
+    # Order and repeats of the values don't matter; dimensions are sorted
+    assert selection_key(source, None, {"Shift": ["B"], "Machine_ID": ["M2", "M1", "M2"]}) == selection_key(
+        source, None, {"Machine_ID": ["M1", "M2"], "Shift": ["B"]}
+    )
+    assert selection_key(source, None, {"Machine_ID": ["M1", "M2"]})[2] == (("Machine_ID", ("M1", "M2")),)
+
+
+def test_selection_key_clips_dates_to_the_data(source):
+    start, end, _ = selection_key(source, (pd.Timestamp("1990-01-01"), pd.Timestamp("2100-01-01")))
+    assert (start, end) == (source.date_min.date().isoformat(), source.date_max.date().isoformat())
+    assert selection_key(source, ("2024-01-05", "2024-01-09"))[:2] == ("2024-01-05", "2024-01-09")
+
+
+@pytest.mark.parametrize("date, monday", [
+    ("2024-01-01", "2024-01-01"),  # a Monday
+    ("2024-01-07 23:59", "2024-01-01"),  # the Sunday after it
+    ("1970-01-01", "1969-12-29"),  # day 0 of the epoch is a Thursday
+    ("1969-12-31 12:00", "1969-12-29"),
+    ("1969-12-28", "1969-12-22"),
+    ("1900-03-01", "1900-02-26"),
+])
+def test_weeks_start_on_monday(date, monday):
+    buckets = bucket_dates(pd.Series([pd.Timestamp(date)]), "Week")
+    assert buckets.iloc[0] == pd.Timestamp(monday)
+    assert buckets.iloc[0].dayofweek == 0
+
+
+def test_week_buckets_before_1970_match_pandas():
+    dates = pd.Series(pd.date_range("1965-06-01", "1975-06-01", freq="37h"))
+    pd.testing.assert_series_equal(bucket_dates(dates, "Week"), PERIOD_STARTS["Week"](dates), check_names=False)
+
+
+def test_most_frequent_matches_mode(events):
+    assert most_frequent(build_cube(events), "Defect_Type") == events["Defect_Type"].astype(str).mode()[0]
+    assert most_frequent(build_cube(events.iloc[:0]), "Defect_Type") == "-"
+
+
+def test_most_frequent_breaks_ties_like_mode(events):
+    # Two defects equally frequent, the lexically later one first in category order
+    tied = events.iloc[:4].assign(Defect_Type=pd.Categorical(["Tear", "Hole", "Tear", "Hole"], categories=["Tear", "Hole"]))
+    assert most_frequent(build_cube(tied), "Defect_Type") == tied["Defect_Type"].astype(str).mode()[0] == "Hole"
@@ -0,0 +1,108 @@
+import os
+
+import pandas as pd
+import pytest
+
+from etl.load import PartitionedStore
+from utils.data_processing import COUNT_COLUMN, DATE_COLUMN, DIMENSION_COLUMNS, build_cube, concat_typed
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PartitionedStore(str(tmp_path / "plant"))
+
+
+def partition_files(store):
+    """(month, file) -> modification time of every partition file."""
+    files = {}
+    for month in store.partitions():
+        folder = store._partition_dir(month)
+        for name in os.listdir(folder):
+            files[(month, name)] = os.stat(os.path.join(folder, name)).st_mtime_ns
+    return files
+
+
+def sorted_cube(cube):
+    dims = [col for col in DIMENSION_COLUMNS if col in cube.columns]
+    cube = cube.astype({dim: str for dim in dims})
+    return cube.sort_values([DATE_COLUMN] + dims, ignore_index=True)
+
+
+def test_reappending_is_a_no_op(store, events):
+    store.append(events)
+    version, files = store.version, partition_files(store)
+    stats = store.append(events.sample(frac=1, random_state=0))
+    assert stats["rows_added"] == 0 and stats["duplicates"] == len(events) and stats["partitions"] == []
+    assert store.version == version
+    assert partition_files(store) == files
+    assert PartitionedStore(store.root).version == version
+
+
+def test_repeated_events_are_counted_copy_for_copy(store, events):
+    event = events.iloc[[0]]
+    store.append(concat_typed([events, event]))
+    assert len(store.read()) == len(events) + 1
+
+    # The batch holds three copies of an event stored twice: one of them is new
+    stats = store.append(concat_typed([event, event, event]))
+    assert (stats["rows_added"], stats["duplicates"]) == (1, 2)
+    stored = store.read()
+    assert (stored[events.columns] == event.iloc[0]).all(axis=1).sum() == 3
+
+
+def test_first_append_keeps_repeats_within_the_batch(store, events):
+    batch = concat_typed([events, events.iloc[:10]])
+    stats = store.append(batch)
+    assert stats["rows_added"] == len(batch) and stats["duplicates"] == 0
+    assert len(store.read()) == len(batch)
+
+
+def test_only_touched_months_are_rewritten(store, events):
+    january = events[DATE_COLUMN].dt.month == 1
+    store.append(events[~january])
+    before = partition_files(store)
+    stats = store.append(events)
+    assert stats["partitions"] == ["2024-01"]
+    assert stats["rows_added"] == january.sum()
+    after = partition_files(store)
+    assert {key[0] for key, mtime in after.items() if before.get(key) != mtime} == {"2024-01"}
+
+
+def test_high_water_mark(store, events):
+    early = events[DATE_COLUMN] < pd.Timestamp("2024-02-01")
+    store.append(events[early])
+    assert store.high_water_mark == events.loc[early, DATE_COLUMN].max()
+
+    store.append(events[~early])
+    assert store.high_water_mark == events[DATE_COLUMN].max()
+
+    # Late rows are merged into their months but never move the mark back
+    late = events[early].assign(Scrap_Cost=lambda frame: frame["Scrap_Cost"] + 1)
+    stats = store.append(late)
+    assert stats["late_rows"] == len(late) and stats["rows_added"] == len(late)
+    assert store.high_water_mark == events[DATE_COLUMN].max()
+    assert PartitionedStore(store.root).high_water_mark == events[DATE_COLUMN].max()
+
+
+def test_stitched_cube_equals_build_cube(store, make_events):
+    batches = [make_events(2000, start="2023-11-15", days=60, seed=seed) for seed in range(3)]
+    for batch in batches:
+        store.append(batch)
+    events = concat_typed(batches)
+    assert len(store.partitions()) == 3
+    pd.testing.assert_frame_equal(
+        sorted_cube(store.read_cube()), sorted_cube(build_cube(events)), check_dtype=False, check_exact=False, rtol=1e-6,
+    )
+    assert store.read_cube()[COUNT_COLUMN].sum() == len(events)
+
+
+def test_windowed_reads_only_cover_the_window(store, events):
+    store.append(events)
+    start, end = pd.Timestamp("2024-01-10"), pd.Timestamp("2024-02-20")
+    assert len(store.read(start, end)) == events[DATE_COLUMN].between(start, end).sum()
+    # The cube's rows are whole days, so its window covers all of the end day
+    days = events[events[DATE_COLUMN].dt.normalize().between(start, end)]
+    pd.testing.assert_frame_equal(
+        sorted_cube(store.read_cube(start, end)), sorted_cube(build_cube(days)),
+        check_dtype=False, check_exact=False, rtol=1e-6,
+    )
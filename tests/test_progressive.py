@@ -0,0 +1,96 @@
+import logging
+import threading
+
+import numpy as np
+import pytest
+
+from utils.data_processing import COUNT_COLUMN, CubeIndex, build_cube
+from utils.progressive import MOE_SUFFIX, Refiner, StratifiedSample
+
+MEASURE = "Quantity_Scrapped_meters"
+
+
+@pytest.fixture(scope="module")
+def cube(make_events):
+    return build_cube(make_events(20000, days=60, seed=1))
+
+
+def coverage(cube, dims, selections, seeds=40, size=800):
+    """Share of 95% intervals, over samples drawn with different seeds, holding the exact sum."""
+    exact = CubeIndex(cube).plan(None, selections).get(*dims)
+    hits = total = 0
+    for seed in range(seeds):
+        estimate = StratifiedSample(cube, size=size, seed=seed).estimate(dims, None, selections)
+        merged = exact.merge(estimate, on=list(dims), suffixes=("", "_est")) if dims else exact.join(estimate, rsuffix="_est")
+        for col in (MEASURE, COUNT_COLUMN):
+            error = (merged[f"{col}_est"] - merged[col]).abs()
+            hits += int((error <= merged[f"{col}{MOE_SUFFIX}"]).sum())
+            total += len(merged)
+    return hits / total
+
+
+@pytest.mark.parametrize("dims, selections", [
+    ((), {}),
+    (("Machine_ID",), {}),
+    ((), {"Defect_Type": ["Stain"]}),
+    (("Shift",), {"Machine_ID": ["M1", "M2"]}),
+])
+def test_margin_covers_exact_totals(cube, dims, selections):
+    assert 0.88 <= coverage(cube, dims, selections) <= 1.0
+
+
+def test_estimates_are_unbiased(cube):
+    exact = CubeIndex(cube).plan().get()[MEASURE].iloc[0]
+    estimates = [StratifiedSample(cube, size=800, seed=seed).estimate(())[MEASURE].iloc[0] for seed in range(40)]
+    assert abs(np.mean(estimates) - exact) / exact < 0.01
+
+
+def test_every_stratum_is_sampled(cube):
+    sample = StratifiedSample(cube, size=200)
+    strata = cube[["Machine_ID", "Defect_Type", "Shift"]].drop_duplicates()
+    assert len(sample.df[["Machine_ID", "Defect_Type", "Shift"]].drop_duplicates()) == len(strata)
+    assert sample.population_cells == len(cube)
+
+
+def test_small_cube_is_exact(cube):
+    small = cube.iloc[:300]
+    estimate = StratifiedSample(small, size=1000).estimate(("Machine_ID",))
+    exact = CubeIndex(small).plan().get("Machine_ID")
+    merged = exact.merge(estimate, on="Machine_ID", suffixes=("", "_est"))
+    np.testing.assert_allclose(merged[f"{MEASURE}_est"], merged[MEASURE])
+    assert (merged[f"{MEASURE}{MOE_SUFFIX}"] == 0).all()
+
+
+def test_empty_selection_estimates_zero(cube):
+    estimate = StratifiedSample(cube, size=800).estimate((), None, {"Machine_ID": []})
+    assert estimate[MEASURE].iloc[0] == 0 and estimate[f"{MEASURE}{MOE_SUFFIX}"].iloc[0] == 0
+
+
+def test_failed_step_is_logged_and_ends_the_job(caplog):
+    refiner = Refiner(workers=1)
+    ran = []
+
+    def fail():
+        raise ValueError("boom")
+
+    with caplog.at_level(logging.ERROR, logger="dsqt.refine"):
+        future = refiner.submit("session", "state", [fail, lambda: ran.append(True)])
+        assert future.result(timeout=10) is False
+    assert refiner.failed == 1 and refiner.completed == 0 and not ran
+    assert "boom" in caplog.text
+    # The pool keeps serving later jobs
+    assert refiner.submit("session", "other", [lambda: ran.append(True)]).result(timeout=10) is True
+    assert ran == [True]
+
+
+def test_new_state_cancels_the_previous_job():
+    refiner = Refiner(workers=1)
+    started, release = threading.Event(), threading.Event()
+    steps = []
+    first = refiner.submit("session", "a", [lambda: (started.set(), release.wait(10)), lambda: steps.append("a")])
+    started.wait(10)
+    second = refiner.submit("session", "b", [lambda: steps.append("b")])
+    assert refiner.submit("session", "b", []) is second
+    release.set()
+    assert first.result(timeout=10) is False and second.result(timeout=10) is True
+    assert steps == ["b"] and refiner.cancelled == 1
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.spc import RULES, ControlLimits, rolling_limits, rule_flags
+
+WINDOW = 10
+BITS = {label: 1 << bit for bit, (label, *_) in enumerate(RULES)}
+
+
+def series(n_groups, n_periods, seed=0):
+    rng = np.random.default_rng(seed)
+    groups = pd.Index([f"M{i}" for i in range(n_groups)])
+    periods = pd.date_range("2024-01-01", periods=n_periods, freq="D")
+    values = rng.gamma(2.0, 5.0, (n_groups, n_periods))
+    # Occasional spikes and quiet days so the rules have something to flag
+    values[rng.random(values.shape) < 0.05] *= 4
+    values[rng.random(values.shape) < 0.1] = 0.0
+    return groups, periods, values
+
+
+def assert_recomputed_from_scratch(chart, groups, periods, values):
+    center, sigma = rolling_limits(values, WINDOW)
+    np.testing.assert_allclose(chart.center, center, rtol=1e-9, atol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(chart.sigma, sigma, rtol=1e-9, atol=1e-9, equal_nan=True)
+    np.testing.assert_array_equal(chart.flags, rule_flags(values, center, sigma))
+    assert chart.groups.equals(groups) and chart.periods.equals(periods)
+
+
+def test_append_recomputes_only_new_periods():
+    groups, periods, values = series(6, 120)
+    chart = ControlLimits(WINDOW).update(groups, periods[:-20], values[:, :-20])
+    chart.update(groups, periods, values)
+    assert chart.recomputed == 20
+    assert_recomputed_from_scratch(chart, groups, periods, values)
+
+
+def test_grown_last_period():
+    groups, periods, values = series(4, 60)
+    earlier = values.copy()
+    earlier[:, -1] /= 2
+    chart = ControlLimits(WINDOW).update(groups, periods, earlier)
+    chart.update(groups, periods, values)
+    assert chart.recomputed == 1
+    assert_recomputed_from_scratch(chart, groups, periods, values)
+
+
+@pytest.mark.parametrize("first_scrap", [70, 95])
+def test_new_group(first_scrap):
+    groups, periods, values = series(5, 100)
+    # The last group only starts scrapping late: the earlier update has never seen it
+    values[-1, :first_scrap] = 0.0
+    chart = ControlLimits(WINDOW).update(groups[:-1], periods[:first_scrap], values[:-1, :first_scrap])
+    chart.update(groups, periods, values)
+    assert_recomputed_from_scratch(chart, groups, periods, values)
+
+
+def test_new_group_with_earlier_history():
+    groups, periods, values = series(5, 100)
+    chart = ControlLimits(WINDOW).update(groups[:-1], periods[:80], values[:-1, :80])
+    chart.update(groups, periods, values)
+    assert_recomputed_from_scratch(chart, groups, periods, values)
+
+
+def test_reordered_groups():
+    groups, periods, values = series(5, 80)
+    chart = ControlLimits(WINDOW).update(groups, periods[:70], values[:, :70])
+    order = np.array([3, 0, 4, 1, 2])
+    chart.update(groups[order], periods, values[order])
+    assert chart.recomputed == 10
+    assert_recomputed_from_scratch(chart, groups[order], periods, values[order])
+
+
+def test_dropped_group_starts_over():
+    groups, periods, values = series(5, 80)
+    chart = ControlLimits(WINDOW).update(groups, periods[:70], values[:, :70])
+    chart.update(groups[1:], periods, values[1:])
+    assert chart.recomputed == 80
+    assert_recomputed_from_scratch(chart, groups[1:], periods, values[1:])
+
+
+def test_narrowed_end_date():
+    groups, periods, values = series(4, 90)
+    chart = ControlLimits(WINDOW).update(groups, periods, values)
+    chart.update(groups, periods[:60], values[:, :60])
+    assert_recomputed_from_scratch(chart, groups, periods[:60], values[:, :60])
+
+
+def test_unchanged_update_recomputes_nothing():
+    groups, periods, values = series(3, 50)
+    chart = ControlLimits(WINDOW).update(groups, periods, values)
+    chart.update(groups, periods, values.copy())
+    assert chart.recomputed == 0
+    assert_recomputed_from_scratch(chart, groups, periods, values)
+
+
+def flags_of(z_scores, sigma=1.0):
+    """Rule flags of one series given as distances from a center of 0 in units of sigma."""
+    values = np.array([z_scores], dtype=np.float64) * sigma
+    return rule_flags(values, np.zeros_like(values), np.full_like(values, sigma))[0]
+
+
+def test_one_beyond_three_sigma():
+    assert flags_of([0.0, 3.5, 0.0]).tolist() == [0, BITS["1 beyond 3σ"], 0]
+    assert flags_of([0.0, 3.0, 0.0]).tolist() == [0, 0, 0]
+
+
+def test_two_of_three_beyond_two_sigma():
+    flags = flags_of([0.0, 2.5, 0.0, 2.5, 0.0])
+    assert flags.tolist() == [0, 0, 0, BITS["2 of 3 beyond 2σ"], 0]
+    # Two of the last four is not two of the last three
+    assert not flags_of([2.5, 0.0, 0.0, 2.5]).any()
+
+
+def test_four_of_five_beyond_one_sigma():
+    flags = flags_of([1.5, 1.5, 0.0, 1.5, 1.5])
+    assert flags.tolist() == [0, 0, 0, 0, BITS["4 of 5 beyond 1σ"]]
+    assert not flags_of([1.5, 1.5, 0.0, 0.0, 1.5, 1.5]).any()
+
+
+def test_eight_on_one_side():
+    flags = flags_of([0.5] * 9)
+    assert flags.tolist() == [0] * 7 + [BITS["8 on one side"]] * 2
+    assert not flags_of([0.5] * 7 + [-0.5] + [0.5] * 7).any()
+
+
+def test_only_upward_runs_alarm():
+    for z_scores in ([0.0, 3.5], [2.5, 0.0, 2.5], [1.5] * 5, [0.5] * 8):
+        assert flags_of(z_scores).any()
+        assert not flags_of([-z for z in z_scores]).any()
+
+
+def test_flat_history_and_missing_limits():
+    values = np.array([[5.0, 6.0, 5.0]])
+    flags = rule_flags(values, np.array([[np.nan, 5.0, 5.0]]), np.array([[np.nan, 0.0, 0.0]]))
+    # Any rise over a flat history is beyond every zone; no limits yet means no flags
+    assert flags.tolist() == [[0, BITS["1 beyond 3σ"], 0]]
@@ -0,0 +1,125 @@
+import io
+import json
+import os
+
+import pytest
+
+from etl.uploads import INDEX_FILE, UploadStore
+from utils.data_processing import file_hash
+
+CSV = b"Date,Machine_ID,Quantity_Scrapped_meters\n2024-01-01,M1,2.5\n"
+OTHER_CSV = b"Date,Machine_ID,Quantity_Scrapped_meters\n2024-01-02,M2,1.0\n"
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "uploaded_files")
+
+
+def copy_in(root, name, content, mtime=None):
+    """A file copied into the upload directory by hand."""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def files_in(root):
+    return sorted(name for name in os.listdir(root) if name != INDEX_FILE)
+
+
+def test_same_content_is_stored_once(root):
+    store = UploadStore.open(root)
+    path, new = store.put(io.BytesIO(CSV), "line_1.csv")
+    again, new_again = store.put(io.BytesIO(CSV), "copy.csv")
+    other, _ = store.put(io.BytesIO(OTHER_CSV), "line_1.csv")
+    assert new and not new_again and again == path and other != path
+    assert len(os.listdir(store.objects_dir)) == 2
+    assert store.entry(path)["names"] == ["line_1.csv", "copy.csv"]
+    assert store.display_name(path) == "copy.csv"
+
+
+def test_loose_file_is_indexed_in_place(root):
+    path = copy_in(root, "plant_a.csv", CSV, mtime=1_700_000_000)
+    store = UploadStore.open(root)
+    entry = store.entry(path)
+    assert entry["names"] == ["plant_a.csv"] and entry["uploaded"] == 1_700_000_000
+    assert os.path.exists(path)
+
+
+def test_loose_duplicate_of_an_upload_is_merged_and_removed(root):
+    store = UploadStore.open(root)
+    path, _ = store.put(io.BytesIO(CSV), "line_1.csv")
+    uploaded = store.entry(path)["uploaded"]
+    copy_in(root, "copy.csv", CSV)
+
+    store = UploadStore.open(root)
+    assert files_in(root) == ["objects"]
+    assert len(store.entries()) == 1
+    assert store.entry(path)["names"] == ["line_1.csv", "copy.csv"]
+    assert store.entry(path)["uploaded"] == uploaded
+    assert store.index["loose"] == {}
+
+
+def test_identical_loose_files_keep_one_copy(root):
+    copy_in(root, "a.csv", CSV)
+    copy_in(root, "b.csv", CSV)
+    store = UploadStore.open(root)
+    (entry,) = store.entries()
+    assert sorted(entry["names"]) == ["a.csv", "b.csv"]
+    assert files_in(root) == [os.path.basename(entry["path"]), "objects"]
+
+
+def test_readopting_keeps_the_upload_time(root):
+    path = copy_in(root, "plant_a.csv", CSV, mtime=1_700_000_000)
+    UploadStore.open(root)
+    # Touched (e.g. copied over with the same content): rehashed, but still the same upload
+    os.utime(path, (1_800_000_000, 1_800_000_000))
+    store = UploadStore.open(root)
+    assert store.entry(path)["uploaded"] == 1_700_000_000
+    assert store.index["loose"]["plant_a.csv"]["mtime_ns"] == 1_800_000_000 * 10 ** 9
+
+
+def test_overwritten_loose_file_replaces_its_object(root):
+    path = copy_in(root, "plant_a.csv", CSV)
+    UploadStore.open(root)
+    copy_in(root, "plant_a.csv", OTHER_CSV + b"2024-01-03,M3,4.0\n")
+    store = UploadStore.open(root)
+    (entry,) = store.entries()
+    assert entry["path"] == path and entry["size"] == os.path.getsize(path)
+
+
+def test_deleted_loose_files_are_forgotten(root):
+    path = copy_in(root, "plant_a.csv", CSV)
+    UploadStore.open(root)
+    os.remove(path)
+    store = UploadStore.open(root)
+    assert store.entries() == [] and store.index["loose"] == {}
+
+
+def test_names_of_deleted_duplicates_are_pruned(root):
+    store = UploadStore.open(root)
+    path, _ = store.put(io.BytesIO(CSV), "line_1.csv")
+    # An index written before duplicates were merged: copy.csv was indexed as a name of the
+    # object and left on disk, and has been deleted since
+    digest = file_hash(path)
+    with open(os.path.join(root, INDEX_FILE)) as f:
+        index = json.load(f)
+    index["objects"][digest]["names"].append("copy.csv")
+    index["loose"]["copy.csv"] = {"digest": digest, "size": len(CSV), "mtime_ns": 1}
+    with open(os.path.join(root, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+
+    store = UploadStore.open(root)
+    assert store.entry(path)["names"] == ["line_1.csv"]
+    assert store.index["loose"] == {}
+
+
+def test_unchanged_directory_is_not_rehashed(root, monkeypatch):
+    copy_in(root, "plant_a.csv", CSV)
+    UploadStore.open(root)
+    monkeypatch.setattr("etl.uploads.file_hash", lambda path: pytest.fail(f"{path} was hashed again"))
+    assert len(UploadStore.open(root).entries()) == 1
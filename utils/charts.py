@@ -0,0 +1,296 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from utils.profiling import span
+
+# Payload bounds for series charts: at most TOP_N named series plus "Other",
+# each downsampled to MAX_POINTS_PER_TRACE points
+TOP_N = 10
+MAX_POINTS_PER_TRACE = 400
+OTHER_LABEL = "Other"
+# Above this many points line charts are drawn with WebGL (scattergl) instead of SVG
+WEBGL_POINT_THRESHOLD = 2000
+# Built figures beyond this are evicted, least recently used first
+FIGURE_CACHE_MB = int(os.environ.get("DSQT_FIGURE_CACHE_MB", "256"))
+
+
+# --- Downsampling ---
+def lttb_indices(x, y, n_out):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps from a series sorted by x.
+
+    The first and last points are always kept; in between, each bucket keeps the point that
+    forms the largest triangle with the previously kept point and the next bucket's average,
+    which preserves peaks and troughs that plain striding would drop.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def _x_values(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return values.to_numpy(dtype=np.float64)
+
+
+def downsample(df, x, y, color=None, max_points=MAX_POINTS_PER_TRACE):
+    """LTTB-downsample each series (one per color value) to at most max_points points."""
+    if color is None:
+        df = df.sort_values(x)
+        return df.iloc[lttb_indices(_x_values(df[x]), df[y].to_numpy(), max_points)]
+    parts = []
+    for _, series in df.sort_values([color, x]).groupby(color, observed=True, sort=False):
+        parts.append(series.iloc[lttb_indices(_x_values(series[x]), series[y].to_numpy(), max_points)])
+    return pd.concat(parts) if parts else df
+
+
+def downsample_stacked(df, x, y, color, max_points=MAX_POINTS_PER_TRACE):
+    """Downsample stacked series on shared x positions, chosen by LTTB on their total.
+
+    Stacked areas need every series at the same x values; missing points are real zeros.
+    """
+    wide = df.pivot_table(index=x, columns=color, values=y, aggfunc="sum", fill_value=0, observed=True).sort_index()
+    keep = lttb_indices(_x_values(wide.index.to_series()), wide.sum(axis=1).to_numpy(), max_points)
+    return wide.iloc[keep].melt(ignore_index=False, value_name=y).reset_index()
+
+
+# --- Top-N collapsing ---
+def collapse_top_n(df, color, y, n=TOP_N, x=None):
+    """Keep the n largest series by total y and merge the long tail into one "Other" series.
+
+    Rows already labelled "Other" stay in the tail, so collapsing twice changes nothing.
+    """
+    labels = df[color].astype(str)
+    totals = df.loc[labels != OTHER_LABEL].groupby(labels[labels != OTHER_LABEL])[y].sum()
+    if len(totals) <= n:
+        return df
+    top = totals.nlargest(n).index
+    labels = labels.where(labels.isin(top), OTHER_LABEL)
+    keys = [labels] if x is None else [df[x], labels]
+    numeric = [col for col in df.columns if col not in (x, color) and pd.api.types.is_numeric_dtype(df[col])]
+    return df[numeric].groupby(keys, sort=True).sum().reset_index()
+
+
+# --- Figures ---
+def line_chart(df, x, y, color=None, top_n=TOP_N, max_points=MAX_POINTS_PER_TRACE, **kwargs):
+    """px.line with a bounded payload: top-N + "Other" series, LTTB per series, WebGL when dense."""
+    if color is not None:
+        df = collapse_top_n(df, color, y, top_n, x)
+    df = downsample(df, x, y, color, max_points)
+    render_mode = "webgl" if len(df) > WEBGL_POINT_THRESHOLD else "svg"
+    return px.line(df, x=x, y=y, color=color, render_mode=render_mode, **kwargs)
+
+
+def band_line_chart(df, x, y, margin, max_points=MAX_POINTS_PER_TRACE, **kwargs):
+    """Single-series line_chart of an estimate, with y ± margin drawn as a shaded band."""
+    df = downsample(df, x, y, max_points=max_points)
+    fig = px.line(df, x=x, y=y, **kwargs)
+    fig.add_traces([
+        go.Scatter(x=df[x], y=df[y] + df[margin], mode="lines", line={"width": 0}, showlegend=False, hoverinfo="skip"),
+        go.Scatter(
+            x=df[x], y=(df[y] - df[margin]).clip(lower=0), mode="lines", line={"width": 0},
+            fill="tonexty", fillcolor="rgba(99, 110, 250, 0.2)", name="95% margin", hoverinfo="skip",
+        ),
+    ])
+    return fig
+
+
+def area_chart(df, x, y, color, top_n=TOP_N, max_points=MAX_POINTS_PER_TRACE, **kwargs):
+    """Stacked px.area with top-N + "Other" series downsampled on shared x positions."""
+    df = downsample_stacked(collapse_top_n(df, color, y, top_n, x), x, y, color, max_points)
+    return px.area(df, x=x, y=y, color=color, **kwargs)
+
+
+def delta_bar_chart(df, y, delta, top_n=TOP_N, **kwargs):
+    """Horizontal bars of the top_n largest changes either way, increases red and decreases green."""
+    df = df.loc[df[delta].abs().nlargest(top_n).index].sort_values(delta)
+    colors = np.where(df[delta] > 0, "Increase", "Decrease")
+    return px.bar(
+        df.assign(Change=colors), x=delta, y=df[y].astype(str), orientation="h", color="Change",
+        color_discrete_map={"Increase": "firebrick", "Decrease": "seagreen"}, **kwargs,
+    ).update_yaxes(title=y, type="category")
+
+
+def mark_points(fig, points, x, y, color, text, name="Out of control", stacked=False):
+    """Overlay red markers for points (e.g. control-rule violations) on the traces of fig named after their color value.
+
+    Points of series without a trace (collapsed into "Other") are left out. On a stacked
+    chart a marker sits on top of its series' band, where the trace has that x.
+    """
+    traces = [trace for trace in fig.data if trace.name is not None]
+    points = points[points[color].astype(str).isin({trace.name for trace in traces})]
+    if stacked:
+        tops, running = {}, None
+        for trace in traces:
+            values = pd.Series(np.asarray(trace.y, dtype=np.float64), index=pd.Index(trace.x))
+            running = values if running is None else running.add(values, fill_value=0)
+            tops[trace.name] = running
+        positions = [tops[str(series)].get(at, np.nan) for series, at in zip(points[color], points[x])]
+        points = points.assign(**{y: positions}).dropna(subset=[y])
+    fig.add_trace(go.Scatter(
+        x=points[x], y=points[y], mode="markers", name=name,
+        marker={"symbol": "x", "size": 9, "color": "red"},
+        text=points[color].astype(str) + ": " + points[text], hovertemplate="%{text}<extra></extra>",
+    ))
+    return fig
+
+
+def control_chart(df, x, y, center, limits, text, **kwargs):
+    """One series against its center line and (upper, lower) limit column pairs, rule violations marked."""
+    fig = px.line(df, x=x, y=y, markers=True, **kwargs)
+    fig.add_trace(go.Scatter(x=df[x], y=df[center], mode="lines", name=center, line={"color": "gray", "width": 1}))
+    for (upper, lower), dash in zip(limits, ["dot", "dash", "solid"]):
+        for col in (upper, lower):
+            fig.add_trace(go.Scatter(
+                x=df[x], y=df[col], mode="lines", name=col, line={"color": "firebrick", "width": 1, "dash": dash},
+            ))
+    broken = df[df[text] != ""]
+    fig.add_trace(go.Scatter(
+        x=broken[x], y=broken[y], mode="markers", name="Out of control",
+        marker={"symbol": "x", "size": 10, "color": "red"}, text=broken[text], hovertemplate="%{text}<extra></extra>",
+    ))
+    return fig
+
+
+# --- Figure cache ---
+def _array_bytes(value):
+    if isinstance(value, np.ndarray):
+        # Object arrays (labels, hover text) hold references; count a short string per item
+        return value.size * 16 if value.dtype == object else value.nbytes
+    if isinstance(value, dict):
+        return sum(_array_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_array_bytes(item) for item in value) if value and isinstance(value[0], (dict, list, tuple)) else 8 * len(value)
+    return len(value) if isinstance(value, str) else 8
+
+
+def _payload_bytes(value):
+    # Figures are sized by their trace arrays, an estimate of the JSON sent to the browser that
+    # doesn't serialize the figure a second time; anything else by its pickle
+    if isinstance(value, go.Figure):
+        return sum(_array_bytes(trace.to_plotly_json()) for trace in value.data)
+    return len(pickle.dumps(value))
+
+
+class FigureCache:
+    """Built figures shared by every session, keyed by the page state that produced them.
+
+    Keys are (dataset fingerprint, normalized filter selection, granularity, chart id), so
+    returning to an earlier filter combination or view reuses its figures instead of
+    aggregating and building them again. The least recently used figures are evicted once
+    the cached total exceeds the memory budget. Cached figures must be treated as read-only.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        value = build()
+        nbytes = _payload_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.budget_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+                self.evictions += 1
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "figures": len(self._entries),
+                "memory_mb": self._nbytes / 1e6,
+                "budget_mb": self.budget_bytes / 1e6,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(FIGURE_CACHE_MB * 1024 * 1024)
+
+
+class FigureMemo:
+    """memo(chart_id, build) for one page state: returns the cached figure or builds and caches it.
+
+    build() only runs on a miss, so aggregations behind a cached figure are never computed.
+    """
+
+    def __init__(self, cache, state):
+        self.cache = cache
+        self.state = state
+
+    def __call__(self, chart_id, build):
+        def timed_build():
+            with span(f"figure:{chart_id}"):
+                return build()
+        return self.cache.get_or_build(self.state + (chart_id,), timed_build)
+
+    def cached(self, *chart_ids):
+        """Whether every one of these figures is already built for this state."""
+        return all(self.state + (chart_id,) in self.cache for chart_id in chart_ids)
+
+
+def figure_memo(*state):
+    return FigureMemo(get_figure_cache(), state)
+
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart, profiled: serializing the figure to the browser is its own stage."""
+    with span("plotly_chart"):
+        st.plotly_chart(fig, **kwargs)
+
+
+def figure_cache_caption():
+    stats = get_figure_cache().stats()
+    return (
+        f"🖼️ Figure cache: {stats['hit_rate']:.0%} hit rate ({stats['hits']:,}/{stats['hits'] + stats['misses']:,}), "
+        f"{stats['figures']} figures, {stats['memory_mb']:,.1f} of {stats['budget_mb']:,.0f} MB"
+    )
@@ -0,0 +1,98 @@
+"""Comparison of two selections: two periods of one dataset, or the same selection over two datasets.
+
+Each side is aggregated by its own plan over its own daily cube, and only the aggregates are
+aligned: an outer join on the grouping (a group missing on one side scrapped nothing there)
+plus the change from the baseline. Comparing two plants therefore costs about as much as
+viewing each of them, and neither side's raw events are concatenated or held for it.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.data_processing import COUNT_COLUMN, DATE_COLUMN, MEASURE_COLUMNS, bucket_dates
+
+CURRENT_SUFFIX = "_current"
+BASELINE_SUFFIX = "_baseline"
+DELTA_SUFFIX = "_delta"
+# Relative change from the baseline; NaN where the baseline is zero
+CHANGE_SUFFIX = "_change"
+# Trend position of two different periods: buckets since the start of each side's range
+PERIOD_COLUMN = "Period"
+
+
+def period_offsets(dates, start, grain):
+    """Buckets of the grain between each (bucketed) date and the bucket start falls in."""
+    first = bucket_dates(pd.Series([pd.Timestamp(start)]), grain).iloc[0]
+    dates = pd.Series(dates).reset_index(drop=True)
+    if grain == "Month":
+        return (dates.dt.year - first.year) * 12 + (dates.dt.month - first.month)
+    days = (dates - first).dt.days
+    return days // 7 if grain == "Week" else days
+
+
+def align(current, baseline, dims, measures=None):
+    """One row per group of either side: each measure on both sides, its delta and relative change."""
+    measures = [
+        col for col in (measures or MEASURE_COLUMNS + [COUNT_COLUMN]) if col in current.columns and col in baseline.columns
+    ]
+    if not dims:
+        cur = current[measures].sum().to_frame().T
+        base = baseline[measures].sum().to_frame().T
+    else:
+        # Category codes differ between datasets, so groups are matched on their values
+        def indexed(frame):
+            keys = {dim: frame[dim].astype(str) if isinstance(frame[dim].dtype, pd.CategoricalDtype) else frame[dim] for dim in dims}
+            return frame[measures].astype(np.float64).assign(**keys).groupby(list(dims), sort=True)[measures].sum()
+        cur, base = indexed(current).align(indexed(baseline), join="outer", fill_value=0.0)
+    columns = {}
+    for col in measures:
+        now, before = cur[col].to_numpy(dtype=np.float64), base[col].to_numpy(dtype=np.float64)
+        columns[f"{col}{CURRENT_SUFFIX}"] = now
+        columns[f"{col}{BASELINE_SUFFIX}"] = before
+        columns[f"{col}{DELTA_SUFFIX}"] = now - before
+        with np.errstate(divide="ignore", invalid="ignore"):
+            columns[f"{col}{CHANGE_SUFFIX}"] = np.where(before != 0, (now - before) / before, np.nan)
+    result = pd.DataFrame(columns, index=cur.index)
+    return result.reset_index() if dims else result.reset_index(drop=True)
+
+
+class ComparisonPlan:
+    """Aligned current vs baseline aggregates, each side answered by its own AggregationPlan.
+
+    get() has the signature of AggregationPlan.get; groupings are required on both sides, so
+    each plan still derives what it can from its finer groupings and scans each grouping at
+    most once.
+    """
+
+    def __init__(self, current, baseline, current_range, baseline_range, grain="Day"):
+        self.current = current
+        self.baseline = baseline
+        self.current_range = current_range
+        self.baseline_range = baseline_range
+        self.grain = grain
+        self._results = {}
+
+    @property
+    def scans(self):
+        return self.current.scans + self.baseline.scans
+
+    def require(self, *groupings):
+        self.current.require(*groupings)
+        self.baseline.require(*groupings)
+        return self
+
+    def get(self, *dims):
+        if dims not in self._results:
+            self._results[dims] = align(self.current.get(*dims), self.baseline.get(*dims), list(dims))
+        return self._results[dims]
+
+    def trend(self, *dims):
+        """Aligned trend: on Date when both sides cover the same dates, otherwise on PERIOD_COLUMN."""
+        if pd.Timestamp(self.current_range[0]) == pd.Timestamp(self.baseline_range[0]):
+            return self.get(DATE_COLUMN, *dims)
+        if (PERIOD_COLUMN,) + dims not in self._results:
+            sides = []
+            for plan, (start, _) in [(self.current, self.current_range), (self.baseline, self.baseline_range)]:
+                frame = plan.get(DATE_COLUMN, *dims)
+                sides.append(frame.assign(**{PERIOD_COLUMN: period_offsets(frame[DATE_COLUMN], start, self.grain).to_numpy()}))
+            self._results[(PERIOD_COLUMN,) + dims] = align(*sides, [PERIOD_COLUMN, *dims])
+        return self._results[(PERIOD_COLUMN,) + dims]
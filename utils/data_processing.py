@@ -0,0 +1,413 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from utils.profiling import span
+
+# Columnar copies of uploaded files live next to uploaded_files/, one file per content hash
+CACHE_DIR = "columnar_cache"
+
+DATE_COLUMN = "Date"
+CATEGORY_COLUMNS = ["Machine_ID", "Defect_Type", "Fabric_Type", "Shift"]
+# Added when several files are loaded as one dataset: the file (line, plant) each row came from
+SOURCE_COLUMN = "Source"
+DIMENSION_COLUMNS = CATEGORY_COLUMNS + [SOURCE_COLUMN]
+MEASURE_COLUMNS = ["Quantity_Scrapped_meters", "Scrap_Cost"]
+COUNT_COLUMN = "Event_Count"
+
+# Granularity -> cube column holding the start of each row's time bucket
+TIME_BUCKETS = {"Day": "Date", "Week": "Week_Start", "Month": "Month_Start"}
+
+_HASH_CHUNK_SIZE = 8 * 1024 * 1024
+_hash_memo = {}
+
+
+# --- Hashing ---
+def file_hash(path):
+    """Content hash of a file, memoized on (path, size, mtime) so reruns don't re-read it."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hash_memo:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+# --- Typing ---
+def parse_dates(values, date_format=None):
+    """to_datetime that parses each distinct value once when the column is categorical."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        parsed = pd.to_datetime(values.cat.categories, errors="coerce", format=date_format).values
+        codes = values.cat.codes.to_numpy()
+        out = parsed[codes]
+        out[codes == -1] = np.datetime64("NaT")
+        return pd.Series(out, index=values.index, name=values.name)
+    return pd.to_datetime(values, errors="coerce", format=date_format)
+
+
+def enforce_schema(df):
+    """Cast the known scrap columns to their fixed dtypes; other columns are left as they are."""
+    if DATE_COLUMN in df.columns and not pd.api.types.is_datetime64_any_dtype(df[DATE_COLUMN]):
+        df[DATE_COLUMN] = parse_dates(df[DATE_COLUMN])
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col in MEASURE_COLUMNS:
+        if col in df.columns and df[col].dtype != np.float32:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+    return df
+
+
+def read_scrap_csv(path):
+    """Parse a scrap CSV straight into the fixed dtypes (no object columns for the dimensions)."""
+    dtypes = {col: "category" for col in CATEGORY_COLUMNS + [DATE_COLUMN]}
+    return enforce_schema(pd.read_csv(path, dtype=dtypes))
+
+
+def concat_typed(frames):
+    """Concatenate typed frames in one pass, unioning the categories so codes line up across frames."""
+    frames = [df for df in frames if len(df)] or list(frames[:1])
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = frames[0].columns
+    if any(not df.columns.equals(columns) for df in frames):
+        return enforce_schema(pd.concat(frames, ignore_index=True))
+    data = {}
+    for col in columns:
+        parts = [df[col] for df in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            data[col] = union_categoricals(parts, ignore_order=True)
+        else:
+            data[col] = np.concatenate([part.to_numpy() for part in parts])
+    return pd.DataFrame(data, columns=columns)
+
+
+# --- Columnar cache ---
+def cache_path(path):
+    """Columnar copy of a file: keyed by its content hash, and by its column roles when they rename anything."""
+    # Imported here because the ETL package itself builds on this module
+    from etl.extract import stored_roles
+    roles = stored_roles(path)
+    suffix = "" if roles is None or roles.is_identity() else f"-{roles.fingerprint()}"
+    return os.path.join(CACHE_DIR, f"{file_hash(path)}{suffix}.parquet")
+
+
+def convert_to_columnar(path):
+    """Stream a CSV or workbook into its typed Parquet copy once per content hash and return the copy's path."""
+    target = cache_path(path)
+    if not os.path.exists(target):
+        # Imported here because the ETL package itself builds on this module
+        from etl.pipeline import run_pipeline
+        with span("convert"):
+            run_pipeline(path, target)
+    return target
+
+
+def read_columnar(path, enforce=True):
+    """Read a typed Parquet file, decoding the dimensions straight into categoricals.
+
+    enforce=False keeps the stored dtypes as they are (e.g. the float64 sums of a cube).
+    """
+    with span("read_columnar"):
+        names = pq.read_schema(path).names
+        table = pq.read_table(path, read_dictionary=[col for col in DIMENSION_COLUMNS if col in names])
+        df = table.to_pandas()
+        return enforce_schema(df) if enforce else df
+
+
+def load_scrap_file(path):
+    """Load a scrap file as a typed DataFrame, going through the columnar cache for CSVs and workbooks."""
+    if path.endswith(".parquet"):
+        return read_columnar(path)
+    return read_columnar(convert_to_columnar(path))
+
+
+# --- Several files as one dataset ---
+def source_labels(paths):
+    """Source value of each file: its name without extension, or its path below the files'
+    common directory when names repeat (plant_a/line_1.csv and plant_b/line_1.csv)."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if len(set(stems)) == len(stems):
+        return stems
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0].replace(os.sep, "/") for path in paths]
+
+
+def files_hash(paths, labels):
+    """Content hash of several files loaded together under their labels."""
+    digest = hashlib.blake2b(digest_size=16)
+    for path, label in zip(paths, labels):
+        digest.update(f"{file_hash(path)}:{label}\n".encode())
+    return digest.hexdigest()
+
+
+def load_scrap_files(paths, labels=None):
+    """Load several scrap files as one typed DataFrame with a categorical Source column.
+
+    Files come from the columnar cache (convert them in parallel beforehand with
+    etl.pipeline.run_many_pipeline). Categories are unioned so their codes match across
+    files, and each column of the result is allocated once instead of growing file by file.
+    """
+    labels = source_labels(paths) if labels is None else labels
+    frames = []
+    for path, label in zip(paths, labels):
+        df = load_scrap_file(path)
+        df[SOURCE_COLUMN] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), [label])
+        frames.append(df)
+    return concat_typed(frames)
+
+
+# --- Time buckets ---
+def bucket_dates(dates, grain):
+    """Start of the "Hour", "Day", "Week" (Monday) or "Month" bucket of each timestamp, without a Python loop."""
+    values = dates.to_numpy(dtype="datetime64[ns]")
+    if grain == "Hour":
+        buckets = values.astype("datetime64[h]")
+    elif grain == "Day":
+        buckets = values.astype("datetime64[D]")
+    elif grain == "Week":
+        days = values.astype("datetime64[D]")
+        # Day 0 of the epoch is a Thursday, so (days + 3) % 7 is 0 on Mondays
+        buckets = days - (days.astype(np.int64) + 3) % 7
+    elif grain == "Month":
+        buckets = values.astype("datetime64[M]")
+    else:
+        raise ValueError(f"Unknown time grain: {grain}")
+    return pd.Series(buckets.astype("datetime64[ns]"), index=dates.index, name=dates.name)
+
+
+# --- Scrap cube ---
+def build_cube(df):
+    """Daily rollup over every dimension: measure sums plus the number of scrap events per cell.
+
+    Every chart on the analysis pages is a sum over some subset of these dimensions, so they
+    can all be answered from the cube, which is far smaller than the raw event table.
+    """
+    dimensions = [col for col in DIMENSION_COLUMNS if col in df.columns]
+    keys = [df[DATE_COLUMN].dt.normalize()] + [df[col] for col in dimensions]
+    grouped = df.groupby(keys, observed=True, sort=False)
+    cube = grouped[MEASURE_COLUMNS].sum().astype(np.float64)
+    cube[COUNT_COLUMN] = grouped.size()
+    cube = cube.reset_index()
+    for grain, column in TIME_BUCKETS.items():
+        if column != DATE_COLUMN:
+            cube[column] = bucket_dates(cube[DATE_COLUMN], grain)
+    return cube
+
+
+def most_frequent(cube, dimension):
+    """Mode of a dimension taken from the stored event counts; ties go to the first value in sort
+    order, as with Series.mode() of the raw values (categories are ordered by first appearance)."""
+    if cube.empty:
+        return "-"
+    counts = cube.groupby(dimension, observed=True)[COUNT_COLUMN].sum()
+    return counts.sort_index(key=lambda labels: labels.astype(str)).idxmax()
+
+
+# --- Aggregation planner ---
+class AggregationPlan:
+    """Groupings a page needs over one filtered table, each computed at most once per rerun.
+
+    Pages declare their groupings with require(); get() answers each one from the smallest
+    declared grouping that contains it (per-machine totals from Date x Machine_ID, grand totals
+    from any of them), so only groupings nothing else covers scan the table. All aggregated
+    columns are sums, which is what makes the derivation exact. Results are shared between
+    tabs and must be treated as read-only.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.scans = 0
+        self._required = set()
+        self._results = {}
+
+    def require(self, *groupings):
+        for dims in groupings:
+            self._required.add(frozenset(dims))
+        return self
+
+    def seed(self, results):
+        """Start from groupings computed elsewhere ({dims: frame}, e.g. a report snapshot of this same selection)."""
+        for dims, frame in results.items():
+            self._results.setdefault(frozenset(dims), frame)
+        return self
+
+    def _source(self, key):
+        supersets = [dims for dims in self._required | set(self._results) if key < dims]
+        if not supersets:
+            return None
+        return min(supersets, key=lambda dims: (len(dims), sorted(dims)))
+
+    def _aggregate(self, frame, dims):
+        columns = [col for col in MEASURE_COLUMNS + [COUNT_COLUMN] if col in frame.columns]
+        if not dims:
+            totals = frame[columns].sum().to_frame().T
+            # The transposed row comes back all float; event counts stay integers, as in every grouping
+            return totals.astype({COUNT_COLUMN: frame[COUNT_COLUMN].dtype}) if COUNT_COLUMN in columns else totals
+        return frame.groupby(dims, observed=True)[columns].sum().reset_index()
+
+    def _scan(self, dims):
+        """Aggregate the full table; the only step that touches every row."""
+        return self._aggregate(self.table, dims)
+
+    def get(self, *dims):
+        key = frozenset(dims)
+        if key not in self._results:
+            source = self._source(key)
+            if source is None:
+                self.scans += 1
+                with span(f"scan:{'+'.join(sorted(key)) or 'totals'}"):
+                    self._results[key] = self._scan(sorted(key))
+            else:
+                self._results[key] = self._aggregate(self.get(*sorted(source)), sorted(key))
+        result = self._results[key]
+        if list(dims) == sorted(key):
+            return result
+        return result[list(dims) + [col for col in result.columns if col not in key]]
+
+
+# --- Filter engine ---
+class FilterIndex:
+    """Date-sorted scrap table with per-value row positions for each categorical dimension.
+
+    Built once per dataset. Date ranges are cut with binary search on the sorted dates and
+    categorical selections only touch the rows of the selected values, so a filter costs
+    roughly the size of its result instead of a full scan of every column.
+    """
+
+    def __init__(self, df, dimensions=DIMENSION_COLUMNS):
+        df = df[df[DATE_COLUMN].notna()]
+        self.df = df.sort_values(DATE_COLUMN, kind="stable", ignore_index=True)
+        self._dates = self.df[DATE_COLUMN].to_numpy(dtype="datetime64[ns]")
+        self.date_min = self.df[DATE_COLUMN].min()
+        self.date_max = self.df[DATE_COLUMN].max()
+
+        self.dimensions = [dim for dim in dimensions if dim in self.df.columns]
+        self.categories = {}
+        self._codes = {}
+        self._code_of = {}
+        self._order = {}
+        self._bounds = {}
+        self._has_missing = {}
+        for dim in self.dimensions:
+            values = self.df[dim].astype("category").cat.remove_unused_categories()
+            codes = values.cat.codes.to_numpy()
+            # Stable sort keeps each value's positions ascending, i.e. in date order
+            order = np.argsort(codes, kind="stable")
+            if len(order) < np.iinfo(np.int32).max:
+                order = order.astype(np.int32)
+            self.categories[dim] = values.cat.categories.tolist()
+            self._codes[dim] = codes
+            self._code_of[dim] = {value: code for code, value in enumerate(self.categories[dim])}
+            self._order[dim] = order
+            self._bounds[dim] = np.searchsorted(codes[order], np.arange(len(self.categories[dim]) + 1))
+            self._has_missing[dim] = bool(len(codes)) and codes[order[0]] == -1
+
+    def __len__(self):
+        return len(self.df)
+
+    def nbytes(self):
+        """Memory held by the sorted table and its per-dimension indexes."""
+        arrays = [self._dates] + list(self._codes.values()) + list(self._order.values()) + list(self._bounds.values())
+        return int(self.df.memory_usage(deep=True).sum()) + sum(array.nbytes for array in arrays)
+
+    def _selected_codes(self, dim, values):
+        code_of = self._code_of[dim]
+        return np.unique(np.array([code_of[v] for v in values if v in code_of], dtype=np.int64))
+
+    def date_bounds(self, date_range):
+        """Row slice [lo, hi) of the sorted table covering an inclusive (start, end) range."""
+        if date_range is None:
+            return 0, len(self.df)
+        start, end = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+        lo = np.searchsorted(self._dates, start.to_datetime64(), side="left")
+        hi = np.searchsorted(self._dates, end.to_datetime64(), side="right")
+        return int(lo), int(hi)
+
+    def positions(self, date_range=None, selections=None):
+        """Sorted row positions matching the date range and every {dimension: values} selection."""
+        lo, hi = self.date_bounds(date_range)
+        restricted = []
+        for dim, values in (selections or {}).items():
+            codes = self._selected_codes(dim, values)
+            if len(codes) == len(self.categories[dim]) and not self._has_missing[dim]:
+                continue
+            bounds = self._bounds[dim]
+            restricted.append((int((bounds[codes + 1] - bounds[codes]).sum()), dim, codes))
+        if not restricted:
+            return np.arange(lo, max(lo, hi))
+
+        # Drive from the most selective dimension; the others are checked on its rows only
+        restricted.sort(key=lambda item: item[0])
+        _, dim, codes = restricted[0]
+        order, bounds = self._order[dim], self._bounds[dim]
+        pieces = []
+        for code in codes:
+            piece = order[bounds[code]:bounds[code + 1]]
+            pieces.append(piece[np.searchsorted(piece, lo):np.searchsorted(piece, hi)])
+        pos = np.sort(np.concatenate(pieces)) if pieces else np.empty(0, dtype=np.int64)
+
+        for _, dim, codes in restricted[1:]:
+            # Extra trailing slot stays False so missing values (code -1) never match
+            lookup = np.zeros(len(self.categories[dim]) + 1, dtype=bool)
+            lookup[codes] = True
+            pos = pos[lookup[self._codes[dim][pos]]]
+        return pos
+
+    def filter(self, date_range=None, selections=None):
+        """Filtered copy of the table; always a new frame so callers may add columns."""
+        pos = self.positions(date_range, selections)
+        if len(pos) == len(self.df):
+            return self.df.copy(deep=False)
+        return self.df.take(pos)
+
+
+def selection_key(source, date_range=None, selections=None):
+    """Hashable form of a filter selection over a query source, equal for equivalent selections.
+
+    The date range is clipped to the data, values are sorted, and a dimension with every value
+    selected becomes "*", so results memoized on it are reused however the widgets got there.
+    """
+    start, end = date_range or (source.date_min, source.date_max)
+    start = max(pd.Timestamp(start), pd.Timestamp(source.date_min).normalize())
+    end = min(pd.Timestamp(end), pd.Timestamp(source.date_max).normalize())
+    dims = []
+    for dim, values in sorted((selections or {}).items()):
+        values = {str(value) for value in values}
+        everything = {str(value) for value in source.categories[dim]}
+        dims.append((dim, "*" if values >= everything else tuple(sorted(values))))
+    return start.date().isoformat(), end.date().isoformat(), tuple(dims)
+
+
+class CubeIndex(FilterIndex):
+    """FilterIndex over a daily scrap cube, handing out the aggregation plan for a filter selection."""
+
+    def plan(self, date_range=None, selections=None, grain="Day"):
+        return CubePlan(self, date_range, selections, grain)
+
+
+class CubePlan(AggregationPlan):
+    """AggregationPlan over a CubeIndex selection; the cube is only filtered once something scans it."""
+
+    def __init__(self, index, date_range=None, selections=None, grain="Day"):
+        super().__init__(None)
+        self.index = index
+        self.date_range = date_range
+        self.selections = selections
+        self.grain = grain
+
+    def _scan(self, dims):
+        if self.table is None:
+            with span("filter"):
+                cube = self.index.filter(self.date_range, self.selections)
+            # Trends group by Date, so point it at the precomputed bucket column of the chosen grain
+            cube[DATE_COLUMN] = cube[TIME_BUCKETS[self.grain]]
+            self.table = cube
+        return super()._scan(dims)
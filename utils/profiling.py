@@ -0,0 +1,198 @@
+"""Per-rerun timing and memory spans, appended to a rotating JSONL log.
+
+    python -m utils.profiling                      # p50/p95 per stage from logs/profile.jsonl
+    python -m utils.profiling other.jsonl --page "Scrap Analysis"
+
+A rerun is profiled inside profile_rerun(); span() blocks nested in it (page sections, filters,
+scans, figure builds, chart serialization) record their wall time and the change in process RSS.
+Outside a profiled rerun, span() does nothing, so library code can be instrumented freely.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+import pandas as pd
+
+# One JSON line per rerun; set DSQT_PROFILE_LOG to an empty string to disable the log
+PROFILE_LOG = os.environ.get("DSQT_PROFILE_LOG", os.path.join("logs", "profile.jsonl"))
+PROFILE_LOG_MB = int(os.environ.get("DSQT_PROFILE_LOG_MB", "10"))
+PROFILE_LOG_BACKUPS = 5
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # Windows
+    _PAGE_SIZE = None
+
+
+def rss_mb():
+    """Current resident set size of this process in MB, or None where /proc isn't available."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1e6
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RerunProfile:
+    """Spans and context of one script rerun, in the order the spans started."""
+
+    def __init__(self, name, session_id=None):
+        self.name = name
+        self.session_id = session_id
+        self.started = datetime.now(timezone.utc)
+        self.spans = []
+        self.context = {}
+        self._stack = []
+
+    @property
+    def total_ms(self):
+        return self.spans[0]["ms"] if self.spans and self.spans[0] else None
+
+    def record(self):
+        return {
+            "ts": self.started.isoformat(timespec="milliseconds"),
+            "session": self.session_id,
+            "page": self.name,
+            "total_ms": self.total_ms,
+            "rss_mb": rss_mb(),
+            **self.context,
+            "spans": [span for span in self.spans if span is not None],
+        }
+
+
+# Streamlit runs each session's reruns on its own script thread
+_local = threading.local()
+
+
+def current_profile():
+    return getattr(_local, "profile", None)
+
+
+@contextmanager
+def span(name):
+    """Time a block (and its RSS change) as a stage of the current rerun, nested under open spans."""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    profile._stack.append(name)
+    stage = "/".join(profile._stack)
+    # Reserve the slot now so parents are listed before their children
+    slot = len(profile.spans)
+    profile.spans.append(None)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        rss_after = rss_mb()
+        profile.spans[slot] = {
+            "stage": stage,
+            "ms": round(elapsed_ms, 3),
+            "rss_delta_mb": None if rss_before is None or rss_after is None else round(rss_after - rss_before, 2),
+        }
+        profile._stack.pop()
+
+
+def annotate(**context):
+    """Attach fields (dataset size, filter cardinalities, ...) to the current rerun's log record."""
+    profile = current_profile()
+    if profile is not None:
+        profile.context.update(context)
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _profile_logger():
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger("dsqt.profile")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            if PROFILE_LOG and not logger.handlers:
+                os.makedirs(os.path.dirname(os.path.abspath(PROFILE_LOG)), exist_ok=True)
+                handler = RotatingFileHandler(
+                    PROFILE_LOG, maxBytes=PROFILE_LOG_MB * 1024 * 1024, backupCount=PROFILE_LOG_BACKUPS, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+
+@contextmanager
+def profile_rerun(name, session_id=None):
+    """Profile one rerun under a root span called name, then append it to the log."""
+    profile = RerunProfile(name, session_id)
+    _local.profile = profile
+    try:
+        with span(name):
+            yield profile
+    finally:
+        _local.profile = None
+        _profile_logger().info(json.dumps(profile.record(), default=str, ensure_ascii=False))
+
+
+# --- Summary ---
+def read_log(path=PROFILE_LOG):
+    """Records from a profile log and its rotated backups, oldest first."""
+    paths = [f"{path}.{i}" for i in range(PROFILE_LOG_BACKUPS, 0, -1)] + [path]
+    records = []
+    for log_path in paths:
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+    return records
+
+
+def summarize(records, page=None):
+    """Count, p50, p95 and max milliseconds (and p95 RSS change) per stage."""
+    rows = [span for record in records if page in (None, record.get("page")) for span in record.get("spans", [])]
+    if not rows:
+        return pd.DataFrame(columns=["stage", "count", "p50_ms", "p95_ms", "max_ms", "p95_rss_delta_mb"])
+    spans = pd.DataFrame(rows)
+    spans["rss_delta_mb"] = pd.to_numeric(spans["rss_delta_mb"])
+    grouped = spans.groupby("stage", sort=False)
+    return pd.DataFrame({
+        "count": grouped["ms"].size(),
+        "p50_ms": grouped["ms"].quantile(0.5),
+        "p95_ms": grouped["ms"].quantile(0.95),
+        "max_ms": grouped["ms"].max(),
+        "p95_rss_delta_mb": grouped["rss_delta_mb"].quantile(0.95),
+    }).sort_index().reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report p50/p95 latency per stage from the rerun profile log.")
+    parser.add_argument("log", nargs="?", default=PROFILE_LOG, help="Profile log (default: %(default)s)")
+    parser.add_argument("--page", help="Only reruns of this page")
+    args = parser.parse_args(argv)
+
+    records = [record for record in read_log(args.log) if args.page in (None, record.get("page"))]
+    if not records:
+        print(f"No profiled reruns in {args.log}")
+        return
+    summary = summarize(records)
+    print(f"{len(records):,} reruns from {records[0]['ts']} to {records[-1]['ts']}")
+    print(summary.round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Progressive pages: estimates from a stratified sample first, exact results computed in the background.
+
+The sample is drawn once per dataset from the daily cube, stratified by machine, defect and
+shift, so every stratum is represented however skewed the data. Sums over any filter are
+estimated by weighting each sampled cell by the inverse of its stratum's sampling rate, with
+a 95% margin of error from the stratified-sampling variance. Meanwhile a Refiner builds the
+exact figures in a background thread, and the page reruns once they are in the figure cache.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.data_processing import COUNT_COLUMN, DATE_COLUMN, MEASURE_COLUMNS, TIME_BUCKETS, AggregationPlan, FilterIndex
+from utils.session_state import session_id
+
+# Cube cells kept in the sample, and at least this many per stratum (when it has them)
+SAMPLE_CELLS = int(os.environ.get("DSQT_SAMPLE_CELLS", "50000"))
+MIN_PER_STRATUM = 2
+STRATA = ["Machine_ID", "Defect_Type", "Shift"]
+# Progressive mode is on by default for cubes larger than this
+PROGRESSIVE_MIN_CELLS = int(os.environ.get("DSQT_PROGRESSIVE_MIN_CELLS", "1000000"))
+REFINE_WORKERS = 2
+REFINE_POLL_SECONDS = 0.5
+Z_95 = 1.96
+MOE_SUFFIX = "_moe"
+
+_STRATUM = "_stratum"
+_WEIGHT = "_weight"
+
+_log = logging.getLogger("dsqt.refine")
+
+
+# --- Stratified sample ---
+class StratifiedSample(FilterIndex):
+    """Stratified random sample of a daily cube's cells, filtered like the cube itself.
+
+    Each stratum (machine x defect x shift) gets a share of the sample proportional to its
+    number of cells, but at least MIN_PER_STRATUM. A cube no larger than the sample is kept
+    whole, and its estimates are exact with zero margin.
+    """
+
+    def __init__(self, cube, size=SAMPLE_CELLS, seed=0):
+        strata = [col for col in STRATA if col in cube.columns]
+        # One integer per combination of the strata's category codes, renumbered densely
+        combined = np.zeros(len(cube), dtype=np.int64)
+        for col in strata:
+            values = cube[col].astype("category").cat
+            combined = combined * (len(values.categories) + 1) + values.codes.to_numpy().astype(np.int64) + 1
+        _, stratum = np.unique(combined, return_inverse=True)
+        stratum = stratum.ravel()
+        population = np.bincount(stratum).astype(np.int64)
+        share = size / max(len(cube), 1)
+        allocated = np.minimum(population, np.maximum(MIN_PER_STRATUM, np.round(population * share).astype(np.int64)))
+
+        # Keep each stratum's allocated number of cells, picked by random priority
+        rng = np.random.default_rng(seed)
+        order = np.lexsort((rng.random(len(cube)), stratum))
+        starts = np.concatenate([[0], np.cumsum(population)[:-1]])
+        rank = np.arange(len(cube)) - starts[stratum[order]]
+        keep = np.sort(order[rank < allocated[stratum[order]]])
+
+        sample = cube.iloc[keep].reset_index(drop=True)
+        sample[_STRATUM] = stratum[keep]
+        sample[_WEIGHT] = (population / allocated)[stratum[keep]]
+        super().__init__(sample)
+        self.population_cells = len(cube)
+        self.allocated = allocated
+        # Var(estimate) = sum over strata of N^2 (1 - n/N) / n * s^2, s^2 over the stratum's sampled cells
+        self._variance_factor = np.where(
+            allocated > 1, population.astype(float) ** 2 * (1 - allocated / population) / allocated, 0.0
+        )
+
+    def estimate(self, dims, date_range=None, selections=None, grain="Day"):
+        """Estimated sums (and event counts) grouped by dims, each with a 95% margin column."""
+        rows = self.df.take(self.positions(date_range, selections))
+        if DATE_COLUMN in dims:
+            rows = rows.assign(**{DATE_COLUMN: rows[TIME_BUCKETS[grain]]})
+        values = [col for col in MEASURE_COLUMNS + [COUNT_COLUMN] if col in rows.columns]
+        y = rows[values].to_numpy(dtype=np.float64)
+        frame = pd.DataFrame(y * rows[_WEIGHT].to_numpy()[:, None], columns=values, index=rows.index)
+        squares = pd.DataFrame(y ** 2, columns=[f"{col}_sq" for col in values], index=rows.index)
+        sums = pd.DataFrame(y, columns=[f"{col}_sum" for col in values], index=rows.index)
+        frame = pd.concat([rows[list(dims) + [_STRATUM]], frame, sums, squares], axis=1)
+
+        # Per group and stratum: the weighted total and the stratum's sample variance of the
+        # domain values (sampled cells outside the group count as zeros)
+        per_stratum = frame.groupby(list(dims) + [_STRATUM], observed=True, sort=False).sum().reset_index()
+        n = self.allocated[per_stratum[_STRATUM].to_numpy()]
+        factor = self._variance_factor[per_stratum[_STRATUM].to_numpy()]
+        for col in values:
+            s1, s2 = per_stratum.pop(f"{col}_sum").to_numpy(), per_stratum.pop(f"{col}_sq").to_numpy()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                variance = np.where(n > 1, (s2 - s1 ** 2 / n) / (n - 1), 0.0)
+            per_stratum[f"{col}{MOE_SUFFIX}"] = factor * np.maximum(variance, 0.0)
+        per_stratum = per_stratum.drop(columns=_STRATUM)
+
+        if dims:
+            result = per_stratum.groupby(list(dims), observed=True).sum().reset_index()
+        else:
+            result = per_stratum.sum().to_frame().T if len(per_stratum) else pd.DataFrame(0.0, index=[0], columns=per_stratum.columns)
+        for col in values:
+            result[f"{col}{MOE_SUFFIX}"] = Z_95 * np.sqrt(result[f"{col}{MOE_SUFFIX}"])
+        return result
+
+    def plan(self, date_range=None, selections=None, grain="Day"):
+        return EstimatePlan(self, date_range, selections, grain)
+
+
+class EstimatePlan(AggregationPlan):
+    """AggregationPlan answered from a StratifiedSample; every result carries margin-of-error columns.
+
+    Margins don't add up across groups, so each grouping is estimated from the sample itself
+    instead of being derived from a finer one (the sample is small enough for that).
+    """
+
+    def __init__(self, sample, date_range=None, selections=None, grain="Day"):
+        super().__init__(None)
+        self.sample = sample
+        self.date_range = date_range
+        self.selections = selections
+        self.grain = grain
+
+    def _source(self, key):
+        return None
+
+    def _scan(self, dims):
+        return self.sample.estimate(dims, self.date_range, self.selections, self.grain)
+
+
+# --- Background refinement ---
+class Refiner:
+    """Background threads that compute exact results, at most one job per session.
+
+    A job is a list of steps (e.g. building a view's memoized figures) for one page state.
+    Submitting a job for a new state cancels the session's job for the previous one: a
+    queued job never starts, a running one stops before its next step.
+
+    Steps run on pool threads without a ScriptRunContext, so they must not call Streamlit:
+    resolve st.cache_resource objects on the script thread and pass them in. A step that
+    raises is logged and ends its job unfinished; the page then computes the results itself.
+    """
+
+    def __init__(self, workers=REFINE_WORKERS):
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="refine")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def submit(self, session, key, steps):
+        """The session's job for key, started now unless it is already running or done."""
+        with self._lock:
+            job = self._jobs.get(session)
+            if job is not None and job[0] == key:
+                return job[1]
+            if job is not None and not job[1].done():
+                job[2].set()
+                job[1].cancel()
+                self.cancelled += 1
+            cancel = threading.Event()
+            future = self._pool.submit(self._run, steps, cancel)
+            self._jobs[session] = (key, future, cancel)
+            return future
+
+    def _run(self, steps, cancel):
+        for step in steps:
+            if cancel.is_set():
+                return False
+            try:
+                step()
+            except Exception:
+                _log.exception("Background refinement step failed")
+                with self._lock:
+                    self.failed += 1
+                return False
+        with self._lock:
+            self.completed += 1
+        return True
+
+    def job(self, session, key):
+        """The session's future for key, or None if it has no job for that state."""
+        with self._lock:
+            job = self._jobs.get(session)
+            return job[1] if job is not None and job[0] == key else None
+
+
+@st.cache_resource
+def get_refiner():
+    return Refiner()
+
+
+@st.fragment(run_every=REFINE_POLL_SECONDS)
+def _refresh_when_refined(session, key):
+    future = get_refiner().job(session, key)
+    if future is None or future.done():
+        st.rerun()
+    st.caption("⏳ Estimated from a stratified sample (± 95% margin); exact figures are on their way.")
+
+
+def refine_in_background(key, steps):
+    """Compute the exact results for this page state in the background and rerun when they're ready.
+
+    Returns False if a job for this state already finished (or failed), in which case the
+    caller should compute the exact results itself.
+    """
+    session = session_id()
+    refiner = get_refiner()
+    future = refiner.job(session, key)
+    if future is not None and future.done():
+        return False
+    refiner.submit(session, key, steps)
+    _refresh_when_refined(session, key)
+    return True
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils.data_processing import CubeIndex, FilterIndex, build_cube
+
+# Loaded datasets beyond this are evicted, least recently used first, once no session uses them
+MEMORY_BUDGET_MB = int(os.environ.get("DSQT_MEMORY_BUDGET_MB", "2048"))
+# A session that hasn't rerun for this long no longer pins its dataset in memory
+SESSION_IDLE_SECONDS = int(os.environ.get("DSQT_SESSION_IDLE_SECONDS", "1800"))
+
+
+def _nbytes(obj):
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, FilterIndex):
+        return obj.nbytes()
+    return 0
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.df = None
+        self.derived = {}
+        self.loaded = False
+        self.nbytes = 0
+
+
+class DatasetRegistry:
+    """Read-only datasets shared by every session of the server process.
+
+    Each dataset is loaded and typed once, under a handle (its content hash or store key),
+    and so are the structures derived from it (cube, indexes). Sessions only hold the handle
+    and their own filter state. Datasets no session has used recently are evicted LRU when
+    the loaded total exceeds the memory budget, and reloaded on demand.
+    """
+
+    def __init__(self, budget_bytes, idle_seconds=SESSION_IDLE_SECONDS):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._loaders = {}
+        self._sessions = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, handle, load):
+        """Make a handle known; load() returns (df or None, {name: derived structure})."""
+        with self._lock:
+            self._loaders.setdefault(handle, load)
+
+    def __contains__(self, handle):
+        return handle in self._loaders
+
+    def _entry(self, handle, session_id):
+        with self._lock:
+            if session_id is not None:
+                self._sessions[session_id] = (handle, time.monotonic())
+            entry = self._entries.get(handle)
+            if entry is None:
+                entry = self._entries[handle] = _Entry()
+            self._entries.move_to_end(handle)
+            load = self._loaders[handle]
+        # Per-dataset lock: concurrent sessions wait for one load instead of each loading a copy
+        with entry.lock:
+            if not entry.loaded:
+                entry.df, entry.derived = load()
+                entry.nbytes = _nbytes(entry.df) + sum(_nbytes(obj) for obj in entry.derived.values())
+                entry.loaded = True
+                self.loads += 1
+        self._evict()
+        return entry
+
+    def frame(self, handle, session_id=None):
+        return self._entry(handle, session_id).df
+
+    def derived(self, handle, name, build, session_id=None):
+        """A structure derived from the dataset, built once for all sessions."""
+        entry = self._entry(handle, session_id)
+        with entry.lock:
+            if name not in entry.derived:
+                entry.derived[name] = build(entry.df)
+                entry.nbytes += _nbytes(entry.derived[name])
+        self._evict()
+        return entry.derived[name]
+
+    def _pinned(self):
+        now = time.monotonic()
+        # Forget idle sessions; they re-pin their dataset on their next rerun
+        self._sessions = {sid: (handle, seen) for sid, (handle, seen) in self._sessions.items() if now - seen < self.idle_seconds}
+        return {handle for handle, _ in self._sessions.values()}
+
+    def _evict(self):
+        with self._lock:
+            pinned = self._pinned()
+            for handle in list(self._entries):
+                if self.memory_bytes() <= self.budget_bytes:
+                    break
+                if handle not in pinned and self._entries[handle].loaded:
+                    del self._entries[handle]
+                    self.evictions += 1
+
+    def memory_bytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            self._pinned()
+            return {
+                "datasets": len(self._entries),
+                "memory_mb": self.memory_bytes() / 1e6,
+                "budget_mb": self.budget_bytes / 1e6,
+                "active_sessions": len(self._sessions),
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource
+def get_registry():
+    return DatasetRegistry(MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def open_dataset(dataset_key, load, lineage=None):
+    """Point this session at a shared dataset, loading it only if no session has it in memory.
+
+    lineage names the dataset across versions (a partitioned dataset after an append), for
+    results that are updated incrementally rather than recomputed; it defaults to the key.
+    """
+    registry = get_registry()
+    registry.register(dataset_key, load)
+    registry.frame(dataset_key, session_id())
+    st.session_state.dataset_key = dataset_key
+    st.session_state.dataset_lineage = lineage or dataset_key
+
+
+def has_dataset():
+    return st.session_state.get("dataset_key") in get_registry()
+
+
+def get_dataset_frame():
+    """The session's typed event table, or None for datasets only reachable through SQL."""
+    return get_registry().frame(st.session_state.dataset_key, session_id())
+
+
+def get_dataset_derived(name, build):
+    """Build a structure derived from the session's dataset once per process and share it."""
+    return get_registry().derived(st.session_state.dataset_key, name, build, session_id())
+
+
+def get_query_source():
+    """What the analysis pages filter and aggregate: a CubeIndex, or a SQLiteStore that pushes queries down."""
+    return get_dataset_derived("query_source", lambda df: CubeIndex(build_cube(df)))
+
+
+def get_comparison_source(dataset_key, load_cube):
+    """CubeIndex of a second dataset the session compares against, shared like any dataset.
+
+    Only its cube is loaded (load_cube() returns it), never its events, and it doesn't pin
+    the session: the session's own dataset stays the one kept in memory for it.
+    """
+    registry = get_registry()
+    handle = f"compare:{dataset_key}"
+    registry.register(handle, lambda: (None, {}))
+    return registry.derived(handle, "query_source", lambda df: CubeIndex(load_cube()))
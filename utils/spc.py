@@ -0,0 +1,248 @@
+"""Statistical process control: rolling control limits and Western Electric rules for many series at once.
+
+Each series (one machine's or defect type's scrap per period) is a row of a dense
+groups x periods matrix, zero in periods without scrap. Rolling window sums are differences
+of cumulative sums along the period axis, and the rules count flagged points over short
+trailing runs the same way, so every series is computed in the same few array passes
+instead of a Python loop per machine.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.data_processing import DATE_COLUMN
+
+# Trailing periods the mean and sigma of each point are taken over (the point itself excluded)
+SPC_WINDOWS = {"Day": 30, "Week": 12, "Month": 6}
+PERIOD_STEPS = {"Day": "D", "Week": "7D", "Month": "MS"}
+# Western Electric rules: (label, run length, points of the run beyond the zone, zone in sigmas)
+RULES = [
+    ("1 beyond 3σ", 1, 1, 3.0),
+    ("2 of 3 beyond 2σ", 3, 2, 2.0),
+    ("4 of 5 beyond 1σ", 5, 4, 1.0),
+    ("8 on one side", 8, 8, 0.0),
+]
+# Sides of the center line a run is flagged on: 1 above, -1 below. Only more scrap than usual
+# is an alarm; long runs below the center are improvements, and daily scrap of a lightly
+# loaded machine is zero most days, which would put every such machine "below" all the time
+ALARM_SIDES = (1,)
+# Earlier points a point's rule flags depend on, beyond its own window
+LOOKBACK = max(run for _, run, _, _ in RULES) - 1
+RULES_COLUMN = "Rules"
+# Series whose limits are kept for incremental updates
+CONTROL_CHARTS = 64
+
+
+def _trailing_sums(cumulative, window):
+    # cumulative has a leading zero column; column t gets the sum of the window columns before it
+    periods = cumulative.shape[1] - 1
+    sums = np.full((cumulative.shape[0], periods), np.nan)
+    if periods > window:
+        sums[:, window:] = cumulative[:, window:periods] - cumulative[:, :periods - window]
+    return sums
+
+
+def _run_counts(mask, run):
+    """Flagged points in the run of `run` points ending at each point, for every row at once."""
+    if run == 1:
+        return mask.astype(np.int32)
+    periods = mask.shape[1]
+    cumulative = np.zeros((mask.shape[0], periods + 1), dtype=np.int32)
+    np.cumsum(mask, axis=1, out=cumulative[:, 1:])
+    counts = cumulative[:, 1:].copy()
+    if periods >= run:
+        counts[:, run - 1:] -= cumulative[:, :periods - run + 1]
+    return counts
+
+
+def rolling_limits(values, window):
+    """Mean and sigma of the window periods before each period, per row; NaN until a full window exists."""
+    shape = (values.shape[0], values.shape[1] + 1)
+    s1, s2 = np.zeros(shape), np.zeros(shape)
+    np.cumsum(values, axis=1, out=s1[:, 1:])
+    np.cumsum(values ** 2, axis=1, out=s2[:, 1:])
+    total, squares = _trailing_sums(s1, window), _trailing_sums(s2, window)
+    center = total / window
+    sigma = np.sqrt(np.maximum(squares - total ** 2 / window, 0.0) / (window - 1))
+    return center, sigma
+
+
+def rule_flags(values, center, sigma):
+    """Bitmask per point of the Western Electric rules it breaks, bit i for RULES[i].
+
+    A point breaks a rule when it is beyond the zone itself and enough of its run is beyond
+    it on the same side (see ALARM_SIDES). A flat history (sigma 0) puts any different point
+    beyond every zone.
+    """
+    deviation = values - center
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(sigma > 0, deviation / sigma, np.sign(deviation) * np.inf)
+    flags = np.zeros(values.shape, dtype=np.uint8)
+    for bit, (_, run, needed, zone) in enumerate(RULES):
+        for side in ALARM_SIDES:
+            beyond = side * z > zone  # False where there are no limits yet (NaN)
+            flags |= ((beyond & (_run_counts(beyond, run) >= needed)) << bit).astype(np.uint8)
+    return flags
+
+
+def rule_labels(flags):
+    """Comma-separated names of the rules in each bitmask ("" for none)."""
+    labels = np.array([
+        ", ".join(label for bit, (label, *_) in enumerate(RULES) if mask >> bit & 1) for mask in range(1 << len(RULES))
+    ], dtype=object)
+    return labels[flags]
+
+
+def dense_series(frame, dim, value, grain):
+    """(groups, periods, groups x periods matrix) of one measure per dim value and period."""
+    if frame.empty:
+        return pd.Index([]), pd.DatetimeIndex([]), np.zeros((0, 0))
+    codes, groups = pd.factorize(frame[dim], sort=True)
+    dates = pd.DatetimeIndex(frame[DATE_COLUMN])
+    periods = pd.date_range(dates.min(), dates.max(), freq=PERIOD_STEPS[grain])
+    matrix = np.zeros((len(groups), len(periods)))
+    matrix[codes, periods.get_indexer(dates)] = frame[value].to_numpy(dtype=np.float64)
+    return pd.Index(groups.astype(str)), periods, matrix
+
+
+class ControlLimits:
+    """Rolling limits and rule flags for every series of one grouping, updated in place.
+
+    update() takes the grouping's current totals per period. When they only differ from the
+    previous ones from some period on (days appended to the dataset, or the open week or
+    month grown), only the periods from there are recomputed, from the window and LOOKBACK
+    periods before them; an unrelated series (other start date, dropped groups) starts over.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.groups = pd.Index([])
+        self.periods = pd.DatetimeIndex([])
+        self.values = self.center = self.sigma = np.zeros((0, 0))
+        self.flags = np.zeros((0, 0), dtype=np.uint8)
+        self.recomputed = 0
+        self.lock = threading.Lock()
+
+    def _first_change(self, groups, periods, values):
+        stored = len(self.periods)
+        if not stored or not len(periods) or periods[0] != self.periods[0] or len(periods) < stored:
+            return 0
+        if not self.groups.isin(groups).all():
+            return 0
+        # Stored rows in the new group order; groups new to this update had no scrap so far
+        rows = groups.get_indexer(self.groups)
+        previous = np.zeros((len(groups), stored))
+        previous[rows] = self.values
+        changed = np.flatnonzero((previous != values[:, :stored]).any(axis=0))
+        self._realign(rows, len(groups))
+        return int(changed[0]) if len(changed) else stored
+
+    def _realign(self, rows, n_groups):
+        for name, fill in [("values", 0.0), ("center", np.nan), ("sigma", np.nan), ("flags", 0)]:
+            stored = getattr(self, name)
+            aligned = np.full((n_groups, stored.shape[1]), fill, dtype=stored.dtype)
+            aligned[rows] = stored
+            setattr(self, name, aligned)
+        # A series with no history has a flat zero one, as if computed from scratch
+        new = np.setdiff1d(np.arange(n_groups), rows)
+        self.center[new[:, None], self.window:] = 0.0
+        self.sigma[new[:, None], self.window:] = 0.0
+
+    def update(self, groups, periods, values):
+        start = self._first_change(groups, periods, values)
+        begin = max(start - self.window - LOOKBACK, 0)
+        block = values[:, begin:]
+        center, sigma = rolling_limits(block, self.window)
+        flags = rule_flags(block, center, sigma)
+        keep = start - begin
+        self.center = np.concatenate([self.center[:, :start], center[:, keep:]], axis=1) if start else center
+        self.sigma = np.concatenate([self.sigma[:, :start], sigma[:, keep:]], axis=1) if start else sigma
+        self.flags = np.concatenate([self.flags[:, :start], flags[:, keep:]], axis=1) if start else flags
+        self.groups, self.periods, self.values = groups, periods, values
+        self.recomputed = len(periods) - start
+        return self
+
+    def snapshot(self):
+        return ControlSnapshot(self.groups, self.periods, self.values, self.center, self.sigma, self.flags)
+
+
+class ControlSnapshot:
+    """Read-only control limits of one grouping, as handed to the pages."""
+
+    def __init__(self, groups, periods, values, center, sigma, flags):
+        self.groups = groups
+        self.periods = periods
+        self.values = values
+        self.center = center
+        self.sigma = sigma
+        self.flags = flags
+
+    def violations(self, dim, value):
+        """Long frame of the points breaking any rule: Date, dim, value and the rules broken."""
+        rows, cols = np.nonzero(self.flags)
+        return pd.DataFrame({
+            DATE_COLUMN: self.periods[cols],
+            dim: self.groups[rows],
+            value: self.values[rows, cols],
+            RULES_COLUMN: rule_labels(self.flags[rows, cols]),
+        })
+
+    def summary(self, dim):
+        """Violations per group and rule, groups with the most first."""
+        counts = {
+            label: ((self.flags >> bit) & 1).sum(axis=1) for bit, (label, *_) in enumerate(RULES)
+        }
+        table = pd.DataFrame(counts, index=pd.Index(self.groups, name=dim))
+        table.insert(0, "Violations", (self.flags > 0).sum(axis=1))
+        return table.sort_values("Violations", ascending=False, kind="stable")
+
+    def series(self, group, value):
+        """One group's values with its center line and 1-3 sigma limits, plus the rules each point breaks."""
+        row = self.groups.get_loc(group)
+        center, sigma = self.center[row], self.sigma[row]
+        frame = pd.DataFrame({DATE_COLUMN: self.periods, value: self.values[row], "Center": center})
+        for k in (1, 2, 3):
+            frame[f"+{k}σ"] = center + k * sigma
+            frame[f"-{k}σ"] = np.maximum(center - k * sigma, 0.0)
+        frame[RULES_COLUMN] = rule_labels(self.flags[row])
+        return frame
+
+
+class ControlLimitsCache:
+    """ControlLimits per series key, kept across reruns and dataset versions so appends update them."""
+
+    def __init__(self, size=CONTROL_CHARTS):
+        self.size = size
+        self._lock = threading.Lock()
+        self._charts = OrderedDict()
+
+    def get(self, key, window):
+        with self._lock:
+            chart = self._charts.get(key)
+            if chart is None or chart.window != window:
+                chart = self._charts[key] = ControlLimits(window)
+            self._charts.move_to_end(key)
+            while len(self._charts) > self.size:
+                self._charts.popitem(last=False)
+            return chart
+
+
+@st.cache_resource
+def get_control_limits_cache():
+    return ControlLimitsCache()
+
+
+def control_limits(key, frame, dim, value, grain, charts=None):
+    """ControlSnapshot of a grouping's per-period totals, reusing the limits last computed under key.
+
+    key identifies the series across dataset versions (lineage, selection, grain, dim), so
+    after an append only the new periods and their lookback are recomputed. Callers off the
+    script thread (background refinement) pass the ControlLimitsCache in as charts.
+    """
+    chart = (charts or get_control_limits_cache()).get(key, SPC_WINDOWS[grain])
+    groups, periods, values = dense_series(frame, dim, value, grain)
+    with chart.lock:
+        return chart.update(groups, periods, values).snapshot()